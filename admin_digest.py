@@ -0,0 +1,337 @@
+from collections import OrderedDict
+from datetime import datetime
+from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
+from config import TIMEZONE, ADMIN_ID, ADMIN_DIGEST_EDIT_SECONDS
+from database import run_db
+from callback_router import encode_callback
+import asyncio
+import logging
+import pytz
+import time
+
+logger = logging.getLogger(__name__)
+
+# Resúmenes recientes guardados en memoria para las eliminaciones
+MAX_CACHED_DIGESTS = 64
+
+# Razones de fallo mostradas en el resumen
+MAX_SHOWN_FAILURES = 5
+
+def digest_key(send_time: datetime):
+    """Hora de envío tal como la guarda MongoDB (UTC sin zona, en milisegundos)"""
+    if send_time.tzinfo is not None:
+        send_time = send_time.astimezone(pytz.utc).replace(tzinfo=None)
+    return send_time.replace(microsecond=send_time.microsecond // 1000 * 1000)
+
+class DispatchDigest:
+    """Mensaje único al administrador para una ventana de envío
+
+    Se envía al empezar la ventana y se edita en el sitio (como mucho cada
+    ADMIN_DIGEST_EDIT_SECONDS) a medida que terminan los envíos y, horas
+    después, las eliminaciones. Cada post conserva sus botones de Reenviar y
+    Eliminar de Todos.
+    """
+
+    def __init__(self, bot: Bot, send_time: datetime, is_manual: bool = False,
+                 message_id: int = None, posts: dict = None, sending: bool = True):
+        self.bot = bot
+        # Misma precisión que la guardada: las consultas por send_time coinciden
+        self.send_time = digest_key(send_time)
+        self.is_manual = is_manual
+        self.message_id = message_id
+        self.posts = posts if posts is not None else OrderedDict()
+        self.sending = sending
+        self.deletions = {}
+
+        self._last_edit = 0.0
+        self._last_text = None
+        self._dirty = False
+        self._update_task = None
+
+    # --- Progreso ---
+
+    def add_post(self, post_id: str, post_name: str, total_channels: int):
+        self.posts[post_id] = {
+            'name': post_name,
+            'total': total_channels,
+            'sent': 0,
+            'failed': 0,
+            'failed_channels': []
+        }
+
+    def record_send(self, post_id: str, channel_id: str, error: str = None):
+        entry = self.posts.get(post_id)
+        if entry is None:
+            return
+        if error is None:
+            entry['sent'] += 1
+        else:
+            entry['failed'] += 1
+            if len(entry['failed_channels']) < MAX_SHOWN_FAILURES:
+                entry['failed_channels'].append({'channel_id': channel_id, 'error': error})
+        self.request_update()
+
+    def request_update(self):
+        """Pide una edición; se agrupan todas las que lleguen antes del siguiente turno"""
+        self._dirty = True
+        if self._update_task is None or self._update_task.done():
+            self._update_task = asyncio.create_task(self._throttled_update())
+
+    async def _throttled_update(self):
+        while self._dirty:
+            wait = self._last_edit + ADMIN_DIGEST_EDIT_SECONDS - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._dirty = False
+            await self._edit()
+
+    # --- Mensaje ---
+
+    async def start(self):
+        """Envía el mensaje inicial de la ventana"""
+        try:
+            text, reply_markup = self.render()
+            message = await self.bot.send_message(
+                chat_id=ADMIN_ID,
+                text=text,
+                reply_markup=reply_markup,
+                parse_mode='Markdown'
+            )
+            self.message_id = message.message_id
+            self._last_text = text
+            self._last_edit = time.monotonic()
+        except Exception as e:
+            logger.error(f"Error enviando resumen de envío: {e}")
+
+    async def close(self):
+        """Resumen final de los envíos; se guarda para actualizarlo con las eliminaciones"""
+        self.sending = False
+        if self._update_task and not self._update_task.done():
+            self._update_task.cancel()
+        self._dirty = False
+        await self._edit()
+        await run_db(self.save)
+
+    async def refresh(self):
+        """Edición inmediata (p. ej. al terminar un lote de eliminación)"""
+        if self._update_task and not self._update_task.done():
+            self._update_task.cancel()
+        self._dirty = False
+        await self._edit()
+
+    async def _edit(self):
+        try:
+            if not self.sending:
+                self.deletions = await run_db(self.load_deletions)
+
+            text, reply_markup = self.render()
+            if self.message_id is None:
+                await self.start()
+                return
+            if text == self._last_text:
+                return
+
+            self._last_edit = time.monotonic()
+            await self.bot.edit_message_text(
+                chat_id=ADMIN_ID,
+                message_id=self.message_id,
+                text=text,
+                reply_markup=reply_markup,
+                parse_mode='Markdown'
+            )
+            self._last_text = text
+        except BadRequest as e:
+            if 'not modified' not in str(e).lower():
+                logger.error(f"Error editando resumen de envío: {e}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error editando resumen de envío: {e}")
+
+    def render(self):
+        cuba_tz = pytz.timezone(TIMEZONE)
+        send_time = self.send_time
+        if send_time.tzinfo is None:
+            send_time = pytz.utc.localize(send_time)
+        send_time = send_time.astimezone(cuba_tz)
+
+        if self.sending:
+            status = "⏳ Enviando..."
+        elif self.deletions and all(d.get('notified') for d in self.deletions.values()):
+            status = "🗑️ Eliminación completada"
+        elif self.deletions:
+            status = "🗑️ Eliminando..."
+        else:
+            status = "✅ Envío completado"
+
+        text = (
+            f"📤 **{'Envío Manual' if self.is_manual else 'Envío Automático'}** · {status}\n\n"
+            f"🕐 **Hora de envío:** {send_time.strftime('%H:%M:%S')}\n"
+            f"📅 **Fecha:** {send_time.strftime('%d/%m/%Y')}\n\n"
+        )
+
+        failures = []
+        total_channels = total_sent = total_failed = 0
+        for post_id, entry in self.posts.items():
+            total_channels += entry['total']
+            total_sent += entry['sent']
+            total_failed += entry['failed']
+
+            line = f"📝 **{entry['name']}**: ✅ {entry['sent']}/{entry['total']}"
+            if entry['failed']:
+                line += f" · ❌ {entry['failed']}"
+            deletion = self.deletions.get(post_id)
+            if deletion:
+                line += f" · 🗑️ {deletion.get('deleted_count', 0)}/{deletion.get('total_channels', 0)}"
+                if deletion.get('failed_count'):
+                    line += f" (❌ {deletion['failed_count']})"
+            text += line + "\n"
+
+            for failed in entry['failed_channels']:
+                failures.append(f"{entry['name']} · Canal `{failed['channel_id']}`: {failed['error']}")
+
+        text += (
+            f"\n📺 **Canales totales:** {total_channels}\n"
+            f"✅ **Envíos exitosos:** {total_sent}\n"
+            f"❌ **Envíos fallidos:** {total_failed}\n"
+        )
+
+        if failures:
+            text += "\n**Razones de fallo:**\n"
+            for i, failure in enumerate(failures[:MAX_SHOWN_FAILURES], 1):
+                text += f"{i}. {failure}\n"
+            if total_failed > MAX_SHOWN_FAILURES:
+                text += f"... y {total_failed - min(len(failures), MAX_SHOWN_FAILURES)} errores más\n"
+
+        # Botones de acción por post
+        keyboard = [
+            [
+                InlineKeyboardButton(f"🔄 {entry['name'][:20]}", callback_data=encode_callback("resend_post", post_id)),
+                InlineKeyboardButton(f"🗑️ {entry['name'][:20]}", callback_data=encode_callback("delete_all_posts", post_id))
+            ]
+            for post_id, entry in self.posts.items()
+        ]
+        return text, InlineKeyboardMarkup(keyboard)
+
+    # --- Persistencia ---
+
+    def save(self):
+        try:
+            from database import db
+            db.notification_digests.update_one(
+                {'send_time': self.send_time},
+                {
+                    '$set': {
+                        'message_id': self.message_id,
+                        'is_manual': self.is_manual,
+                        'post_ids': list(self.posts),
+                        'posts': [
+                            {
+                                'post_id': post_id,
+                                'name': entry['name'],
+                                'total': entry['total'],
+                                'sent': entry['sent'],
+                                'failed': entry['failed'],
+                                'failed_channels': entry['failed_channels']
+                            }
+                            for post_id, entry in self.posts.items()
+                        ]
+                    },
+                    '$setOnInsert': {'send_time': self.send_time, 'created_at': datetime.utcnow()}
+                },
+                upsert=True
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Error guardando resumen de envío: {e}")
+            return False
+
+    def load_deletions(self):
+        try:
+            from database import db
+            return {
+                doc['post_id']: doc
+                for doc in db.deletion_stats.find({
+                    'send_time': self.send_time,
+                    'post_id': {'$in': list(self.posts)}
+                })
+            }
+        except Exception as e:
+            logger.error(f"Error leyendo eliminaciones del resumen: {e}")
+            return self.deletions
+
+    @classmethod
+    def load(cls, bot: Bot, send_time: datetime):
+        try:
+            from database import db
+            doc = db.notification_digests.find_one({'send_time': send_time})
+            if not doc or doc.get('message_id') is None:
+                return None
+
+            posts = OrderedDict()
+            for entry in doc.get('posts', []):
+                posts[entry['post_id']] = {
+                    'name': entry['name'],
+                    'total': entry['total'],
+                    'sent': entry['sent'],
+                    'failed': entry['failed'],
+                    'failed_channels': entry.get('failed_channels', [])
+                }
+            return cls(bot, doc['send_time'], doc.get('is_manual', False),
+                       message_id=doc['message_id'], posts=posts, sending=False)
+        except Exception as e:
+            logger.error(f"Error cargando resumen de envío: {e}")
+            return None
+
+class DigestManager:
+    """Resúmenes por ventana de envío, localizados por su hora de envío"""
+
+    def __init__(self):
+        self._digests = OrderedDict()
+
+    def _remember(self, digest: DispatchDigest):
+        key = digest_key(digest.send_time)
+        self._digests[key] = digest
+        self._digests.move_to_end(key)
+        while len(self._digests) > MAX_CACHED_DIGESTS:
+            self._digests.popitem(last=False)
+
+    async def open(self, bot: Bot, send_time: datetime, is_manual: bool, dispatches: list):
+        """Crea y envía el resumen de una ventana con sus posts"""
+        digest = DispatchDigest(bot, send_time, is_manual)
+        for dispatch in dispatches:
+            digest.add_post(dispatch.post_id, dispatch.post.name, len(dispatch.channels))
+            dispatch.digest = digest
+        await digest.start()
+        self._remember(digest)
+        return digest
+
+    async def find(self, bot: Bot, send_time: datetime):
+        key = digest_key(send_time)
+        if key in self._digests:
+            return self._digests[key]
+
+        # También se recuerda que un envío no tiene resumen
+        digest = await run_db(DispatchDigest.load, bot, send_time)
+        self._digests[key] = digest
+        while len(self._digests) > MAX_CACHED_DIGESTS:
+            self._digests.popitem(last=False)
+        return digest
+
+    async def note_deletion(self, bot: Bot, send_time: datetime, final: bool = False):
+        """Actualiza el resumen con el avance de las eliminaciones
+
+        Devuelve False si el envío no tiene resumen (se notifica por post).
+        """
+        digest = await self.find(bot, send_time)
+        if digest is None:
+            return False
+        if final:
+            await digest.refresh()
+        else:
+            digest.request_update()
+        return True
+
+# Instancia global
+digest_manager = DigestManager()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Benchmark: tiempo que el bucle de eventos queda bloqueado por las consultas a MongoDB
+
+Compara llamar a pymongo directamente desde una corrutina (antes) con
+hacerlo a través de database.run_db (después). Cada consulta se simula con
+una espera bloqueante igual a la latencia de ida y vuelta a Atlas.
+
+Uso: python benchmarks/db_stall.py [--queries 90] [--latency-ms 40]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# No conectar a Atlas: el benchmark no necesita servidor
+os.environ.setdefault('MONGODB_URL', 'mongodb://127.0.0.1:1/?serverSelectionTimeoutMS=1&connectTimeoutMS=1')
+logging.disable(logging.CRITICAL)
+
+from database import run_db  # noqa: E402
+
+def fake_query(latency):
+    """Simula una consulta síncrona de pymongo"""
+    time.sleep(latency)
+    return {'ok': 1}
+
+async def measure_lag(stop_event, interval, samples):
+    """Mide cuánto tarda el bucle en volver a ejecutar una tarea programada"""
+    loop = asyncio.get_running_loop()
+    while not stop_event.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - expected))
+
+async def run_scenario(queries, latency, use_executor):
+    stop_event = asyncio.Event()
+    samples = []
+    monitor = asyncio.create_task(measure_lag(stop_event, 0.005, samples))
+    await asyncio.sleep(0.01)
+
+    started = time.perf_counter()
+
+    async def one_query():
+        if use_executor:
+            return await run_db(fake_query, latency)
+        return fake_query(latency)
+
+    await asyncio.gather(*(one_query() for _ in range(queries)))
+    elapsed = time.perf_counter() - started
+
+    stop_event.set()
+    await monitor
+
+    return {
+        'elapsed': elapsed,
+        'max_lag': max(samples) if samples else 0.0,
+        'total_lag': sum(samples)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--queries', type=int, default=90, help='consultas concurrentes (p. ej. una por canal)')
+    parser.add_argument('--latency-ms', type=float, default=40.0, help='latencia simulada por consulta')
+    args = parser.parse_args()
+
+    latency = args.latency_ms / 1000
+
+    print(f"Consultas: {args.queries} | Latencia simulada: {args.latency_ms:.0f} ms\n")
+    print(f"{'Modo':<22}{'Duración':>12}{'Bloqueo máx.':>16}{'Bloqueo total':>16}")
+    for label, use_executor in (('pymongo directo', False), ('run_db (executor)', True)):
+        result = asyncio.run(run_scenario(args.queries, latency, use_executor))
+        print(
+            f"{label:<22}{result['elapsed'] * 1000:>10.0f}ms"
+            f"{result['max_lag'] * 1000:>14.0f}ms{result['total_lag'] * 1000:>14.0f}ms"
+        )
+
+if __name__ == '__main__':
+    main()
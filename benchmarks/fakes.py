@@ -0,0 +1,180 @@
+"""
+Dobles de prueba para los benchmarks: un Bot de Telegram falso y una
+base de datos local (en memoria o SQLite, ver storage.py).
+
+Importar este módulo antes que database.py evita que se intente conectar
+a Atlas: la URL apunta a un servidor inexistente con tiempos de espera
+mínimos y use_in_memory_database() / use_sqlite_database() reemplazan la
+base de datos.
+"""
+
+import asyncio
+import itertools
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGODB_URL', 'mongodb://127.0.0.1:1/?serverSelectionTimeoutMS=1&connectTimeoutMS=1')
+
+from telegram.error import BadRequest, RetryAfter  # noqa: E402
+
+# --- Telegram ---
+
+class FakeMessage:
+    __slots__ = ('message_id', 'chat_id')
+
+    def __init__(self, message_id, chat_id):
+        self.message_id = message_id
+        self.chat_id = chat_id
+
+class FakeBot:
+    """Bot falso con latencia, tasa de errores y respuestas 429 configurables
+
+    Si se pasa un rate_limiter, cada llamada pasa por él igual que en ExtBot.
+    """
+
+    def __init__(self, latency=0.05, jitter=0.5, error_rate=0.0, retry_after_rate=0.0,
+                 retry_after=1, forward_fails=False, rate_limiter=None, seed=None):
+        self.id = 123456789
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.retry_after_rate = retry_after_rate
+        self.retry_after = retry_after
+        self.forward_fails = forward_fails
+        self.rate_limiter = rate_limiter
+        self.calls = {}
+        self.call_latencies = []
+        self._random = random.Random(seed)
+        self._message_ids = itertools.count(1000)
+
+    async def _request(self, endpoint, chat_id, fail_always=False):
+        async def do_request():
+            started = asyncio.get_running_loop().time()
+            delay = self.latency * (1 + self._random.uniform(-self.jitter, self.jitter))
+            await asyncio.sleep(max(0.0, delay))
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+            self.call_latencies.append(asyncio.get_running_loop().time() - started)
+
+            roll = self._random.random()
+            if roll < self.retry_after_rate:
+                raise RetryAfter(self.retry_after)
+            if fail_always or roll < self.retry_after_rate + self.error_rate:
+                raise BadRequest(f"Fallo simulado en {endpoint}")
+            return FakeMessage(next(self._message_ids), chat_id)
+
+        if self.rate_limiter:
+            return await self.rate_limiter.process_request(
+                do_request, (), {}, endpoint, {'chat_id': chat_id}, None
+            )
+        return await do_request()
+
+    async def forward_message(self, chat_id, from_chat_id, message_id, **kwargs):
+        return await self._request('forwardMessage', chat_id, fail_always=self.forward_fails)
+
+    async def copy_message(self, chat_id, from_chat_id, message_id, **kwargs):
+        return await self._request('copyMessage', chat_id, fail_always=self.forward_fails)
+
+    async def send_message(self, chat_id, text=None, **kwargs):
+        return await self._request('sendMessage', chat_id)
+
+    async def send_photo(self, chat_id, photo=None, **kwargs):
+        return await self._request('sendPhoto', chat_id)
+
+    async def send_video(self, chat_id, video=None, **kwargs):
+        return await self._request('sendVideo', chat_id)
+
+    async def send_audio(self, chat_id, audio=None, **kwargs):
+        return await self._request('sendAudio', chat_id)
+
+    async def send_document(self, chat_id, document=None, **kwargs):
+        return await self._request('sendDocument', chat_id)
+
+    async def send_animation(self, chat_id, animation=None, **kwargs):
+        return await self._request('sendAnimation', chat_id)
+
+    async def send_sticker(self, chat_id, sticker=None, **kwargs):
+        return await self._request('sendSticker', chat_id)
+
+    async def send_voice(self, chat_id, voice=None, **kwargs):
+        return await self._request('sendVoice', chat_id)
+
+    async def pin_chat_message(self, chat_id, message_id, **kwargs):
+        await self._request('pinChatMessage', chat_id)
+        return True
+
+    async def delete_message(self, chat_id, message_id, **kwargs):
+        await self._request('deleteMessage', chat_id)
+        return True
+
+    async def edit_message_text(self, text=None, chat_id=None, message_id=None, **kwargs):
+        return await self._request('editMessageText', chat_id)
+
+# --- Base de datos ---
+
+def use_in_memory_database():
+    """Sustituye la base de datos de los modelos por una en memoria"""
+    import database
+    from storage import MemoryDatabase
+    memory_db = MemoryDatabase()
+    database.db = memory_db
+    return memory_db
+
+def use_sqlite_database(path=':memory:'):
+    """Sustituye la base de datos de los modelos por SQLite (con los índices reales)"""
+    import database
+    storage = database.SQLite(path)
+    storage.ensure_ready()
+    database.db = storage.db
+    return storage.db
+
+# --- Datos sintéticos ---
+
+CONTENT_TYPES = ['text', 'photo', 'video', 'document']
+
+def seed_posts(posts, channels_per_post, shared_channels=True, pin_message=False,
+               delete_after_hours=24, seed=0):
+    """Crea N posts con M canales cada uno usando los modelos reales
+
+    Con shared_channels todos los posts usan los mismos M canales (caso típico:
+    una lista de canales que recibe varios posts al día).
+    """
+    from database import Post, PostSchedule, Channel, PostChannel
+
+    rng = random.Random(seed)
+    channel_pool = {}
+
+    def get_channel(index):
+        channel_id = str(-1001000000000 - index)
+        if channel_id not in channel_pool:
+            channel = Channel(channel_id=channel_id, channel_name=f"Canal {index}",
+                              channel_username=f"canal_{index}")
+            channel.save()
+            channel_pool[channel_id] = channel
+        return channel_id
+
+    post_ids = []
+    for i in range(posts):
+        content_type = rng.choice(CONTENT_TYPES)
+        post = Post(
+            name=f"Post {i + 1}",
+            source_channel=str(-1002000000000 - i),
+            source_message_id=rng.randint(1, 10_000),
+            content_type=content_type,
+            content_text=f"Contenido del post {i + 1}",
+            file_id=None if content_type == 'text' else f"file_{i}"
+        )
+        post.save()
+        PostSchedule(
+            post_id=str(post._id),
+            send_time="09:00",
+            delete_after_hours=delete_after_hours,
+            pin_message=pin_message
+        ).save()
+        offset = 0 if shared_channels else i * channels_per_post
+        for j in range(channels_per_post):
+            PostChannel(post_id=str(post._id), channel_id=get_channel(offset + j)).save()
+        post_ids.append(str(post._id))
+
+    return post_ids
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Benchmark de extremo a extremo del envío y la eliminación de posts
+
+Ejecuta send_post_to_channels_with_notification, la cola de eliminaciones
+(delete_message_with_notification) y delete_all_post_messages_now contra
+un Bot falso y una base de datos en memoria. No necesita red.
+
+Uso:
+    python benchmarks/fanout.py --posts 15 --channels 90 --latency-ms 80
+    python benchmarks/fanout.py --error-rate 0.05 --retry-after-rate 0.01 --rate-limit
+    python benchmarks/fanout.py --storage sqlite --sqlite-path /tmp/bench.db
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fakes  # noqa: E402  (debe importarse antes que database)
+
+logging.disable(logging.CRITICAL)
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+async def timed(coro):
+    started = time.perf_counter()
+    await coro
+    return time.perf_counter() - started
+
+async def run_scenario(name, make_coros, bot, operations):
+    """Ejecuta las corrutinas en paralelo y mide tiempos, llamadas y memoria"""
+    calls_before = sum(bot.calls.values())
+    tracemalloc.start()
+    started = time.perf_counter()
+
+    durations = await asyncio.gather(*(timed(coro) for coro in make_coros()))
+
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'name': name,
+        'elapsed': elapsed,
+        'operations': operations,
+        'api_calls': sum(bot.calls.values()) - calls_before,
+        'throughput': operations / elapsed if elapsed else 0.0,
+        'p50': percentile(durations, 0.50),
+        'p99': percentile(durations, 0.99),
+        'peak_memory': peak
+    }
+
+def print_results(results):
+    header = (f"{'Escenario':<26}{'Ops':>7}{'Llamadas':>10}{'Total':>10}{'Ops/s':>9}"
+              f"{'p50':>10}{'p99':>10}{'Mem. pico':>12}")
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(
+            f"{r['name']:<26}{r['operations']:>7}{r['api_calls']:>10}{r['elapsed']:>9.2f}s"
+            f"{r['throughput']:>9.1f}{r['p50'] * 1000:>8.0f}ms{r['p99'] * 1000:>8.0f}ms"
+            f"{r['peak_memory'] / 1024 / 1024:>10.1f}MB"
+        )
+
+async def main_async(args):
+    import database
+    if args.storage == 'sqlite':
+        memory_db = fakes.use_sqlite_database(args.sqlite_path)
+    else:
+        memory_db = fakes.use_in_memory_database()
+
+    import scheduler
+
+    rate_limiter = None
+    if args.rate_limit:
+        from rate_limiter import TelegramRateLimiter
+        rate_limiter = TelegramRateLimiter()
+        await rate_limiter.initialize()
+
+    bot = fakes.FakeBot(
+        latency=args.latency_ms / 1000,
+        error_rate=args.error_rate,
+        retry_after_rate=args.retry_after_rate,
+        retry_after=args.retry_after,
+        forward_fails=args.forward_fails,
+        rate_limiter=rate_limiter,
+        seed=args.seed
+    )
+
+    post_ids = fakes.seed_posts(
+        args.posts, args.channels, shared_channels=not args.separate_channels,
+        pin_message=args.pin, seed=args.seed
+    )
+    total_messages = args.posts * args.channels
+    results = []
+
+    # 1. Envío: todos los posts disparan a la vez (p. ej. las 09:00)
+    if args.no_coordinator:
+        make_sends = lambda: [scheduler.send_post_to_channels_with_notification(bot, post_id) for post_id in post_ids]
+    else:
+        from dispatch_coordinator import DispatchCoordinator
+        coordinator = DispatchCoordinator(window_seconds=0)
+        make_sends = lambda: [coordinator.submit(bot, post_id) for post_id in post_ids]
+    results.append(await run_scenario('envío programado', make_sends, bot, total_messages))
+
+    # 2. Eliminación programada: adelantar la cola y drenarla
+    memory_db.scheduled_jobs.update_many(
+        {'is_completed': False},
+        {'$set': {'scheduled_time': datetime.utcnow() - timedelta(seconds=1)}}
+    )
+    pending = memory_db.scheduled_jobs.count_documents({'is_completed': False})
+    results.append(await run_scenario(
+        'eliminación programada',
+        lambda: [scheduler.process_due_deletions(bot)],
+        bot, pending
+    ))
+
+    # 3. Reenvío y "Eliminar de Todos"
+    await asyncio.gather(*(
+        scheduler.send_post_to_channels_with_notification(bot, post_id, True) for post_id in post_ids
+    ))
+    pending = memory_db.sent_messages.count_documents({'deleted': False})
+    results.append(await run_scenario(
+        'eliminar de todos',
+        lambda: [scheduler.delete_all_post_messages_now(bot, post_id) for post_id in post_ids],
+        bot, pending
+    ))
+
+    print(f"Posts: {args.posts} | Canales por post: {args.channels} | "
+          f"Latencia: {args.latency_ms:.0f} ms | Errores: {args.error_rate:.1%} | "
+          f"429: {args.retry_after_rate:.1%} | Limitador: {'sí' if args.rate_limit else 'no'} | "
+          f"Almacén: {args.storage}\n")
+    print_results(results)
+
+    if args.latencies:
+        latencies = bot.call_latencies
+        print(f"\nLatencia por llamada: p50 {percentile(latencies, 0.5) * 1000:.0f}ms "
+              f"p99 {percentile(latencies, 0.99) * 1000:.0f}ms")
+    if rate_limiter:
+        print(f"\nLimitador: {rate_limiter.get_stats()}")
+
+    database._db_executor.shutdown(wait=False)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--posts', type=int, default=5)
+    parser.add_argument('--channels', type=int, default=90, help='canales por post')
+    parser.add_argument('--separate-channels', action='store_true', help='cada post con sus propios canales')
+    parser.add_argument('--latency-ms', type=float, default=50.0, help='latencia media de la API falsa')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fracción de llamadas que fallan')
+    parser.add_argument('--retry-after-rate', type=float, default=0.0, help='fracción de respuestas 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='segundos de retry_after en los 429')
+    parser.add_argument('--forward-fails', action='store_true', help='el mensaje original no se puede reenviar')
+    parser.add_argument('--pin', action='store_true', help='fijar los mensajes enviados')
+    parser.add_argument('--rate-limit', action='store_true', help='pasar las llamadas por el limitador real')
+    parser.add_argument('--no-coordinator', action='store_true',
+                        help='enviar cada post por separado en lugar de usar el coordinador')
+    parser.add_argument('--storage', choices=['memory', 'sqlite'], default='memory',
+                        help='base de datos de los modelos (sqlite usa los índices reales)')
+    parser.add_argument('--sqlite-path', default=':memory:', help='fichero SQLite con --storage sqlite')
+    parser.add_argument('--latencies', action='store_true', help='mostrar latencia por llamada')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    asyncio.run(main_async(args))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Auditoría de índices: plan de ejecución de cada consulta del bot
+
+Ejecuta los flujos reales (envío coordinado, cola de eliminaciones,
+"Eliminar de Todos", recuperación de envíos perdidos, compactación,
+menús, desasignación y borrado en cascada) con la caché de lectura
+desactivada, registra la forma de cada filtro que llega a la base de datos
+y pide su plan:
+
+- SQLite (por defecto, en memoria): EXPLAIN QUERY PLAN; falla si algún paso
+  es un SCAN de la tabla.
+- MongoDB (--mongodb-url): explain del filtro sobre una base de datos
+  desechable (DATABASE_NAME + "_index_audit", se borra al terminar); falla
+  si el plan ganador contiene un COLLSCAN.
+
+Los listados completos ({}) y los filtros solo de exclusión ($nin/$ne)
+recorren la colección por definición y se aceptan. Termina con código 1 si
+alguna otra consulta no usa un índice.
+
+Uso:
+    python benchmarks/index_audit.py
+    python benchmarks/index_audit.py --mongodb-url mongodb://localhost:27017
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+logging.disable(logging.CRITICAL)
+
+# Operaciones de pymongo cuyo primer argumento es un filtro
+FILTER_METHODS = (
+    'find', 'find_one', 'count_documents', 'update_one', 'update_many',
+    'replace_one', 'delete_one', 'delete_many', 'find_one_and_update'
+)
+
+# Consultas que recorren la colección a propósito o por un límite del almacén
+ACCEPTED_SCANS = {
+    # posts tiene como máximo MAX_POSTS documentos y SQLite no indexa listas
+    ('sqlite', 'posts', 'channel_ids'): 'posts ≤ MAX_POSTS; SQLite no indexa campos lista',
+}
+
+def shape(value):
+    """Forma del filtro: mismos campos y operadores, sin los valores"""
+    if isinstance(value, dict):
+        return {key: shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [shape(value[0])] if value and isinstance(value[0], dict) else '[...]'
+    return '?'
+
+def shape_key(collection, query):
+    return collection, repr(shape(query))
+
+class RecordingCollection:
+    """Colección que anota el filtro de cada operación antes de ejecutarla"""
+
+    def __init__(self, collection, recorder):
+        self._collection = collection
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        attribute = getattr(self._collection, name)
+        if name in FILTER_METHODS:
+            def call(*args, **kwargs):
+                query = args[0] if args else kwargs.get('filter', {})
+                self._recorder.record(self._collection.name, query, name)
+                return attribute(*args, **kwargs)
+            return call
+        if name == 'bulk_write':
+            def bulk_write(requests, *args, **kwargs):
+                for request in requests:
+                    query = getattr(request, '_filter', None)
+                    if query is not None:
+                        self._recorder.record(self._collection.name, query, type(request).__name__)
+                return attribute(requests, *args, **kwargs)
+            return bulk_write
+        return attribute
+
+class RecordingDatabase:
+    def __init__(self, database):
+        self._database = database
+        self.queries = {}
+
+    def record(self, collection, query, operation):
+        key = shape_key(collection, query)
+        entry = self.queries.setdefault(key, {'query': query, 'operations': set()})
+        entry['operations'].add(operation)
+
+    def transaction(self):
+        return self._database.transaction()
+
+    def __getitem__(self, name):
+        return RecordingCollection(self._database[name], self)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+def accepted_reason(backend, collection, query):
+    if not query:
+        return 'listado completo'
+    fields = [key for key in query if not key.startswith('$')]
+    if fields and all(
+        isinstance(query[key], dict) and set(query[key]) <= {'$nin', '$ne'} for key in fields
+    ):
+        return 'solo exclusión'
+    for field in fields:
+        reason = ACCEPTED_SCANS.get((backend, collection, field))
+        if reason:
+            return reason
+    return None
+
+def plan_stages(plan):
+    """Todas las etapas (stage) del plan ganador de MongoDB, en cualquier versión"""
+    if isinstance(plan, dict):
+        stages = [plan['stage']] if 'stage' in plan else []
+        for value in plan.values():
+            stages.extend(plan_stages(value))
+        return stages
+    if isinstance(plan, list):
+        return [stage for item in plan for stage in plan_stages(item)]
+    return []
+
+def explain_sqlite(raw_db, collection, query):
+    steps = raw_db[collection].explain(query)
+    scans = [step for step in steps if step.startswith('SCAN')]
+    return ' | '.join(steps), bool(scans)
+
+def explain_mongodb(raw_db, collection, query):
+    result = raw_db.command('explain', {'find': collection, 'filter': query}, verbosity='queryPlanner')
+    stages = plan_stages(result['queryPlanner']['winningPlan'])
+    return ' > '.join(stages), 'COLLSCAN' in stages
+
+async def run_flows(raw_db):
+    """Los mismos caminos que recorre el bot, sobre datos sintéticos"""
+    import database
+    import fakes
+    import scheduler
+    from channel_manager import channel_manager
+    from dispatch_coordinator import DispatchCoordinator
+
+    bot = fakes.FakeBot(latency=0, seed=1)
+
+    database.migrate_posts_schema()
+    post_ids = fakes.seed_posts(3, 4, seed=1)
+    database.migrate_posts_schema()
+
+    # Menús y lecturas de los modelos
+    post_id = post_ids[0]
+    database.Post.find_active()
+    database.Post.find_config(post_id)
+    database.Post.find_active_configs()
+    database.Post.find_by_id(post_id)
+    database.Post.count_active()
+    database.PostSchedule.find_by_post_id(post_id)
+    database.PostSchedule.count_enabled()
+    channels = database.Channel.find_all()
+    channel_ids = [channel.channel_id for channel in channels]
+    database.Channel.find_by_channel_id(channel_ids[0])
+    database.Channel.find_by_channel_ids(channel_ids[:2])
+    database.Channel.find_excluding(channel_ids[:2])
+    database.Channel.count_all()
+    database.PostChannel.find_by_post_id(post_id)
+    database.PostChannel.count_by_post_id(post_id)
+
+    # Envío coordinado (resumen del administrador) y cola de eliminaciones
+    coordinator = DispatchCoordinator(window_seconds=0)
+    await asyncio.gather(*(coordinator.submit(bot, pid) for pid in post_ids))
+    raw_db.scheduled_jobs.update_many(
+        {'is_completed': False},
+        {'$set': {'scheduled_time': datetime.utcnow() - timedelta(seconds=1)}}
+    )
+    await scheduler.process_due_deletions(bot)
+
+    # Envío manual con una notificación por post y "Eliminar de Todos"
+    digest_enabled = scheduler.ADMIN_DIGEST_ENABLED
+    scheduler.ADMIN_DIGEST_ENABLED = False
+    try:
+        await asyncio.gather(*(
+            scheduler.send_post_to_channels_with_notification(bot, pid, True) for pid in post_ids
+        ))
+        raw_db.scheduled_jobs.update_many(
+            {'is_completed': False},
+            {'$set': {'scheduled_time': datetime.utcnow() - timedelta(seconds=1)}}
+        )
+        await scheduler.process_due_deletions(bot)
+        await scheduler.send_post_to_channels_with_notification(bot, post_id, True)
+        await scheduler.delete_all_post_messages_now(bot, post_id)
+    finally:
+        scheduler.ADMIN_DIGEST_ENABLED = digest_enabled
+
+    # Recuperación de envíos perdidos, compactación e historial
+    database.Post.mark_fired(post_id, datetime.utcnow() - timedelta(days=2))
+    await scheduler.reconcile_missed_posts(bot)
+    database.compact_history()
+    database.daily_totals(7)
+
+    # Desasignación y borrados en cascada
+    channel_manager.unassign_channel(post_ids[1], channel_ids[-1])
+    database.PostChannel.delete_assignment(post_ids[1], channel_ids[0])
+    database.PostChannel.delete_by_post_id(post_ids[2])
+    database.Channel.find_by_channel_id(channel_ids[1]).delete()
+    database.Post.find_by_id(post_id).delete()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mongodb-url', help='servidor de MongoDB (por defecto: SQLite en memoria)')
+    args = parser.parse_args()
+
+    if args.mongodb_url:
+        os.environ['MONGODB_URL'] = args.mongodb_url
+    import fakes  # noqa: F401  (debe importarse antes que database)
+    import config
+    config.DATABASE_NAME += '_index_audit'
+    import database
+
+    database.read_cache.enabled = False
+    if args.mongodb_url:
+        backend = 'mongodb'
+        storage = database.storage
+        storage.connect()
+        storage.db.client.drop_database(storage.db.name)
+        if not storage.ensure_ready():
+            print(f"No se pudo preparar MongoDB: {storage.last_error}")
+            return 1
+        source, raw_db = database.db, storage.db
+        explain = explain_mongodb
+    else:
+        backend = 'sqlite'
+        raw_db = source = fakes.use_sqlite_database(':memory:')
+        explain = explain_sqlite
+
+    recorder = RecordingDatabase(source)
+    database.db = recorder
+    try:
+        asyncio.run(run_flows(raw_db))
+        database.db = source
+
+        failures = 0
+        print(f"Almacén: {backend} | Consultas distintas: {len(recorder.queries)}\n")
+        for (collection, query_shape), entry in sorted(recorder.queries.items()):
+            plan, scans = explain(raw_db, collection, entry['query'])
+            reason = accepted_reason(backend, collection, entry['query']) if scans else None
+            if not scans:
+                status = 'OK'
+            elif reason:
+                status = f'ACEPTADO ({reason})'
+            else:
+                status = 'SIN ÍNDICE'
+                failures += 1
+            operations = ', '.join(sorted(entry['operations']))
+            print(f"{status:<12} {collection}.{operations} {query_shape}\n             {plan}")
+        print(f"\n{failures} consulta(s) sin índice")
+        return 1 if failures else 0
+    finally:
+        if backend == 'mongodb':
+            raw_db.client.drop_database(raw_db.name)
+            storage.close()
+
+if __name__ == '__main__':
+    sys.exit(main())
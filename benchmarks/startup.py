@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark del tiempo de arranque del bot
+
+Mide en un proceso nuevo lo que tarda `import bot` más la construcción de la
+Application, con MongoDB inalcanzable o lento. En modo perezoso (el actual) la
+conexión y los índices se preparan en segundo plano; con --eager se esperan
+antes de construir la Application, como hacía el arranque anterior.
+
+Uso:
+    python benchmarks/startup.py
+    python benchmarks/startup.py --mongodb-url mongodb://10.255.255.1:27017 --runs 5
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = '''
+import json, time
+started = time.perf_counter()
+import bot
+imported = time.perf_counter()
+from database import storage
+if EAGER:
+    storage.ensure_ready()
+else:
+    storage.start_background_init()
+bot.build_application()
+built = time.perf_counter()
+print(json.dumps({"import": imported - started, "ready": built - started}))
+'''
+
+def run_once(eager, env):
+    code = CHILD.replace('EAGER', 'True' if eager else 'False')
+    output = subprocess.run(
+        [sys.executable, '-c', code], cwd=ROOT, env=env,
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mongodb-url', default='mongodb://10.255.255.1:27017',
+                        help='servidor inalcanzable por defecto')
+    parser.add_argument('--timeout-ms', type=int, default=3000,
+                        help='MONGO_SERVER_SELECTION_TIMEOUT_MS del proceso hijo')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--eager', action='store_true', help='medir solo el arranque bloqueante')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.update({
+        'MONGODB_URL': args.mongodb_url,
+        'MONGO_SERVER_SELECTION_TIMEOUT_MS': str(args.timeout_ms),
+        'MONGO_CONNECT_TIMEOUT_MS': str(args.timeout_ms),
+        'BOT_TOKEN': env.get('BOT_TOKEN') or '123456:benchmark',
+    })
+
+    modes = [True] if args.eager else [False, True]
+    print(f"MongoDB: {args.mongodb_url} | Timeout: {args.timeout_ms} ms | Ejecuciones: {args.runs}\n")
+    header = f"{'Modo':<14}{'import bot':>12}{'Application':>14}"
+    print(header)
+    print('-' * len(header))
+    for eager in modes:
+        samples = [run_once(eager, env) for _ in range(args.runs)]
+        imported = min(s['import'] for s in samples)
+        ready = min(s['ready'] for s in samples)
+        print(f"{'bloqueante' if eager else 'perezoso':<14}{imported:>11.2f}s{ready:>13.2f}s")
+
+if __name__ == '__main__':
+    main()
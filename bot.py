@@ -6,8 +6,11 @@ from handlers import (
     start, handle_callback, handle_post_creation, 
     handle_text_input, admin_only
 )
-from scheduler import start_scheduler
-from health_server import health_server  # Nuevo import
+from scheduler import start_scheduler, stop_scheduler
+from database import storage
+from health_server import health_server
+from loop_watchdog import loop_watchdog
+from rate_limiter import rate_limiter
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -15,11 +18,30 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def main():
-    # Iniciar servidor de salud ANTES que el bot
-    health_server.start()
+async def post_init(application: Application):
+    # El servidor de salud y el vigilante corren en el mismo bucle que el bot
+    loop_watchdog.start()
+    await health_server.start()
     
-    application = Application.builder().token(BOT_TOKEN).build()
+    # Iniciar scheduler (los posts se cargan cuando MongoDB esté listo)
+    start_scheduler(application)
+
+async def post_shutdown(application: Application):
+    stop_scheduler()
+    await health_server.stop()
+    loop_watchdog.stop()
+    storage.close()
+
+def build_application():
+    # Todas las llamadas a Telegram pasan por el limitador compartido
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .rate_limiter(rate_limiter)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
     
     # Handlers
     application.add_handler(CommandHandler("start", start))
@@ -37,8 +59,13 @@ def main():
         handle_text_input
     ))
     
-    # Iniciar scheduler
-    start_scheduler(application)
+    return application
+
+def main():
+    # Conexión a la base de datos e índices en segundo plano: no retrasan el arranque
+    storage.start_background_init()
+    
+    application = build_application()
     
     logger.info("🤖 Bot y Health Server iniciados correctamente...")
     application.run_polling(allowed_updates=Update.ALL_TYPES)
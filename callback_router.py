@@ -0,0 +1,339 @@
+from collections import OrderedDict
+from telegram import Update
+from telegram.ext import ContextTypes
+from config import ADMIN_ID, CALLBACK_TOKEN_TTL_SECONDS, CALLBACK_TOKEN_MAX_ENTRIES
+from metrics import callback_seconds
+import base64
+import inspect
+import logging
+import re
+import secrets
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Límite de Telegram para callback_data (en bytes)
+MAX_CALLBACK_DATA = 64
+
+# callback_data compacto: "~" + código de la acción + argumentos empaquetados
+# en base64url; "~#" + token cuando no caben y se guardan en el servidor
+COMPACT_PREFIX = '~'
+TOKEN_PREFIX = '~#'
+
+# Formato anterior ("toggle_day_<post_id>_<día>"): las acciones tienen como
+# mucho este número de palabras separadas por "_" (p. ej. add_post_channels_bulk)
+MAX_ACTION_WORDS = 4
+
+# --- Tipos de argumento ---
+
+def _pack_varint(value):
+    """Entero con signo en zigzag + varint (1 byte para 0..63, 6 para un chat -100…)"""
+    value = value * 2 if value >= 0 else -value * 2 - 1
+    out = bytearray()
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+def _unpack_varint(buffer, pos):
+    result = shift = 0
+    while True:
+        if pos >= len(buffer):
+            raise ValueError("varint incompleto")
+        byte = buffer[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            break
+        shift += 7
+    return (result >> 1) ^ -(result & 1), pos
+
+class IntArg:
+    """Entero (día de la semana, índice...)"""
+
+    def pack(self, value):
+        return _pack_varint(int(value))
+
+    def unpack(self, buffer, pos):
+        return _unpack_varint(buffer, pos)
+
+    def parse(self, text):
+        return int(text)
+
+class ObjectIdArg:
+    """ObjectId en hexadecimal (24 caracteres) empaquetado en sus 12 bytes"""
+
+    _HEX = re.compile(r'^[0-9a-f]{24}$')
+
+    def pack(self, value):
+        value = str(value)
+        if not self._HEX.match(value):
+            raise ValueError(f"ObjectId no válido: {value!r}")
+        return bytes.fromhex(value)
+
+    def unpack(self, buffer, pos):
+        if pos + 12 > len(buffer):
+            raise ValueError("ObjectId incompleto")
+        return buffer[pos:pos + 12].hex(), pos + 12
+
+    def parse(self, text):
+        if not self._HEX.match(text):
+            raise ValueError(f"ObjectId no válido: {text!r}")
+        return text
+
+class ChatIdArg:
+    """Id de chat guardado como texto ("-100…"); viaja como entero"""
+
+    def pack(self, value):
+        return _pack_varint(int(value))
+
+    def unpack(self, buffer, pos):
+        value, pos = _unpack_varint(buffer, pos)
+        return str(value), pos
+
+    def parse(self, text):
+        return text
+
+INT = IntArg()
+OBJECT_ID = ObjectIdArg()
+CHAT_ID = ChatIdArg()
+
+# --- Acciones ---
+
+class Action:
+    """Acción de un botón: nombre, código compacto y esquema de argumentos"""
+
+    __slots__ = ('name', 'code', 'params')
+
+    def __init__(self, name, code, **params):
+        self.name = name
+        self.code = code
+        self.params = tuple(params.items())
+
+    def parse(self, raw):
+        """Argumentos del formato anterior (texto tras la acción); None si no encaja"""
+        if not self.params:
+            return None
+        # El último argumento se queda con el resto: admite "_" en su valor
+        values = raw.split('_', len(self.params) - 1)
+        if len(values) != len(self.params):
+            return None
+        try:
+            return {name: kind.parse(value) for (name, kind), value in zip(self.params, values)}
+        except ValueError:
+            return None
+
+    def pack(self, args):
+        return b''.join(kind.pack(value) for (_, kind), value in zip(self.params, args))
+
+    def unpack(self, buffer):
+        args, pos = {}, 0
+        for name, kind in self.params:
+            args[name], pos = kind.unpack(buffer, pos)
+        if pos != len(buffer):
+            raise ValueError("bytes sobrantes")
+        return args
+
+# Los códigos viajan en los botones ya enviados: no cambiarlos ni reutilizarlos
+ACTIONS = {action.name: action for action in (
+    # Usuarios no administradores
+    Action('show_benefits', 'a'),
+    Action('back_to_start', 'b'),
+    # Navegación principal
+    Action('back_main', 'c'),
+    Action('list_posts', 'd'),
+    Action('create_post', 'e'),
+    Action('statistics', 'f'),
+    # Posts
+    Action('post', 'g', post_id=OBJECT_ID),
+    Action('configure_schedule', 'h', post_id=OBJECT_ID),
+    Action('manage_post_channels', 'i', post_id=OBJECT_ID),
+    Action('delete_post', 'j', post_id=OBJECT_ID),
+    Action('confirm_delete', 'k', post_id=OBJECT_ID),
+    # Horarios
+    Action('set_time', 'l', post_id=OBJECT_ID),
+    Action('set_delete', 'm', post_id=OBJECT_ID),
+    Action('set_days', 'n', post_id=OBJECT_ID),
+    Action('toggle_day', 'o', post_id=OBJECT_ID, day_num=INT),
+    Action('save_days', 'p', post_id=OBJECT_ID),
+    # Opciones de envío
+    Action('toggle_pin', 'q', post_id=OBJECT_ID),
+    Action('toggle_forward', 'r', post_id=OBJECT_ID),
+    Action('cycle_catchup', 's', post_id=OBJECT_ID),
+    Action('send_now', 't', post_id=OBJECT_ID),
+    Action('confirm_send', 'u', post_id=OBJECT_ID),
+    Action('preview', 'v', post_id=OBJECT_ID),
+    Action('send_preview', 'w', post_id=OBJECT_ID),
+    # Canales por post
+    Action('add_post_channel', 'x', post_id=OBJECT_ID),
+    Action('add_post_channels_bulk', 'y', post_id=OBJECT_ID),
+    Action('remove_post_channel', 'z', post_id=OBJECT_ID),
+    Action('list_post_channels', 'A', post_id=OBJECT_ID),
+    Action('assign_post_channels', 'B', post_id=OBJECT_ID),
+    Action('remove_ch', 'C', post_id=OBJECT_ID, channel_index=INT),
+    Action('unassign_channel', 'D', post_id=OBJECT_ID, channel_id=CHAT_ID),
+    Action('toggle_channel', 'E', post_id=OBJECT_ID, channel_id=CHAT_ID),
+    Action('save_assignments', 'F', post_id=OBJECT_ID),
+    # Notificaciones al administrador
+    Action('resend_post', 'G', post_id=OBJECT_ID),
+    Action('delete_all_posts', 'H', post_id=OBJECT_ID),
+)}
+
+ACTIONS_BY_CODE = {action.code: action for action in ACTIONS.values()}
+if len(ACTIONS_BY_CODE) != len(ACTIONS):
+    raise ValueError("Códigos de acción de callback duplicados")
+
+# --- Tabla de tokens ---
+
+class CallbackTokens:
+    """Argumentos que no caben en 64 bytes, guardados en memoria con caducidad
+
+    Los botones con token dejan de funcionar al caducar o al reiniciar el bot.
+    """
+
+    def __init__(self, ttl=CALLBACK_TOKEN_TTL_SECONDS, max_entries=CALLBACK_TOKEN_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def issue(self, action, args):
+        token = secrets.token_urlsafe(9)
+        with self._lock:
+            self._entries[token] = (time.monotonic() + self.ttl, action, args)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return TOKEN_PREFIX + token
+
+    def get(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[token]
+                return None
+            return entry[1], entry[2]
+
+    def __len__(self):
+        return len(self._entries)
+
+# Instancia global
+callback_tokens = CallbackTokens()
+
+def encode_callback(action, *args):
+    """callback_data de un botón: compacto si cabe en 64 bytes; si no, un token"""
+    spec = ACTIONS[action]
+    if len(args) != len(spec.params):
+        raise TypeError(f"{action} espera {len(spec.params)} argumento(s), recibió {len(args)}")
+    try:
+        payload = base64.urlsafe_b64encode(spec.pack(args)).rstrip(b'=').decode('ascii')
+        data = COMPACT_PREFIX + spec.code + payload
+        if len(data) <= MAX_CALLBACK_DATA:
+            return data
+    except ValueError:
+        pass
+    return callback_tokens.issue(spec, {name: value for (name, _), value in zip(spec.params, args)})
+
+def decode_callback(data):
+    """Acción y argumentos de un callback_data, o (None, None)"""
+    if data.startswith(TOKEN_PREFIX):
+        return callback_tokens.get(data[len(TOKEN_PREFIX):]) or (None, None)
+
+    if data.startswith(COMPACT_PREFIX):
+        spec = ACTIONS_BY_CODE.get(data[1:2])
+        if spec is None:
+            return None, None
+        payload = data[2:]
+        try:
+            buffer = base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4))
+            return spec, spec.unpack(buffer)
+        except ValueError:
+            return None, None
+
+    # Formato anterior, para los botones enviados antes del formato compacto
+    spec = ACTIONS.get(data)
+    if spec is not None and not spec.params:
+        return spec, {}
+    words = data.split('_', MAX_ACTION_WORDS)
+    for size in range(min(len(words) - 1, MAX_ACTION_WORDS), 0, -1):
+        spec = ACTIONS.get('_'.join(words[:size]))
+        if spec is not None:
+            args = spec.parse('_'.join(words[size:]))
+            if args is not None:
+                return spec, args
+    return None, None
+
+# --- Enrutador ---
+
+class Route:
+    """Manejador de una acción"""
+
+    __slots__ = ('action', 'handler', 'public', 'pass_update', 'pass_context')
+
+    def __init__(self, action, handler, public=False):
+        self.action = action
+        self.handler = handler
+        self.public = public
+        # La firma se inspecciona una vez al registrar, no en cada pulsación
+        names = list(inspect.signature(handler).parameters)
+        self.pass_update = bool(names) and names[0] == 'update'
+        self.pass_context = 'context' in names
+
+class CallbackRouter:
+    """Enrutador de callback_data por tabla
+
+    Las acciones, sus códigos y el tipo de cada argumento se declaran en
+    ACTIONS; add() asocia un manejador a cada acción. Una pulsación se
+    decodifica en tiempo constante (código de una letra y argumentos
+    empaquetados, o un token) y los botones en el formato anterior se
+    resuelven por sus prefijos de palabras completas, del más largo al más
+    corto. La latencia de cada ruta se registra en bot_callback_seconds.
+    """
+
+    def __init__(self):
+        self._routes = {}
+
+    def add(self, action, handler, public=False):
+        if action not in ACTIONS:
+            raise ValueError(f"Acción de callback no declarada en ACTIONS: {action}")
+        if action in self._routes:
+            raise ValueError(f"Ruta de callback duplicada: {action}")
+        self._routes[action] = Route(action, handler, public)
+
+    def resolve(self, data):
+        """Ruta y argumentos para un callback_data, o (None, None)"""
+        spec, args = decode_callback(data)
+        if spec is None:
+            return None, None
+        route = self._routes.get(spec.name)
+        if route is None:
+            return None, None
+        return route, args
+
+    async def dispatch(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        started = time.perf_counter()
+        route, args = self.resolve(query.data or '')
+
+        if route is None:
+            logger.warning(f"Callback desconocido o caducado: {query.data!r}")
+            await query.answer("⚠️ Este botón ya no es válido.")
+            callback_seconds.observe(time.perf_counter() - started, route='unknown')
+            return
+
+        # Verificar si es administrador para las rutas no públicas
+        if not route.public and update.effective_user.id != ADMIN_ID:
+            await query.answer("❌ No tienes permisos de administrador.", show_alert=True)
+            return
+
+        await query.answer()
+        try:
+            positional = [update if route.pass_update else query]
+            if route.pass_context:
+                positional.append(context)
+            await route.handler(*positional, **args)
+        finally:
+            callback_seconds.observe(time.perf_counter() - started, route=route.action)
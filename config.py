@@ -15,3 +15,80 @@ TIMEZONE = 'America/Havana'  # Cuba timezone
 
 MAX_POSTS = 15
 MAX_CHANNELS_PER_POST = 90
+
+# Envío concurrente: número máximo de canales atendidos a la vez por post
+# (1 = envío secuencial, como antes)
+SEND_CONCURRENCY = int(os.getenv('SEND_CONCURRENCY', '10'))
+
+# Límites de la API de Telegram (compartidos por todo el bot)
+TELEGRAM_GLOBAL_MAX_RATE = int(os.getenv('TELEGRAM_GLOBAL_MAX_RATE', '30'))  # llamadas por segundo
+TELEGRAM_GROUP_MAX_RATE = int(os.getenv('TELEGRAM_GROUP_MAX_RATE', '20'))  # llamadas por canal...
+TELEGRAM_GROUP_TIME_PERIOD = int(os.getenv('TELEGRAM_GROUP_TIME_PERIOD', '60'))  # ...cada N segundos
+TELEGRAM_MAX_RETRIES = int(os.getenv('TELEGRAM_MAX_RETRIES', '3'))  # reintentos tras un RetryAfter
+
+# Cola de eliminaciones: cada cuántos segundos se revisan los mensajes vencidos
+DELETION_POLL_SECONDS = int(os.getenv('DELETION_POLL_SECONDS', '30'))
+
+# Escritura diferida de los registros de mensajes enviados (se agrupan y se
+# escriben en bloque); la cola de eliminaciones se escribe siempre en el momento
+WRITE_BEHIND_ENABLED = os.getenv('WRITE_BEHIND_ENABLED', 'false').lower() == 'true'
+WRITE_BEHIND_MAX_OPS = int(os.getenv('WRITE_BEHIND_MAX_OPS', '500'))
+WRITE_BEHIND_FLUSH_SECONDS = int(os.getenv('WRITE_BEHIND_FLUSH_SECONDS', '5'))
+
+# Hilos dedicados a las consultas de MongoDB (no bloquean el bucle de eventos)
+DB_EXECUTOR_WORKERS = int(os.getenv('DB_EXECUTOR_WORKERS', '8'))
+
+# Coordinador de envíos: los posts que disparan dentro de esta ventana (segundos)
+# se envían juntos, intercalando sus canales
+DISPATCH_WINDOW_SECONDS = float(os.getenv('DISPATCH_WINDOW_SECONDS', '2'))
+
+# Envíos perdidos: retraso tolerado antes de considerar atrasado un envío programado
+MISFIRE_GRACE_SECONDS = int(os.getenv('MISFIRE_GRACE_SECONDS', '60'))
+# Días hacia atrás que se revisan al arrancar para recuperar envíos perdidos
+CATCHUP_MAX_DAYS = int(os.getenv('CATCHUP_MAX_DAYS', '7'))
+
+# Servidor de salud (liveness en /live, readiness en /ready)
+HEALTH_PORT = int(os.getenv('HEALTH_PORT', '8000'))
+HEALTH_MAX_LOOP_LAG_SECONDS = float(os.getenv('HEALTH_MAX_LOOP_LAG_SECONDS', '1.0'))  # retraso máximo del bucle
+HEALTH_MONGO_TIMEOUT_SECONDS = float(os.getenv('HEALTH_MONGO_TIMEOUT_SECONDS', '2.0'))  # tiempo máximo del ping
+HEALTH_MAX_SEND_AGE_HOURS = float(os.getenv('HEALTH_MAX_SEND_AGE_HOURS', '192'))  # 0 = no comprobar
+
+# Vigilante del bucle de eventos: registra qué función lo bloquea más de este umbral
+LOOP_WATCHDOG_THRESHOLD_SECONDS = float(os.getenv('LOOP_WATCHDOG_THRESHOLD_SECONDS', '0.25'))
+LOOP_WATCHDOG_INTERVAL_SECONDS = float(os.getenv('LOOP_WATCHDOG_INTERVAL_SECONDS', '0.1'))
+LOOP_WATCHDOG_REPORT_SIZE = int(os.getenv('LOOP_WATCHDOG_REPORT_SIZE', '50'))  # bloqueos recientes guardados
+
+# Notificaciones al administrador: un único mensaje por ventana de envío, editado
+# a medida que avanzan los envíos y eliminaciones (false = un mensaje por post)
+ADMIN_DIGEST_ENABLED = os.getenv('ADMIN_DIGEST_ENABLED', 'true').lower() == 'true'
+ADMIN_DIGEST_EDIT_SECONDS = float(os.getenv('ADMIN_DIGEST_EDIT_SECONDS', '3'))  # mínimo entre ediciones
+
+# Caché de lecturas de posts, horarios y canales
+CACHE_ENABLED = os.getenv('CACHE_ENABLED', 'true').lower() == 'true'
+CACHE_TTL_SECONDS = int(os.getenv('CACHE_TTL_SECONDS', '300'))
+# Cada cuántos segundos se consulta el contador de versión (cambios de otras réplicas)
+CACHE_VERSION_CHECK_SECONDS = float(os.getenv('CACHE_VERSION_CHECK_SECONDS', '5'))
+
+# Cliente de MongoDB (la conexión y los índices se crean en segundo plano al arrancar)
+MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', '20'))
+MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', '0'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', '5000'))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', '20000'))
+MONGO_COMPRESSORS = os.getenv('MONGO_COMPRESSORS', 'zlib')  # p. ej. "zstd,snappy,zlib"; vacío = sin compresión
+
+# Almacén: 'mongodb' (por defecto) o 'sqlite' (fichero local, un solo nodo)
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'mongodb').lower()
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'auto_post_bot.db')
+
+# Retención del historial: los registros ya finalizados (mensajes eliminados,
+# lotes notificados, trabajos completados) se resumen por día, post y canal en
+# daily_stats y caducan tras RETENTION_DAYS (0 = conservarlos para siempre)
+RETENTION_DAYS = int(os.getenv('RETENTION_DAYS', '30'))
+COMPACTION_INTERVAL_MINUTES = int(os.getenv('COMPACTION_INTERVAL_MINUTES', '60'))
+COMPACTION_BATCH_SIZE = int(os.getenv('COMPACTION_BATCH_SIZE', '5000'))  # documentos por lote
+
+# Botones cuyo callback_data no cabe en 64 bytes: sus argumentos se guardan en
+# memoria con un token (caducan tras este tiempo o al reiniciar el bot)
+CALLBACK_TOKEN_TTL_SECONDS = int(os.getenv('CALLBACK_TOKEN_TTL_SECONDS', '86400'))
+CALLBACK_TOKEN_MAX_ENTRIES = int(os.getenv('CALLBACK_TOKEN_MAX_ENTRIES', '10000'))
@@ -1,73 +1,553 @@
-from pymongo import MongoClient
-from datetime import datetime
+from pymongo import MongoClient, monitoring
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from pymongo import ReturnDocument, UpdateOne
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import asyncio
+import contextlib
+import copy
+import functools
 import logging
-from config import MONGODB_URL, DATABASE_NAME
+import threading
+import time
+import pytz
+from config import (
+    MONGODB_URL, DATABASE_NAME, WRITE_BEHIND_MAX_OPS, DB_EXECUTOR_WORKERS,
+    CACHE_ENABLED, CACHE_TTL_SECONDS, CACHE_VERSION_CHECK_SECONDS,
+    MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    MONGO_CONNECT_TIMEOUT_MS, MONGO_SOCKET_TIMEOUT_MS, MONGO_COMPRESSORS,
+    STORAGE_BACKEND, SQLITE_PATH, TIMEZONE, RETENTION_DAYS, COMPACTION_BATCH_SIZE
+)
+from metrics import (
+    db_write_seconds, mongo_operation_seconds, cache_requests_total, cache_invalidations_total,
+    compacted_records_total
+)
 
 logger = logging.getLogger(__name__)
 
-class MongoDB:
-    _instance = None
-    _client = None
-    _db = None
+class CommandMetricsListener(monitoring.CommandListener):
+    """Mide la latencia de cada comando de MongoDB por colección"""
     
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(MongoDB, cls).__new__(cls)
-        return cls._instance
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+    
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = ''
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = collection
+    
+    def _finish(self, event):
+        with self._lock:
+            collection = self._pending.pop((event.connection_id, event.request_id), '')
+        mongo_operation_seconds.observe(
+            event.duration_micros / 1_000_000, collection=collection, command=event.command_name
+        )
+    
+    def succeeded(self, event):
+        self._finish(event)
+    
+    def failed(self, event):
+        self._finish(event)
+
+# Índices de cada patrón de acceso: (colección, claves, opciones). Los únicos
+# son las claves de los upserts; benchmarks/index_audit.py comprueba con
+# explain que ninguna consulta del bot recorre una colección entera.
+INDEXES = [
+    # Posts
+    ('posts', [('is_active', 1)], {}),
+    ('posts', [('channel_ids', 1)], {}),
+    ('posts', [('schema_version', 1)], {}),
+    
+    # Canales
+    ('channels', [('channel_id', 1)], {'unique': True}),
+    
+    # Asignaciones (colección anterior al esquema embebido)
+    ('post_channels', [('post_id', 1), ('channel_id', 1)], {'unique': True}),
+    ('post_channels', [('channel_id', 1)], {}),
+    
+    # Horarios (colección anterior al esquema embebido)
+    ('post_schedules', [('post_id', 1)], {}),
+    ('post_schedules', [('is_enabled', 1)], {}),
+    
+    # Cola de eliminaciones
+    ('scheduled_jobs', [('job_type', 1), ('is_completed', 1), ('scheduled_time', 1)], {}),
+    ('scheduled_jobs', [('post_id', 1), ('is_completed', 1)], {}),
+    ('scheduled_jobs', [('is_completed', 1), ('expire_at', 1)], {}),
+    
+    # Mensajes enviados: un documento por post, envío y canal
+    ('sent_messages', [('post_id', 1), ('send_time', 1), ('channel_id', 1)], {'unique': True}),
+    ('sent_messages', [('post_id', 1), ('send_time', 1), ('deleted', 1)], {}),
+    ('sent_messages', [('post_id', 1), ('deleted', 1)], {}),
+    ('sent_messages', [('rolled_up', 1), ('deleted', 1)], {}),
+    
+    # Estadísticas de eliminación: un agregado por post y envío
+    ('deletion_stats', [('post_id', 1), ('send_time', 1)], {'unique': True}),
+    ('deletion_stats', [('notified', 1), ('expire_at', 1)], {}),
+    
+    # Notificaciones al administrador
+    ('notification_messages', [('post_id', 1), ('send_time', 1), ('deleted', 1)], {}),
+    ('notification_messages', [('deleted', 1), ('expire_at', 1)], {}),
+    ('notification_messages', [('send_time', 1), ('expire_at', 1)], {}),
+    ('notification_digests', [('send_time', 1)], {'unique': True}),
+    
+    # Resumen diario
+    ('daily_stats', [('day', 1), ('post_id', 1), ('channel_id', 1)], {'unique': True}),
+    ('daily_stats', [('post_id', 1)], {}),
+    
+    # Caducidad (TTL) de los registros finalizados
+    ('sent_messages', [('expire_at', 1)], {'expireAfterSeconds': 0}),
+    ('scheduled_jobs', [('expire_at', 1)], {'expireAfterSeconds': 0}),
+    ('deletion_stats', [('expire_at', 1)], {'expireAfterSeconds': 0}),
+    ('notification_messages', [('expire_at', 1)], {'expireAfterSeconds': 0}),
+    ('notification_digests', [('expire_at', 1)], {'expireAfterSeconds': 0}),
+]
+
+# IndexOptionsConflict / IndexKeySpecsConflict
+INDEX_CONFLICT_CODES = (85, 86)
+
+def find_duplicates(collection, fields, limit=10):
+    """Claves repetidas por los campos dados (solo lectura)
+    
+    Devuelve (número de claves repetidas, hasta `limit` ejemplos).
+    """
+    counts = {}
+    for doc in collection.find({}, {field: 1 for field in fields}):
+        key = tuple(doc.get(field) for field in fields)
+        counts[repr(key)] = counts.get(repr(key), 0) + 1
+    duplicated = [key for key, count in counts.items() if count > 1]
+    return len(duplicated), duplicated[:limit]
+
+class Storage:
+    """Ciclo de vida común de los almacenes
+    
+    No abre nada al importarse: la base de datos se abre en el primer uso y
+    start_background_init() hace la comprobación y crea los índices en un
+    hilo aparte, reintentando hasta conseguirlo. /ready no está listo hasta
+    entonces.
+    """
+    
+    name = None
     
     def __init__(self):
-        if self._client is None:
-            try:
-                self._client = MongoClient(MONGODB_URL)
-                self._db = self._client[DATABASE_NAME]
-                
-                # Crear índices
-                self._create_indexes()
-                logger.info("Conectado a MongoDB exitosamente")
-            except Exception as e:
-                logger.error(f"Error conectando a MongoDB: {e}")
-                raise
+        self._lock = threading.Lock()
+        self._init_thread = None
+        self._db = None
+        self.connected = False
+        self.indexes_ready = False
+        self.failed_indexes = []
+        self.last_error = None
+        self.ready_seconds = None
+    
+    def _open(self):
+        raise NotImplementedError
+    
+    def _probe(self):
+        """Comprobación del servidor al conectar"""
+        self._db.command('ping')
+    
+    def connect(self):
+        """Abre la base de datos si aún no está abierta"""
+        if self._db is not None:
+            return
+        with self._lock:
+            if self._db is None:
+                self._db = self._open()
+    
+    def ensure_ready(self):
+        """Conecta, comprueba el servidor y crea los índices. Devuelve True si todo fue bien"""
+        started = time.perf_counter()
+        try:
+            self.connect()
+            self._probe()
+            self.connected = True
+            logger.info(f"Conectado a {self.name} exitosamente")
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"Error conectando a {self.name}: {e}")
+            return False
+        
+        if not self.indexes_ready:
+            self.indexes_ready = self._create_indexes()
+        if self.indexes_ready:
+            self.last_error = None
+            self.ready_seconds = time.perf_counter() - started
+        return self.indexes_ready
+    
+    def start_background_init(self):
+        """Conexión e índices en segundo plano, con reintentos"""
+        if self._init_thread is not None:
+            return
+        
+        def init_loop():
+            delay = 1
+            while not self.ensure_ready():
+                time.sleep(delay)
+                delay = min(delay * 2, 60)
+        
+        self._init_thread = threading.Thread(target=init_loop, name='storage-init', daemon=True)
+        self._init_thread.start()
+    
+    @property
+    def ready(self):
+        return self.connected and self.indexes_ready
     
     def _create_indexes(self):
-        """Crear índices para optimizar consultas"""
+        """Crear índices para optimizar consultas (ver INDEXES)
+        
+        Un índice único que choca con datos repetidos no se crea (ver
+        _ensure_index) y queda en failed_indexes; el resto sí.
+        """
+        self.failed_indexes = []
         try:
-            # Índices para posts
-            self._db.posts.create_index("is_active")
-            
-            # Índices para canales
-            self._db.channels.create_index("channel_id", unique=True)
-            
-            # Índices para post_channels
-            self._db.post_channels.create_index([("post_id", 1), ("channel_id", 1)])
-            
-            # Índices para post_schedules
-            self._db.post_schedules.create_index("post_id")
-            
-            # Índices para scheduled_jobs
-            self._db.scheduled_jobs.create_index([("post_id", 1), ("is_completed", 1)])
-            
-            # Nuevos índices para notificaciones
-            self._db.sent_messages.create_index([("post_id", 1), ("deleted", 1)])
-            self._db.deletion_stats.create_index([("post_id", 1), ("send_time", 1)])
+            for collection_name, keys, options in INDEXES:
+                self._ensure_index(self._db[collection_name], keys, options)
+            return True
             
         except Exception as e:
+            self.last_error = str(e)
             logger.error(f"Error creando índices: {e}")
+            return False
+    
+    def _ensure_index(self, collection, keys, options, retry=True):
+        try:
+            collection.create_index(keys, **options)
+        except DuplicateKeyError:
+            # Datos anteriores al índice único: nunca se borran aquí; el índice
+            # queda sin crear hasta que se limpien a mano
+            if not self._report_duplicates(collection, keys):
+                raise
+        except OperationFailure as e:
+            # Mismo índice creado antes con otras opciones (p. ej. no único): se recrea,
+            # salvo que el nuevo índice único no se pueda crear por datos repetidos
+            if not retry or e.code not in INDEX_CONFLICT_CODES:
+                raise
+            if options.get('unique') and self._report_duplicates(collection, keys):
+                return
+            collection.drop_index(keys)
+            self._ensure_index(collection, keys, options, retry=False)
+    
+    def _report_duplicates(self, collection, keys):
+        """Registra las claves repetidas que impiden un índice único; True si las hay"""
+        fields = [field for field, _ in keys]
+        count, examples = find_duplicates(collection, fields)
+        if not count:
+            return False
+        index_name = f"{collection.name}({', '.join(fields)})"
+        self.failed_indexes.append(index_name)
+        logger.error(
+            f"No se crea el índice único {index_name}: {count} claves repetidas "
+            f"(p. ej. {', '.join(examples)}). No se ha borrado ningún documento"
+        )
+        return True
     
     @property
     def db(self):
+        self.connect()
         return self._db
     
+    def transaction(self):
+        """Contexto transaccional; entrega la sesión que reciben las operaciones"""
+        return self.db.transaction()
+    
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+
+class MongoDB(Storage):
+    """MongoDB remoto (Atlas); la resolución SRV ocurre al abrir"""
+    
+    name = 'MongoDB'
+    # Las transacciones multi-documento requieren un replica set o mongos
+    supports_transactions = False
+    
+    def _probe(self):
+        hello = self._db.command('hello')
+        self.supports_transactions = bool(hello.get('setName') or hello.get('msg') == 'isdbgrid')
+    
+    @contextlib.contextmanager
+    def transaction(self):
+        self.connect()
+        if not self.supports_transactions:
+            yield None
+            return
+        with self._client.start_session() as session:
+            with session.start_transaction():
+                yield session
+    
+    def _open(self):
+        options = {
+            'maxPoolSize': MONGO_MAX_POOL_SIZE,
+            'minPoolSize': MONGO_MIN_POOL_SIZE,
+            'serverSelectionTimeoutMS': MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            'connectTimeoutMS': MONGO_CONNECT_TIMEOUT_MS,
+            'socketTimeoutMS': MONGO_SOCKET_TIMEOUT_MS,
+            'event_listeners': [CommandMetricsListener()]
+        }
+        if MONGO_COMPRESSORS:
+            options['compressors'] = MONGO_COMPRESSORS
+        self._client = MongoClient(MONGODB_URL, **options)
+        return self._client[DATABASE_NAME]
+    
     def close(self):
-        if self._client:
+        if self._db is not None:
             self._client.close()
 
+class SQLite(Storage):
+    """Fichero SQLite local, para despliegues de un solo nodo"""
+    
+    name = 'SQLite'
+    
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+    
+    def _open(self):
+        from storage import SQLiteDatabase
+        return SQLiteDatabase(self.path)
+
+def create_storage():
+    """Almacén según STORAGE_BACKEND ('mongodb' o 'sqlite')"""
+    if STORAGE_BACKEND == 'sqlite':
+        return SQLite(SQLITE_PATH)
+    return MongoDB()
+
+class LazyDatabase:
+    """Base de datos que se abre en el primer acceso a una colección"""
+    
+    def __getattr__(self, name):
+        return getattr(storage.db, name)
+    
+    def __getitem__(self, name):
+        return storage.db[name]
+    
+    def transaction(self):
+        return storage.transaction()
+
 # Instancia global
-mongodb = MongoDB()
-db = mongodb.db
+storage = create_storage()
+db = LazyDatabase()
+
+# Pool acotado para las llamadas síncronas a la base de datos desde corrutinas
+_db_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix='mongodb')
+
+async def run_db(func, *args, **kwargs):
+    """Ejecuta una llamada a la base de datos en el pool dedicado sin bloquear el bucle de eventos"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, functools.partial(func, *args, **kwargs))
+
+class WriteBehindBuffer:
+    """Acumula escrituras por colección y las envía como bulk_write desordenados"""
+    
+    def __init__(self, max_ops=WRITE_BEHIND_MAX_OPS):
+        self.max_ops = max_ops
+        self._ops = {}
+        self._size = 0
+        self._lock = threading.Lock()
+    
+    def add(self, collection_name, operations):
+        with self._lock:
+            self._ops.setdefault(collection_name, []).extend(operations)
+            self._size += len(operations)
+            should_flush = self._size >= self.max_ops
+        if should_flush:
+            self.flush()
+    
+    def pending(self):
+        return self._size
+    
+    def flush(self):
+        """Escribe todo lo acumulado: un bulk_write por colección"""
+        with self._lock:
+            ops, self._ops, self._size = self._ops, {}, 0
+        
+        for collection_name, operations in ops.items():
+            bulk_write(collection_name, operations)
+
+def bulk_write(collection_name, operations):
+    """bulk_write desordenado con registro de latencia"""
+    if not operations:
+        return None
+    try:
+        with db_write_seconds.time(operation=f"{collection_name}.bulk_write"):
+            return db[collection_name].bulk_write(operations, ordered=False)
+    except Exception as e:
+        logger.error(f"Error en escritura masiva de {collection_name}: {e}")
+        return None
+
+# Buffer global (solo se usa si WRITE_BEHIND_ENABLED está activo)
+write_behind = WriteBehindBuffer()
+
+class ReadCache:
+    """Caché de lectura en memoria para posts, horarios, canales y asignaciones
+    
+    Cada escritura vacía la caché e incrementa un contador de versión en
+    MongoDB (colección cache_versions). Las lecturas comprueban el contador
+    como mucho cada CACHE_VERSION_CHECK_SECONDS: si otra réplica escribió, la
+    caché se vacía. Las entradas caducan además tras CACHE_TTL_SECONDS.
+    """
+    
+    VERSION_ID = 'read_cache'
+    
+    def __init__(self, ttl=CACHE_TTL_SECONDS, check_interval=CACHE_VERSION_CHECK_SECONDS, enabled=CACHE_ENABLED):
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self.enabled = enabled
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._version = None
+        self._last_check = 0.0
+    
+    def _clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+    
+    def _check_version(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        try:
+            doc = db.cache_versions.find_one({'_id': self.VERSION_ID})
+            version = doc['version'] if doc else 0
+        except Exception as e:
+            logger.error(f"Error leyendo versión de la caché: {e}")
+            self._clear()
+            return
+        
+        if self._version is not None and version != self._version:
+            cache_invalidations_total.inc(source='remote')
+            self._clear()
+        self._version = version
+    
+    def get_or_load(self, key, loader):
+        if not self.enabled:
+            return loader()
+        
+        self._check_version()
+        with self._lock:
+            entry = self._entries.get(key)
+            generation = self._generation
+        
+        if entry and entry[0] > time.monotonic():
+            cache_requests_total.inc(cache=key[0], result='hit')
+            return copy.deepcopy(entry[1])
+        
+        cache_requests_total.inc(cache=key[0], result='miss')
+        value = loader()
+        
+        # No guardar resultados vacíos (pueden venir de un error de conexión)
+        # ni lecturas que empezaron antes de una escritura
+        if _cacheable(value):
+            with self._lock:
+                if generation == self._generation:
+                    self._entries[key] = (time.monotonic() + self.ttl, copy.deepcopy(value))
+        return value
+    
+    def invalidate(self):
+        """Vacía la caché y avisa a las demás réplicas"""
+        self._clear()
+        cache_invalidations_total.inc(source='local')
+        if not self.enabled:
+            return
+        try:
+            doc = db.cache_versions.find_one_and_update(
+                {'_id': self.VERSION_ID},
+                {'$inc': {'version': 1}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            self._version = doc['version'] if doc else None
+        except Exception as e:
+            logger.error(f"Error actualizando versión de la caché: {e}")
+    
+    def get_stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'version': self._version, 'enabled': self.enabled}
+
+def _cacheable(value):
+    if not value:
+        return False
+    if isinstance(value, tuple) and value[0] is None:
+        return False
+    return True
+
+def _cache_arg(value):
+    if isinstance(value, (str, bytes, int, float, bool)) or value is None:
+        return value
+    try:
+        return tuple(value)
+    except TypeError:
+        return str(value)
+
+def cached(name):
+    """Lectura a través de la caché; la clave es el nombre y los argumentos"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(cls, *args):
+            args = tuple(_cache_arg(arg) for arg in args)
+            return read_cache.get_or_load((name,) + args, lambda: func(cls, *args))
+        return wrapper
+    return decorator
+
+# Caché global
+read_cache = ReadCache()
+
+# Versión 2: el horario y los canales asignados van embebidos en el documento del post
+POST_SCHEMA_VERSION = 2
+
+def _post_object_id(post_id):
+    from bson import ObjectId
+    return post_id if isinstance(post_id, ObjectId) else ObjectId(post_id)
+
+def migrate_posts_schema():
+    """Migración en línea de post_schedules y post_channels al documento del post
+    
+    Es idempotente y puede ejecutarse con el bot funcionando: las escrituras
+    nuevas ya actualizan ambas copias y los posts no migrados se siguen
+    leyendo de las colecciones antiguas.
+    """
+    migrated = 0
+    try:
+        outdated = {'$or': [
+            {'schema_version': {'$exists': False}},
+            {'schema_version': {'$lt': POST_SCHEMA_VERSION}}
+        ]}
+        for doc in db.posts.find(outdated):
+            post_id = str(doc['_id'])
+            update = {'$set': {'schema_version': POST_SCHEMA_VERSION}}
+            
+            schedule_doc = db.post_schedules.find_one({'post_id': post_id})
+            if schedule_doc:
+                schedule_doc.pop('post_id', None)
+                update['$set']['schedule'] = schedule_doc
+            
+            channel_ids = [pc['channel_id'] for pc in db.post_channels.find({'post_id': post_id})]
+            update['$addToSet'] = {'channel_ids': {'$each': channel_ids}}
+            
+            db.posts.update_one({'_id': doc['_id']}, update)
+            migrated += 1
+        
+        if migrated:
+            read_cache.invalidate()
+            logger.info(f"Migrados {migrated} posts al esquema v{POST_SCHEMA_VERSION}")
+    except Exception as e:
+        logger.error(f"Error migrando posts: {e}")
+    return migrated
 
 class Post:
+    __slots__ = ('name', 'source_channel', 'source_message_id', 'content_type', 'content_text',
+                 'file_id', 'is_active', 'dispatch_strategy', 'strategy_source',
+                 'last_fired_at', 'created_at', '_id')
+    
     def __init__(self, name, source_channel, source_message_id, content_type, 
-                 content_text="", file_id=None, is_active=True, _id=None):
+                 content_text="", file_id=None, is_active=True, 
+                 dispatch_strategy=None, strategy_source=None, last_fired_at=None,
+                 created_at=None, _id=None):
         self.name = name
         self.source_channel = source_channel
         self.source_message_id = source_message_id
@@ -75,7 +555,13 @@ class Post:
         self.content_text = content_text or ""
         self.file_id = file_id
         self.is_active = is_active
-        self.created_at = datetime.utcnow()
+        # Estrategia de envío aprendida ('forward', 'copy' o 'send') y fuente para la que vale
+        self.dispatch_strategy = dispatch_strategy
+        self.strategy_source = strategy_source
+        # Último envío programado que se disparó (UTC); sirve para recuperar envíos perdidos
+        self.last_fired_at = last_fired_at
+        # Solo los posts nuevos toman la hora actual; los cargados conservan la suya
+        self.created_at = created_at or (None if _id else datetime.utcnow())
         self._id = _id
     
     def to_dict(self):
@@ -87,8 +573,11 @@ class Post:
             'content_text': self.content_text,
             'file_id': self.file_id,
             'is_active': self.is_active,
-            'created_at': self.created_at
+            'dispatch_strategy': self.dispatch_strategy,
+            'strategy_source': self.strategy_source
         }
+        if self.created_at:
+            doc['created_at'] = self.created_at
         if self._id:
             doc['_id'] = self._id
         return doc
@@ -103,22 +592,118 @@ class Post:
             content_text=doc.get('content_text', ''),
             file_id=doc.get('file_id'),
             is_active=doc.get('is_active', True),
+            dispatch_strategy=doc.get('dispatch_strategy'),
+            strategy_source=doc.get('strategy_source'),
+            last_fired_at=doc.get('last_fired_at'),
+            created_at=doc.get('created_at'),
             _id=doc.get('_id')
         )
     
+    @property
+    def source_key(self):
+        """Identifica el mensaje original; si cambia, la estrategia se vuelve a aprender"""
+        return f"{self.source_channel}:{self.source_message_id}"
+    
+    def learned_strategy(self):
+        if self.strategy_source == self.source_key:
+            return self.dispatch_strategy
+        return None
+    
+    def set_dispatch_strategy(self, strategy):
+        try:
+            self.dispatch_strategy = strategy
+            self.strategy_source = self.source_key
+            if self._id:
+                db.posts.update_one(
+                    {'_id': self._id},
+                    {'$set': {'dispatch_strategy': strategy, 'strategy_source': self.strategy_source}}
+                )
+            read_cache.invalidate()
+            return True
+        except Exception as e:
+            logger.error(f"Error guardando estrategia de envío: {e}")
+            return False
+    
+    @classmethod
+    def mark_fired(cls, post_id, fired_at=None):
+        """Guarda la hora (UTC) del último envío programado; nunca retrocede"""
+        try:
+            fired_at = fired_at or datetime.utcnow()
+            db.posts.update_one({'_id': _post_object_id(post_id)}, {'$max': {'last_fired_at': fired_at}})
+            read_cache.invalidate()
+            return True
+        except Exception as e:
+            logger.error(f"Error guardando último envío: {e}")
+            return False
+    
     def save(self):
         try:
             if self._id:
                 db.posts.update_one({'_id': self._id}, {'$set': self.to_dict()})
             else:
-                result = db.posts.insert_one(self.to_dict())
+                # Los posts nuevos nacen con el esquema consolidado
+                doc = self.to_dict()
+                doc['schema_version'] = POST_SCHEMA_VERSION
+                doc['channel_ids'] = []
+                result = db.posts.insert_one(doc)
                 self._id = result.inserted_id
+            read_cache.invalidate()
             return True
         except Exception as e:
             logger.error(f"Error guardando post: {e}")
             return False
     
     @classmethod
+    def _config_from_doc(cls, doc):
+        """Construye (post, horario, canales) desde un documento con esquema consolidado"""
+        post = cls.from_dict(doc)
+        schedule = None
+        if doc.get('schedule'):
+            schedule = PostSchedule.from_dict({**doc['schedule'], 'post_id': str(post._id)})
+        return post, schedule, list(doc.get('channel_ids', []))
+    
+    @classmethod
+    @cached('Post.find_config')
+    def find_config(cls, post_id):
+        """Post, horario y canales asignados en una sola consulta
+        
+        Devuelve (post, horario, lista de channel_id) o (None, None, []).
+        Los posts aún no migrados se leen de las colecciones antiguas.
+        """
+        try:
+            from bson import ObjectId
+            doc = db.posts.find_one({'_id': ObjectId(post_id)})
+            if not doc:
+                return None, None, []
+            if doc.get('schema_version', 1) >= POST_SCHEMA_VERSION:
+                return cls._config_from_doc(doc)
+            
+            post = cls.from_dict(doc)
+            schedule = PostSchedule.find_by_post_id(post_id)
+            channel_ids = [pc.channel_id for pc in PostChannel.find_by_post_id(post_id)]
+            return post, schedule, channel_ids
+        except Exception as e:
+            logger.error(f"Error buscando configuración del post: {e}")
+            return None, None, []
+    
+    @classmethod
+    @cached('Post.find_active_configs')
+    def find_active_configs(cls):
+        """Configuración completa de todos los posts activos; None si la consulta falla"""
+        try:
+            configs = []
+            for doc in db.posts.find({'is_active': True}):
+                if doc.get('schema_version', 1) >= POST_SCHEMA_VERSION:
+                    configs.append(cls._config_from_doc(doc))
+                else:
+                    configs.append(cls.find_config(str(doc['_id'])))
+            return configs
+        except Exception as e:
+            logger.error(f"Error buscando configuración de posts activos: {e}")
+            return None
+    
+    @classmethod
+    @cached('Post.find_by_id')
     def find_by_id(cls, post_id):
         try:
             from bson import ObjectId
@@ -129,6 +714,7 @@ class Post:
             return None
     
     @classmethod
+    @cached('Post.find_active')
     def find_active(cls):
         try:
             docs = db.posts.find({'is_active': True})
@@ -138,6 +724,7 @@ class Post:
             return []
     
     @classmethod
+    @cached('Post.count_active')
     def count_active(cls):
         try:
             return db.posts.count_documents({'is_active': True})
@@ -146,27 +733,19 @@ class Post:
             return 0
     
     def delete(self):
-        try:
-            if self._id:
-                # Eliminar registros relacionados
-                from bson import ObjectId
-                post_id_str = str(self._id)
-                
-                db.post_channels.delete_many({'post_id': post_id_str})
-                db.post_schedules.delete_many({'post_id': post_id_str})
-                db.scheduled_jobs.delete_many({'post_id': post_id_str})
-                db.sent_messages.delete_many({'post_id': post_id_str})
-                db.deletion_stats.delete_many({'post_id': post_id_str})
-                db.posts.delete_one({'_id': self._id})
-                return True
-        except Exception as e:
-            logger.error(f"Error eliminando post: {e}")
+        """Elimina el post y todo lo que depende de él (ver delete_post_cascade)"""
+        if not self._id:
             return False
+        return delete_post_cascade(self._id)
 
 class PostSchedule:
+    __slots__ = ('post_id', 'send_time', 'delete_after_hours', 'days_of_week', 'is_enabled',
+                 'pin_message', 'forward_original', 'catchup_policy', 'catchup_window_minutes', '_id')
+    
     def __init__(self, post_id, send_time="09:00", delete_after_hours=24, 
                  days_of_week="1,2,3,4,5,6,7", is_enabled=True, 
-                 pin_message=False, forward_original=True, _id=None):
+                 pin_message=False, forward_original=True, 
+                 catchup_policy="late", catchup_window_minutes=60, _id=None):
         self.post_id = str(post_id)
         self.send_time = send_time
         self.delete_after_hours = delete_after_hours
@@ -174,6 +753,11 @@ class PostSchedule:
         self.is_enabled = is_enabled
         self.pin_message = pin_message
         self.forward_original = forward_original
+        # Qué hacer con un envío perdido (caída o bucle bloqueado): 'skip' no lo
+        # recupera, 'late' lo envía si no han pasado catchup_window_minutes y
+        # 'coalesce' junta todos los perdidos en un único envío
+        self.catchup_policy = catchup_policy
+        self.catchup_window_minutes = catchup_window_minutes
         self._id = _id
     
     def to_dict(self):
@@ -184,7 +768,9 @@ class PostSchedule:
             'days_of_week': self.days_of_week,
             'is_enabled': self.is_enabled,
             'pin_message': self.pin_message,
-            'forward_original': self.forward_original
+            'forward_original': self.forward_original,
+            'catchup_policy': self.catchup_policy,
+            'catchup_window_minutes': self.catchup_window_minutes
         }
         if self._id:
             doc['_id'] = self._id
@@ -200,6 +786,8 @@ class PostSchedule:
             is_enabled=doc.get('is_enabled', True),
             pin_message=doc.get('pin_message', False),
             forward_original=doc.get('forward_original', True),
+            catchup_policy=doc.get('catchup_policy', 'late'),
+            catchup_window_minutes=doc.get('catchup_window_minutes', 60),
             _id=doc.get('_id')
         )
     
@@ -210,12 +798,19 @@ class PostSchedule:
             else:
                 result = db.post_schedules.insert_one(self.to_dict())
                 self._id = result.inserted_id
+            
+            # Copia embebida en el documento del post
+            embedded = self.to_dict()
+            embedded.pop('post_id')
+            db.posts.update_one({'_id': _post_object_id(self.post_id)}, {'$set': {'schedule': embedded}})
+            read_cache.invalidate()
             return True
         except Exception as e:
             logger.error(f"Error guardando horario: {e}")
             return False
     
     @classmethod
+    @cached('PostSchedule.find_by_post_id')
     def find_by_post_id(cls, post_id):
         try:
             doc = db.post_schedules.find_one({'post_id': str(post_id)})
@@ -225,6 +820,7 @@ class PostSchedule:
             return None
     
     @classmethod
+    @cached('PostSchedule.count_enabled')
     def count_enabled(cls):
         try:
             return db.post_schedules.count_documents({'is_enabled': True})
@@ -233,6 +829,8 @@ class PostSchedule:
             return 0
 
 class Channel:
+    __slots__ = ('channel_id', 'channel_name', 'channel_username', '_id')
+    
     def __init__(self, channel_id, channel_name=None, channel_username=None, _id=None):
         self.channel_id = channel_id
         self.channel_name = channel_name
@@ -265,12 +863,14 @@ class Channel:
             else:
                 result = db.channels.insert_one(self.to_dict())
                 self._id = result.inserted_id
+            read_cache.invalidate()
             return True
         except Exception as e:
             logger.error(f"Error guardando canal: {e}")
             return False
     
     @classmethod
+    @cached('Channel.find_all')
     def find_all(cls):
         try:
             docs = db.channels.find()
@@ -280,6 +880,7 @@ class Channel:
             return []
     
     @classmethod
+    @cached('Channel.find_by_channel_id')
     def find_by_channel_id(cls, channel_id):
         try:
             doc = db.channels.find_one({'channel_id': channel_id})
@@ -289,6 +890,32 @@ class Channel:
             return None
     
     @classmethod
+    @cached('Channel.find_by_channel_ids')
+    def find_by_channel_ids(cls, channel_ids):
+        """Varios canales en una sola consulta; devuelve {channel_id: Channel}"""
+        try:
+            channel_ids = list(dict.fromkeys(channel_ids))
+            if not channel_ids:
+                return {}
+            docs = db.channels.find({'channel_id': {'$in': channel_ids}})
+            return {doc['channel_id']: cls.from_dict(doc) for doc in docs}
+        except Exception as e:
+            logger.error(f"Error buscando canales: {e}")
+            return {}
+    
+    @classmethod
+    @cached('Channel.find_excluding')
+    def find_excluding(cls, channel_ids):
+        """Canales cuyo id no está en la lista"""
+        try:
+            docs = db.channels.find({'channel_id': {'$nin': list(channel_ids)}})
+            return [cls.from_dict(doc) for doc in docs]
+        except Exception as e:
+            logger.error(f"Error buscando canales: {e}")
+            return []
+    
+    @classmethod
+    @cached('Channel.count_all')
     def count_all(cls):
         try:
             return db.channels.count_documents({})
@@ -297,17 +924,14 @@ class Channel:
             return 0
     
     def delete(self):
-        try:
-            if self._id:
-                # Eliminar asignaciones
-                db.post_channels.delete_many({'channel_id': self.channel_id})
-                db.channels.delete_one({'_id': self._id})
-                return True
-        except Exception as e:
-            logger.error(f"Error eliminando canal: {e}")
+        """Elimina el canal de todos los posts (ver delete_channel_cascade)"""
+        if not self._id:
             return False
+        return delete_channel_cascade(self.channel_id)
 
 class PostChannel:
+    __slots__ = ('post_id', 'channel_id', '_id')
+    
     def __init__(self, post_id, channel_id, _id=None):
         self.post_id = str(post_id)
         self.channel_id = channel_id
@@ -337,12 +961,35 @@ class PostChannel:
             else:
                 result = db.post_channels.insert_one(self.to_dict())
                 self._id = result.inserted_id
+            
+            # Copia embebida en el documento del post
+            db.posts.update_one(
+                {'_id': _post_object_id(self.post_id)},
+                {'$addToSet': {'channel_ids': self.channel_id}}
+            )
+            read_cache.invalidate()
             return True
         except Exception as e:
             logger.error(f"Error guardando asignación: {e}")
             return False
     
     @classmethod
+    def delete_assignment(cls, post_id, channel_id):
+        """Quita un canal de un post"""
+        try:
+            db.post_channels.delete_one({'post_id': str(post_id), 'channel_id': channel_id})
+            db.posts.update_one(
+                {'_id': _post_object_id(post_id)},
+                {'$pull': {'channel_ids': channel_id}}
+            )
+            read_cache.invalidate()
+            return True
+        except Exception as e:
+            logger.error(f"Error eliminando asignación: {e}")
+            return False
+    
+    @classmethod
+    @cached('PostChannel.find_by_post_id')
     def find_by_post_id(cls, post_id):
         try:
             docs = db.post_channels.find({'post_id': str(post_id)})
@@ -352,6 +999,7 @@ class PostChannel:
             return []
     
     @classmethod
+    @cached('PostChannel.count_by_post_id')
     def count_by_post_id(cls, post_id):
         try:
             return db.post_channels.count_documents({'post_id': str(post_id)})
@@ -363,20 +1011,26 @@ class PostChannel:
     def delete_by_post_id(cls, post_id):
         try:
             db.post_channels.delete_many({'post_id': str(post_id)})
+            db.posts.update_one({'_id': _post_object_id(post_id)}, {'$set': {'channel_ids': []}})
+            read_cache.invalidate()
             return True
         except Exception as e:
             logger.error(f"Error eliminando asignaciones: {e}")
             return False
 
 class ScheduledJob:
+    __slots__ = ('post_id', 'job_type', 'scheduled_time', 'channel_id', 'message_id',
+                 'is_completed', 'send_time', '_id')
+    
     def __init__(self, post_id, job_type, scheduled_time, channel_id, 
-                 message_id=None, is_completed=False, _id=None):
+                 message_id=None, is_completed=False, send_time=None, _id=None):
         self.post_id = str(post_id)
         self.job_type = job_type
         self.scheduled_time = scheduled_time
         self.channel_id = channel_id
         self.message_id = message_id
         self.is_completed = is_completed
+        self.send_time = send_time
         self._id = _id
     
     def to_dict(self):
@@ -386,7 +1040,8 @@ class ScheduledJob:
             'scheduled_time': self.scheduled_time,
             'channel_id': self.channel_id,
             'message_id': self.message_id,
-            'is_completed': self.is_completed
+            'is_completed': self.is_completed,
+            'send_time': self.send_time
         }
         if self._id:
             doc['_id'] = self._id
@@ -401,6 +1056,7 @@ class ScheduledJob:
             channel_id=doc['channel_id'],
             message_id=doc.get('message_id'),
             is_completed=doc.get('is_completed', False),
+            send_time=doc.get('send_time'),
             _id=doc.get('_id')
         )
     
@@ -415,3 +1071,331 @@ class ScheduledJob:
         except Exception as e:
             logger.error(f"Error guardando trabajo: {e}")
             return False
+    
+    @classmethod
+    def save_many(cls, jobs):
+        """Guarda varios trabajos en una sola operación"""
+        try:
+            if not jobs:
+                return True
+            with db_write_seconds.time(operation="scheduled_jobs.insert_many"):
+                result = db.scheduled_jobs.insert_many([job.to_dict() for job in jobs], ordered=False)
+            for job, inserted_id in zip(jobs, result.inserted_ids):
+                job._id = inserted_id
+            return True
+        except Exception as e:
+            logger.error(f"Error guardando trabajos: {e}")
+            return False
+    
+    @classmethod
+    def find_due(cls, job_type, now, limit=500):
+        """Trabajos pendientes cuya hora ya llegó, en orden de vencimiento"""
+        try:
+            docs = db.scheduled_jobs.find({
+                'job_type': job_type,
+                'is_completed': False,
+                'scheduled_time': {'$lte': now}
+            }).sort('scheduled_time', 1).limit(limit)
+            return [cls.from_dict(doc) for doc in docs]
+        except Exception as e:
+            logger.error(f"Error buscando trabajos pendientes: {e}")
+            return []
+    
+    @classmethod
+    def count_pending(cls, job_type):
+        try:
+            return db.scheduled_jobs.count_documents({'job_type': job_type, 'is_completed': False})
+        except Exception as e:
+            logger.error(f"Error contando trabajos pendientes: {e}")
+            return 0
+    
+    @classmethod
+    def mark_completed(cls, job_ids):
+        try:
+            if job_ids:
+                db.scheduled_jobs.update_many(
+                    {'_id': {'$in': list(job_ids)}},
+                    {'$set': {'is_completed': True, 'completed_at': datetime.utcnow()}}
+                )
+            return True
+        except Exception as e:
+            logger.error(f"Error completando trabajos: {e}")
+            return False
+    
+    @classmethod
+    def cancel_pending(cls, post_id, job_type):
+        """Cancela los trabajos pendientes de un post
+        
+        Al cancelar eliminaciones, los lotes de deletion_stats aún abiertos del
+        post se cierran en el mismo paso (notified y cancelled): ya no recibirán
+        más eliminaciones y la retención del historial puede caducarlos.
+        """
+        try:
+            post_id = str(post_id)
+            now = datetime.utcnow()
+            with db.transaction() as session:
+                db.scheduled_jobs.update_many(
+                    {'post_id': post_id, 'job_type': job_type, 'is_completed': False},
+                    {'$set': {'is_completed': True, 'completed_at': now, 'cancelled': True}},
+                    session=session
+                )
+                if job_type == 'delete':
+                    db.deletion_stats.update_many(
+                        {'post_id': post_id, 'notified': False},
+                        {'$set': {'notified': True, 'cancelled': True, 'cancelled_at': now}},
+                        session=session
+                    )
+            return True
+        except Exception as e:
+            logger.error(f"Error cancelando trabajos: {e}")
+            return False
+
+# --- Borrado en cascada ---
+#
+# Cada borrado se hace en una sola transacción cuando el almacén la admite
+# (MongoDB en replica set o SQLite): o desaparecen el registro y todos sus
+# dependientes, o nada. En un MongoDB sin replica set las operaciones se
+# ejecutan una tras otra sin atomicidad; si una falla a mitad, repetir el
+# borrado termina el trabajo porque cada paso es idempotente.
+
+# Colecciones con documentos que pertenecen a un post (campo post_id en texto)
+POST_DEPENDENTS = (
+    'post_channels', 'post_schedules', 'scheduled_jobs', 'sent_messages',
+    'deletion_stats', 'notification_messages', 'daily_stats'
+)
+
+# Colecciones con documentos que pertenecen a un canal (campo channel_id).
+# Los trabajos de eliminación pendientes y los mensajes enviados se
+# conservan: el bot sigue borrando esos mensajes del canal a su hora y los
+# lotes de deletion_stats se completan y notifican con normalidad.
+CHANNEL_DEPENDENTS = ('post_channels',)
+
+def _delete_channel_records(channel_id, session):
+    for name in CHANNEL_DEPENDENTS:
+        db[name].delete_many({'channel_id': channel_id}, session=session)
+    db.posts.update_many(
+        {'channel_ids': channel_id},
+        {'$pull': {'channel_ids': channel_id}},
+        session=session
+    )
+    db.channels.delete_one({'channel_id': channel_id}, session=session)
+
+def delete_post_cascade(post_id):
+    """Elimina un post con sus asignaciones, horario, trabajos, mensajes y estadísticas"""
+    try:
+        post_id = str(post_id)
+        with db.transaction() as session:
+            # Los resúmenes se comparten entre los posts de una ventana: solo se
+            # quita el post de los resúmenes de sus envíos (por send_time, indexado)
+            send_times = [
+                doc['send_time']
+                for doc in db.deletion_stats.find({'post_id': post_id}, {'send_time': 1}, session=session)
+            ]
+            for name in POST_DEPENDENTS:
+                db[name].delete_many({'post_id': post_id}, session=session)
+            if send_times:
+                digests = {'send_time': {'$in': send_times}}
+                db.notification_digests.update_many(
+                    digests,
+                    {'$pull': {'post_ids': post_id, 'posts': {'post_id': post_id}}},
+                    session=session
+                )
+                db.notification_digests.delete_many({**digests, 'post_ids': []}, session=session)
+            db.posts.delete_one({'_id': _post_object_id(post_id)}, session=session)
+        read_cache.invalidate()
+        return True
+    except Exception as e:
+        logger.error(f"Error eliminando post: {e}")
+        return False
+
+def delete_channel_cascade(channel_id):
+    """Elimina un canal y sus asignaciones (sus mensajes se borran a su hora)"""
+    try:
+        with db.transaction() as session:
+            _delete_channel_records(channel_id, session)
+        read_cache.invalidate()
+        return True
+    except Exception as e:
+        logger.error(f"Error eliminando canal: {e}")
+        return False
+
+def unassign_channel(post_id, channel_id):
+    """Quita un canal de un post; si ya no lo usa ningún post, elimina el canal
+    
+    Devuelve (ok, canal_eliminado).
+    """
+    try:
+        post_id = str(post_id)
+        with db.transaction() as session:
+            db.post_channels.delete_one({'post_id': post_id, 'channel_id': channel_id}, session=session)
+            db.posts.update_one(
+                {'_id': _post_object_id(post_id)},
+                {'$pull': {'channel_ids': channel_id}},
+                session=session
+            )
+            in_use = (
+                db.post_channels.count_documents({'channel_id': channel_id}, session=session)
+                or db.posts.count_documents({'channel_ids': channel_id}, session=session)
+            )
+            if not in_use:
+                _delete_channel_records(channel_id, session)
+        read_cache.invalidate()
+        return True, not in_use
+    except Exception as e:
+        logger.error(f"Error quitando canal del post: {e}")
+        return False, False
+
+# --- Retención del historial ---
+#
+# Los registros finalizados reciben un campo expire_at: MongoDB los borra con
+# un índice TTL y purge_expired() hace lo mismo en SQLite (y recoge lo que el
+# TTL aún no haya borrado). Antes de caducar, cada mensaje enviado se suma al
+# resumen diario por post y canal (daily_stats), que se conserva. Un mensaje
+# está finalizado cuando se eliminó (o falló su eliminación) o, si no tiene
+# eliminación programada (delete_after_hours=0), cuando supera RETENTION_DAYS.
+
+# Condición de "finalizado" de cada colección con caducidad (None = solo por antigüedad)
+EXPIRING_COLLECTIONS = {
+    'sent_messages': {'rolled_up': True},
+    'scheduled_jobs': {'is_completed': True},
+    # Incluye los lotes cancelados por "Eliminar de Todos" (notified y cancelled)
+    'deletion_stats': {'notified': True},
+    'notification_messages': {'deleted': True},
+    'notification_digests': None
+}
+
+# Campo de fecha con el que se dan además por finalizados al superar
+# RETENTION_DAYS: las notificaciones de posts sin eliminación programada nunca
+# se borran y los resúmenes de ventana no tienen condición de fin propia
+AGED_COLLECTIONS = {
+    'notification_messages': 'send_time',
+    'notification_digests': 'send_time'
+}
+
+def stat_day(send_time):
+    """Día (zona horaria del bot) al que se asigna un envío en daily_stats"""
+    if send_time.tzinfo is None:
+        send_time = pytz.utc.localize(send_time)
+    return send_time.astimezone(pytz.timezone(TIMEZONE)).strftime('%Y-%m-%d')
+
+def _expiry_fields(now):
+    if RETENTION_DAYS <= 0:
+        return {}
+    return {'expire_at': now + timedelta(days=RETENTION_DAYS)}
+
+def _finalized_messages_query(now):
+    """Mensajes enviados finalizados que aún no están en daily_stats"""
+    finalized = [{'deleted': True}, {'deletion_error': {'$exists': True}}]
+    if RETENTION_DAYS > 0:
+        # Sin eliminación programada nunca se borran: se cierran por antigüedad
+        # (los registros anteriores a delete_scheduled no tienen el campo)
+        finalized.append({
+            'deleted': False,
+            'delete_scheduled': {'$ne': True},
+            'sent_at': {'$lt': now - timedelta(days=RETENTION_DAYS)}
+        })
+    return {'rolled_up': {'$exists': False}, '$or': finalized}
+
+def rollup_sent_messages(batch_size=COMPACTION_BATCH_SIZE):
+    """Suma a daily_stats los mensajes finalizados
+    
+    Cada lote se resume y se marca en la misma transacción. Devuelve cuántos
+    mensajes se resumieron.
+    """
+    total = 0
+    query = _finalized_messages_query(datetime.utcnow())
+    projection = {'post_id': 1, 'channel_id': 1, 'send_time': 1, 'deleted': 1, 'deletion_error': 1}
+    while True:
+        docs = list(db.sent_messages.find(query, projection).limit(batch_size))
+        if not docs:
+            break
+        
+        counters = {}
+        for doc in docs:
+            key = (stat_day(doc['send_time']), doc['post_id'], doc['channel_id'])
+            counter = counters.setdefault(key, {'sent': 0, 'deleted': 0, 'delete_failed': 0})
+            counter['sent'] += 1
+            if doc.get('deleted'):
+                counter['deleted'] += 1
+            elif 'deletion_error' in doc:
+                counter['delete_failed'] += 1
+        
+        now = datetime.utcnow()
+        operations = [
+            UpdateOne(
+                {'day': day, 'post_id': post_id, 'channel_id': channel_id},
+                {'$inc': counter, '$set': {'updated_at': now}},
+                upsert=True
+            )
+            for (day, post_id, channel_id), counter in counters.items()
+        ]
+        with db.transaction() as session:
+            db.daily_stats.bulk_write(operations, ordered=False, session=session)
+            db.sent_messages.update_many(
+                {'_id': {'$in': [doc['_id'] for doc in docs]}},
+                {'$set': {'rolled_up': True, **_expiry_fields(now)}},
+                session=session
+            )
+        compacted_records_total.inc(len(docs), collection='sent_messages', action='rollup')
+        total += len(docs)
+        if len(docs) < batch_size:
+            break
+    return total
+
+def mark_expiring(now=None):
+    """Pone fecha de caducidad a los registros finalizados que aún no la tienen"""
+    now = now or datetime.utcnow()
+    expiry = _expiry_fields(now)
+    if not expiry:
+        return 0
+    total = 0
+    for name, finalized in EXPIRING_COLLECTIONS.items():
+        # Una actualización por condición: cada una tiene su propio índice
+        conditions = [finalized] if finalized else []
+        if name in AGED_COLLECTIONS:
+            conditions.append({AGED_COLLECTIONS[name]: {'$lt': now - timedelta(days=RETENTION_DAYS)}})
+        for condition in conditions:
+            result = db[name].update_many(
+                {**condition, 'expire_at': {'$exists': False}},
+                {'$set': expiry}
+            )
+            if result.modified_count:
+                compacted_records_total.inc(result.modified_count, collection=name, action='expire')
+            total += result.modified_count
+    return total
+
+def purge_expired(now=None):
+    """Borra los registros caducados (en MongoDB lo hace también el índice TTL)"""
+    now = now or datetime.utcnow()
+    total = 0
+    for name in EXPIRING_COLLECTIONS:
+        result = db[name].delete_many({'expire_at': {'$lte': now}})
+        if result.deleted_count:
+            compacted_records_total.inc(result.deleted_count, collection=name, action='purge')
+        total += result.deleted_count
+    return total
+
+def compact_history():
+    """Resumen diario, caducidad y purga; devuelve los contadores de cada paso"""
+    try:
+        return {
+            'rolled_up': rollup_sent_messages(),
+            'expiring': mark_expiring(),
+            'purged': purge_expired()
+        }
+    except Exception as e:
+        logger.error(f"Error compactando el historial: {e}")
+        return None
+
+def daily_totals(days):
+    """Totales de daily_stats de los últimos N días (incluido hoy)"""
+    try:
+        start = stat_day(datetime.utcnow() - timedelta(days=days - 1))
+        totals = {'sent': 0, 'deleted': 0, 'delete_failed': 0}
+        for doc in db.daily_stats.find({'day': {'$gte': start}}, {'sent': 1, 'deleted': 1, 'delete_failed': 1}):
+            for key in totals:
+                totals[key] += doc.get(key, 0)
+        return totals
+    except Exception as e:
+        logger.error(f"Error leyendo estadísticas diarias: {e}")
+        return {'sent': 0, 'deleted': 0, 'delete_failed': 0}
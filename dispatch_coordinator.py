@@ -0,0 +1,161 @@
+from collections import defaultdict
+from datetime import datetime
+from telegram import Bot
+from config import TIMEZONE, SEND_CONCURRENCY, DISPATCH_WINDOW_SECONDS, ADMIN_DIGEST_ENABLED
+from metrics import fanout_duration_seconds
+import asyncio
+import logging
+import pytz
+import time
+
+logger = logging.getLogger(__name__)
+
+class DispatchWindow:
+    """Posts que disparan dentro de la misma ventana de tiempo"""
+
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        self.post_ids = []
+        self.done = asyncio.get_running_loop().create_future()
+
+class DispatchCoordinator:
+    """Agrupa los envíos programados que coinciden en el tiempo.
+
+    Los posts que disparan dentro de window_seconds se envían en un único
+    recorrido: los canales se intercalan por rondas (canal 1 de cada post,
+    luego canal 2, ...) para que ningún post espere a que otro termine, los
+    envíos a un mismo canal salen en el orden en que llegaron los posts y la
+    concurrencia total se limita con un único semáforo. El limitador de
+    Telegram del bot sigue aplicándose a cada llamada.
+    """
+
+    def __init__(self, window_seconds=DISPATCH_WINDOW_SECONDS, concurrency=SEND_CONCURRENCY):
+        self.window_seconds = window_seconds
+        self.concurrency = max(1, concurrency)
+        self._window = None
+        self._tasks = set()
+
+        # Estadísticas
+        self.windows = 0
+        self.last_window_size = 0
+        self.max_window_size = 0
+
+    async def submit(self, bot: Bot, post_id: str):
+        """Añade el post a la ventana abierta y espera a que se envíe"""
+        window = self._window
+        if window is None or window.bot is not bot:
+            window = self._window = DispatchWindow(bot)
+            task = asyncio.create_task(self._close_window(window))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        if post_id not in window.post_ids:
+            window.post_ids.append(post_id)
+        await asyncio.shield(window.done)
+
+    async def _close_window(self, window: DispatchWindow):
+        await asyncio.sleep(self.window_seconds)
+        if self._window is window:
+            self._window = None
+
+        try:
+            await self.dispatch(window.bot, window.post_ids)
+        except Exception as e:
+            logger.error(f"Error en ventana de envío: {e}")
+        finally:
+            window.done.set_result(None)
+
+    async def dispatch(self, bot: Bot, post_ids: list):
+        """Envía varios posts a la vez intercalando sus canales"""
+        from scheduler import load_post_dispatch
+
+        started = time.perf_counter()
+        send_time = datetime.now(pytz.timezone(TIMEZONE))
+        loaded = await asyncio.gather(*(
+            load_post_dispatch(bot, post_id, False, send_time) for post_id in post_ids
+        ), return_exceptions=True)
+
+        dispatches = []
+        for post_id, dispatch in zip(post_ids, loaded):
+            if isinstance(dispatch, Exception):
+                logger.error(f"Error preparando post {post_id}: {dispatch}")
+            elif dispatch:
+                dispatches.append(dispatch)
+
+        if not dispatches:
+            return
+
+        self.windows += 1
+        self.last_window_size = len(dispatches)
+        self.max_window_size = max(self.max_window_size, len(dispatches))
+        logger.info(
+            f"Ventana de envío: {len(dispatches)} posts, "
+            f"{sum(len(d.channels) for d in dispatches)} mensajes"
+        )
+
+        # Un único mensaje al administrador para toda la ventana
+        digest = None
+        if ADMIN_DIGEST_ENABLED:
+            from admin_digest import digest_manager
+            digest = await digest_manager.open(bot, send_time, False, dispatches)
+
+        channel_locks = defaultdict(asyncio.Lock)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        # Posts sin estrategia: el primer canal la aprende y el resto espera
+        learned = {}
+        for dispatch in dispatches:
+            learned[dispatch.post_id] = asyncio.Event()
+            if dispatch.strategy is not None:
+                learned[dispatch.post_id].set()
+
+        async def send(dispatch, channel_id, learning):
+            # El candado del canal se pide en orden de creación (FIFO), lo que
+            # conserva el orden de los posts dentro de cada canal
+            async with channel_locks[channel_id]:
+                if not learning:
+                    await learned[dispatch.post_id].wait()
+                async with semaphore:
+                    try:
+                        await dispatch.send_to(channel_id)
+                    finally:
+                        if learning:
+                            learned[dispatch.post_id].set()
+
+        # Rondas: canal i de cada post antes que el canal i + 1 de cualquiera
+        tasks = []
+        rounds = max(len(d.channels) for d in dispatches)
+        for index in range(rounds):
+            for dispatch in dispatches:
+                if index < len(dispatch.channels):
+                    learning = index == 0 and not learned[dispatch.post_id].is_set()
+                    tasks.append(asyncio.create_task(
+                        send(dispatch, dispatch.channels[index], learning)
+                    ))
+
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Error en envío coordinado: {result}")
+        fanout_duration_seconds.observe(time.perf_counter() - started, mode='window')
+
+        await asyncio.gather(*(self._finish(dispatch) for dispatch in dispatches))
+        if digest:
+            await digest.close()
+
+    async def _finish(self, dispatch):
+        try:
+            await dispatch.finish()
+        except Exception as e:
+            logger.error(f"Error finalizando envío de post {dispatch.post_id}: {e}")
+
+    def get_stats(self):
+        return {
+            'open_window': len(self._window.post_ids) if self._window else 0,
+            'windows': self.windows,
+            'last_window_size': self.last_window_size,
+            'max_window_size': self.max_window_size
+        }
+
+# Instancia global
+dispatch_coordinator = DispatchCoordinator()
@@ -1,6 +1,8 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, Bot
 from telegram.ext import ContextTypes
-from database import Post, PostSchedule, Channel, PostChannel, ScheduledJob
+from database import Post, PostSchedule, Channel, PostChannel, run_db, daily_totals
+from channel_manager import channel_manager, channel_display_name
+from callback_router import CallbackRouter, encode_callback
 from config import ADMIN_ID, MAX_POSTS, MAX_CHANNELS_PER_POST, TIMEZONE
 import re
 import logging
@@ -40,9 +42,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def start_admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Panel de administración para el admin"""
     keyboard = [
-        [InlineKeyboardButton("📋 Mis Posts", callback_data="list_posts")],
-        [InlineKeyboardButton("➕ Crear Post", callback_data="create_post")],
-        [InlineKeyboardButton("📊 Estadísticas", callback_data="statistics")]
+        [InlineKeyboardButton("📋 Mis Posts", callback_data=encode_callback("list_posts"))],
+        [InlineKeyboardButton("➕ Crear Post", callback_data=encode_callback("create_post"))],
+        [InlineKeyboardButton("📊 Estadísticas", callback_data=encode_callback("statistics"))]
     ]
     
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -67,7 +69,7 @@ async def start_user_welcome(update: Update, context: ContextTypes.DEFAULT_TYPE)
     
     # Botón de beneficios
     keyboard = [
-        [InlineKeyboardButton("🎁 Beneficios del Bot", callback_data="show_benefits")]
+        [InlineKeyboardButton("🎁 Beneficios del Bot", callback_data=encode_callback("show_benefits"))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
@@ -123,7 +125,7 @@ async def show_benefits(query):
     
     keyboard = [
         [InlineKeyboardButton("📞 Contactar Propietario", url="https://t.me/osvaldo20032")],
-        [InlineKeyboardButton("🔙 Volver al Inicio", callback_data="back_to_start")]
+        [InlineKeyboardButton("🔙 Volver al Inicio", callback_data=encode_callback("back_to_start"))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
@@ -139,7 +141,7 @@ async def back_to_start_user(query, context):
     username = user.username if user.username else user.first_name
     
     keyboard = [
-        [InlineKeyboardButton("🎁 Beneficios del Bot", callback_data="show_benefits")]
+        [InlineKeyboardButton("🎁 Beneficios del Bot", callback_data=encode_callback("show_benefits"))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
@@ -159,133 +161,14 @@ async def back_to_start_user(query, context):
     )
 
 async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    await query.answer()
-    
-    data = query.data
-    user_id = update.effective_user.id
-    
-    # Callbacks para usuarios no administradores
-    if data == "show_benefits":
-        await show_benefits(query)
-        return
-    elif data == "back_to_start":
-        await back_to_start_user(query, context)
-        return
-    
-    # Verificar si es administrador para el resto de callbacks
-    if user_id != ADMIN_ID:
-        await query.answer("❌ No tienes permisos de administrador.", show_alert=True)
-        return
-    
-    # Navegación principal (solo para admin)
-    if data == "back_main":
-        await start_admin_panel(update, context)
-    elif data == "list_posts":
-        await list_posts(query)
-    elif data == "create_post":
-        await create_post_prompt(query, context)
-    elif data == "statistics":
-        await show_statistics(query)
-    
-    # Acciones de posts específicos
-    elif data.startswith("post_"):
-        await handle_post_action(query, data)
-    elif data.startswith("configure_schedule_"):
-        post_id = data.split('_')[2]
-        await configure_schedule_menu(query, post_id)
-    elif data.startswith("manage_post_channels_"):
-        post_id = data.split('_')[3]
-        await manage_post_channels_menu(query, context, post_id)
-    elif data.startswith("delete_post_"):
-        post_id = data.split('_')[2]
-        await confirm_delete_post(query, post_id)
-    elif data.startswith("confirm_delete_"):
-        post_id = data.split('_')[2]
-        await delete_post(query, post_id)
-    
-    # Configuración de horarios
-    elif data.startswith("set_time_"):
-        post_id = data.split('_')[2]
-        await prompt_set_time(query, context, post_id)
-    elif data.startswith("set_delete_"):
-        post_id = data.split('_')[2]
-        await prompt_set_delete_hours(query, context, post_id)
-    elif data.startswith("set_days_"):
-        post_id = data.split('_')[2]
-        await configure_days_menu(query, context, post_id)
-    elif data.startswith("toggle_day_"):
-        parts = data.split('_')
-        post_id, day_num = parts[2], int(parts[3])
-        await toggle_day(query, context, post_id, day_num)
-    elif data.startswith("save_days_"):
-        post_id = data.split('_')[2]
-        await save_days(query, context, post_id)
-    
-    # Nuevas funciones
-    elif data.startswith("toggle_pin_"):
-        post_id = data.split('_')[2]
-        await toggle_pin_message(query, context, post_id)
-    elif data.startswith("toggle_forward_"):
-        post_id = data.split('_')[2]
-        await toggle_forward_original(query, context, post_id)
-    elif data.startswith("send_now_"):
-        post_id = data.split('_')[2]
-        await send_post_manually(query, context, post_id)
-    elif data.startswith("confirm_send_"):
-        post_id = data.split('_')[2]
-        await confirm_manual_send(query, context, post_id)
-    elif data.startswith("preview_"):
-        post_id = data.split('_')[1]
-        await preview_post(query, context, post_id)
-    elif data.startswith("send_preview_"):
-        post_id = data.split('_')[2]
-        await send_preview_to_admin(query, context, post_id)
-    
-    # Gestión de canales por post
-    elif data.startswith("add_post_channel_"):
-        post_id = data.split('_')[3]
-        await prompt_add_post_channel(query, context, post_id)
-    elif data.startswith("add_post_channels_bulk_"):
-        post_id = data.split('_')[4]
-        await prompt_add_post_channels_bulk(query, context, post_id)
-    elif data.startswith("remove_post_channel_"):
-        post_id = data.split('_')[3]
-        await show_remove_post_channel_menu(query, post_id)
-    elif data.startswith("list_post_channels_"):
-        post_id = data.split('_')[3]
-        await show_post_channels_list(query, post_id)
-    elif data.startswith("assign_post_channels_"):
-        post_id = data.split('_')[3]
-        await configure_channels_menu(query, context, post_id)
-    elif data.startswith("remove_ch_"):
-        # Nuevo formato más corto para evitar el error
-        parts = data.split('_')
-        post_id, channel_index = parts[2], int(parts[3])
-        await remove_post_channel_by_index(query, post_id, channel_index)
-    
-    # Asignación de canales a posts
-    elif data.startswith("toggle_channel_"):
-        parts = data.split('_')
-        post_id, channel_id = parts[2], parts[3]
-        await toggle_channel_assignment(query, context, post_id, channel_id)
-    elif data.startswith("save_assignments_"):
-        post_id = data.split('_')[2]
-        await save_channel_assignments(query, context, post_id)
-    
-    # Nuevos callbacks para notificaciones
-    elif data.startswith("resend_post_"):
-        post_id = data.split('_')[2]
-        await resend_post_from_notification(query, context, post_id)
-    elif data.startswith("delete_all_posts_"):
-        post_id = data.split('_')[3]
-        await delete_all_post_messages(query, context, post_id)
+    # Las rutas se registran al final del módulo (ver CALLBACK ROUTES)
+    await callback_router.dispatch(update, context)
 
 async def list_posts(query):
-    posts = Post.find_active()
+    posts = await run_db(Post.find_active)
     
     if not posts:
-        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data="back_main")]]
+        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("back_main"))]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text("📭 No hay posts activos.", reply_markup=reply_markup)
         return
@@ -295,11 +178,11 @@ async def list_posts(query):
         keyboard.append([
             InlineKeyboardButton(
                 f"📄 {post.name} ({post.content_type.title()})",
-                callback_data=f"post_{str(post._id)}"
+                callback_data=encode_callback("post", post._id)
             )
         ])
     
-    keyboard.append([InlineKeyboardButton("🔙 Volver", callback_data="back_main")])
+    keyboard.append([InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("back_main"))])
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     await query.edit_message_text(
@@ -308,18 +191,16 @@ async def list_posts(query):
         parse_mode='Markdown'
     )
 
-async def handle_post_action(query, data):
-    post_id = data.split('_')[1]
-    post = Post.find_by_id(post_id)
+async def handle_post_action(query, post_id):
+    post, schedule, channel_ids = await run_db(Post.find_config, post_id)
     
     if not post:
-        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data="list_posts")]]
+        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("list_posts"))]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text("❌ Post no encontrado.", reply_markup=reply_markup)
         return
     
-    schedule = PostSchedule.find_by_post_id(post_id)
-    assigned_channels = PostChannel.count_by_post_id(post_id)
+    assigned_channels = len(channel_ids)
     
     # Información del horario
     schedule_info = "No configurado"
@@ -330,12 +211,12 @@ async def handle_post_action(query, data):
         schedule_info = f"{schedule.send_time} ({days_display}) - Eliminar: {schedule.delete_after_hours}h"
     
     keyboard = [
-        [InlineKeyboardButton("⏰ Configurar Horario", callback_data=f"configure_schedule_{post_id}")],
-        [InlineKeyboardButton("📺 Gestionar Canales", callback_data=f"manage_post_channels_{post_id}")],
-        [InlineKeyboardButton("👀 Vista Previa", callback_data=f"preview_{post_id}"),
-         InlineKeyboardButton("📤 Enviar Ahora", callback_data=f"send_now_{post_id}")],
-        [InlineKeyboardButton("🗑️ Eliminar Post", callback_data=f"delete_post_{post_id}")],
-        [InlineKeyboardButton("🔙 Volver", callback_data="list_posts")]
+        [InlineKeyboardButton("⏰ Configurar Horario", callback_data=encode_callback("configure_schedule", post_id))],
+        [InlineKeyboardButton("📺 Gestionar Canales", callback_data=encode_callback("manage_post_channels", post_id))],
+        [InlineKeyboardButton("👀 Vista Previa", callback_data=encode_callback("preview", post_id)),
+         InlineKeyboardButton("📤 Enviar Ahora", callback_data=encode_callback("send_now", post_id))],
+        [InlineKeyboardButton("🗑️ Eliminar Post", callback_data=encode_callback("delete_post", post_id))],
+        [InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("list_posts"))]
     ]
     
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -354,7 +235,7 @@ async def handle_post_action(query, data):
 async def create_post_prompt(query, context: ContextTypes.DEFAULT_TYPE):
     context.user_data['state'] = 'waiting_for_post'
     
-    keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data="back_main")]]
+    keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("back_main"))]]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     await query.edit_message_text(
@@ -383,7 +264,7 @@ async def handle_post_creation(update: Update, context: ContextTypes.DEFAULT_TYP
         return
 
     try:
-        post_count = Post.count_active()
+        post_count = await run_db(Post.count_active)
 
         if post_count >= MAX_POSTS:
             await message.reply_text(f"❌ Máximo {MAX_POSTS} posts permitidos. Elimina uno existente primero.")
@@ -428,7 +309,7 @@ async def handle_post_creation(update: Update, context: ContextTypes.DEFAULT_TYP
             if len(default_name) > 25:
                 default_name = default_name[:25] + "..."
 
-        keyboard = [[InlineKeyboardButton("🔙 Cancelar", callback_data="back_main")]]
+        keyboard = [[InlineKeyboardButton("🔙 Cancelar", callback_data=encode_callback("back_main"))]]
         reply_markup = InlineKeyboardMarkup(keyboard)
 
         await message.reply_text(
@@ -488,11 +369,10 @@ def extract_content_info(message):
 
 # --- CONFIGURACIÓN DE HORARIOS ---
 async def configure_schedule_menu(query, post_id):
-    post = Post.find_by_id(post_id)
-    schedule = PostSchedule.find_by_post_id(post_id)
+    post, schedule, channel_ids = await run_db(Post.find_config, post_id)
     
     if not post or not schedule:
-        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data="list_posts")]]
+        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("list_posts"))]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text("❌ Post o horario no encontrado.", reply_markup=reply_markup)
         return
@@ -503,6 +383,8 @@ async def configure_schedule_menu(query, post_id):
     
     pin_status = "✅" if schedule.pin_message else "❌"
     forward_status = "✅" if schedule.forward_original else "❌"
+    from scheduler import CATCHUP_POLICY_NAMES
+    catchup_name = CATCHUP_POLICY_NAMES.get(schedule.catchup_policy, schedule.catchup_policy)
     
     # Obtener hora actual de Cuba
     cuba_time = get_cuba_time()
@@ -510,12 +392,13 @@ async def configure_schedule_menu(query, post_id):
     current_date = cuba_time.strftime('%d/%m/%Y')
     
     keyboard = [
-        [InlineKeyboardButton(f"🕐 Hora: {schedule.send_time}", callback_data=f"set_time_{post_id}")],
-        [InlineKeyboardButton(f"⏰ Eliminar después: {schedule.delete_after_hours}h", callback_data=f"set_delete_{post_id}")],
-        [InlineKeyboardButton(f"📅 Días: {days_display}", callback_data=f"set_days_{post_id}")],
-        [InlineKeyboardButton(f"📌 Fijar mensaje: {pin_status}", callback_data=f"toggle_pin_{post_id}")],
-        [InlineKeyboardButton(f"📤 Reenviar original: {forward_status}", callback_data=f"toggle_forward_{post_id}")],
-        [InlineKeyboardButton("🔙 Volver", callback_data=f"post_{post_id}")]
+        [InlineKeyboardButton(f"🕐 Hora: {schedule.send_time}", callback_data=encode_callback("set_time", post_id))],
+        [InlineKeyboardButton(f"⏰ Eliminar después: {schedule.delete_after_hours}h", callback_data=encode_callback("set_delete", post_id))],
+        [InlineKeyboardButton(f"📅 Días: {days_display}", callback_data=encode_callback("set_days", post_id))],
+        [InlineKeyboardButton(f"📌 Fijar mensaje: {pin_status}", callback_data=encode_callback("toggle_pin", post_id))],
+        [InlineKeyboardButton(f"📤 Reenviar original: {forward_status}", callback_data=encode_callback("toggle_forward", post_id))],
+        [InlineKeyboardButton(f"⏳ Envíos perdidos: {catchup_name}", callback_data=encode_callback("cycle_catchup", post_id))],
+        [InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("post", post_id))]
     ]
     
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -532,41 +415,67 @@ async def configure_schedule_menu(query, post_id):
 
 async def toggle_pin_message(query, context: ContextTypes.DEFAULT_TYPE, post_id):
     try:
-        schedule = PostSchedule.find_by_post_id(post_id)
+        schedule = await run_db(PostSchedule.find_by_post_id, post_id)
         if schedule:
             schedule.pin_message = not schedule.pin_message
-            schedule.save()
+            await run_db(schedule.save)
             
             status = "activado" if schedule.pin_message else "desactivado"
             await query.answer(f"✅ Fijar mensaje {status}")
             await configure_schedule_menu(query, post_id)
         else:
-            keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data="list_posts")]]
+            keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("list_posts"))]]
             reply_markup = InlineKeyboardMarkup(keyboard)
             await query.edit_message_text("❌ Horario no encontrado.", reply_markup=reply_markup)
     except Exception as e:
         logger.error(f"Error toggling pin: {e}")
-        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data="list_posts")]]
+        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("list_posts"))]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text(f"❌ Error: {str(e)}", reply_markup=reply_markup)
 
 async def toggle_forward_original(query, context: ContextTypes.DEFAULT_TYPE, post_id):
     try:
-        schedule = PostSchedule.find_by_post_id(post_id)
+        schedule = await run_db(PostSchedule.find_by_post_id, post_id)
         if schedule:
             schedule.forward_original = not schedule.forward_original
-            schedule.save()
+            await run_db(schedule.save)
             
             status = "activado" if schedule.forward_original else "desactivado"
             await query.answer(f"✅ Reenvío original {status}")
             await configure_schedule_menu(query, post_id)
         else:
-            keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data="list_posts")]]
+            keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("list_posts"))]]
             reply_markup = InlineKeyboardMarkup(keyboard)
             await query.edit_message_text("❌ Horario no encontrado.", reply_markup=reply_markup)
     except Exception as e:
         logger.error(f"Error toggling forward: {e}")
-        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data="list_posts")]]
+        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("list_posts"))]]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        await query.edit_message_text(f"❌ Error: {str(e)}", reply_markup=reply_markup)
+
+async def cycle_catchup_policy(query, context: ContextTypes.DEFAULT_TYPE, post_id):
+    try:
+        schedule = await run_db(PostSchedule.find_by_post_id, post_id)
+        if schedule:
+            from scheduler import CATCHUP_POLICY_NAMES
+            policies = list(CATCHUP_POLICY_NAMES)
+            current = policies.index(schedule.catchup_policy) if schedule.catchup_policy in policies else -1
+            schedule.catchup_policy = policies[(current + 1) % len(policies)]
+            await run_db(schedule.save)
+            
+            # El margen de retraso del trabajo depende de la política
+            from scheduler import reschedule_post_job
+            await reschedule_post_job(query.bot, post_id)
+            
+            await query.answer(f"✅ Envíos perdidos: {CATCHUP_POLICY_NAMES[schedule.catchup_policy]}")
+            await configure_schedule_menu(query, post_id)
+        else:
+            keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("list_posts"))]]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            await query.edit_message_text("❌ Horario no encontrado.", reply_markup=reply_markup)
+    except Exception as e:
+        logger.error(f"Error cambiando política de envíos perdidos: {e}")
+        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("list_posts"))]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text(f"❌ Error: {str(e)}", reply_markup=reply_markup)
 
@@ -578,7 +487,7 @@ async def prompt_set_time(query, context: ContextTypes.DEFAULT_TYPE, post_id):
     cuba_time = get_cuba_time()
     current_time = cuba_time.strftime('%H:%M')
     
-    keyboard = [[InlineKeyboardButton("🔙 Cancelar", callback_data=f"configure_schedule_{post_id}")]]
+    keyboard = [[InlineKeyboardButton("🔙 Cancelar", callback_data=encode_callback("configure_schedule", post_id))]]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     await query.edit_message_text(
@@ -595,7 +504,7 @@ async def prompt_set_delete_hours(query, context: ContextTypes.DEFAULT_TYPE, pos
     context.user_data['state'] = 'waiting_delete_hours'
     context.user_data['post_id'] = post_id
     
-    keyboard = [[InlineKeyboardButton("🔙 Cancelar", callback_data=f"configure_schedule_{post_id}")]]
+    keyboard = [[InlineKeyboardButton("🔙 Cancelar", callback_data=encode_callback("configure_schedule", post_id))]]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     await query.edit_message_text(
@@ -608,10 +517,10 @@ async def prompt_set_delete_hours(query, context: ContextTypes.DEFAULT_TYPE, pos
     )
 
 async def configure_days_menu(query, context: ContextTypes.DEFAULT_TYPE, post_id):
-    schedule = PostSchedule.find_by_post_id(post_id)
+    schedule = await run_db(PostSchedule.find_by_post_id, post_id)
     
     if not schedule:
-        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data="list_posts")]]
+        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("list_posts"))]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text("❌ Horario no encontrado.", reply_markup=reply_markup)
         return
@@ -636,12 +545,12 @@ async def update_days_menu(query, context: ContextTypes.DEFAULT_TYPE, post_id):
         keyboard.append([
             InlineKeyboardButton(
                 f"{status} {day_name}",
-                callback_data=f"toggle_day_{post_id}_{day_num}"
+                callback_data=encode_callback("toggle_day", post_id, day_num)
             )
         ])
     
-    keyboard.append([InlineKeyboardButton("💾 Guardar", callback_data=f"save_days_{post_id}")])
-    keyboard.append([InlineKeyboardButton("🔙 Cancelar", callback_data=f"configure_schedule_{post_id}")])
+    keyboard.append([InlineKeyboardButton("💾 Guardar", callback_data=encode_callback("save_days", post_id))])
+    keyboard.append([InlineKeyboardButton("🔙 Cancelar", callback_data=encode_callback("configure_schedule", post_id))])
     
     reply_markup = InlineKeyboardMarkup(keyboard)
     
@@ -671,14 +580,14 @@ async def save_days(query, context: ContextTypes.DEFAULT_TYPE, post_id):
         return
     
     try:
-        schedule = PostSchedule.find_by_post_id(post_id)
+        schedule = await run_db(PostSchedule.find_by_post_id, post_id)
         if schedule:
             schedule.days_of_week = ','.join(map(str, sorted(selected_days)))
-            schedule.save()
+            await run_db(schedule.save)
             
             # Reprogramar en el scheduler
             from scheduler import reschedule_post_job
-            reschedule_post_job(query.bot, post_id)
+            await reschedule_post_job(query.bot, post_id)
             
             await query.answer("✅ Días guardados correctamente")
             context.user_data.pop('selected_days', None)
@@ -686,12 +595,12 @@ async def save_days(query, context: ContextTypes.DEFAULT_TYPE, post_id):
             
             await configure_schedule_menu(query, post_id)
         else:
-            keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data="list_posts")]]
+            keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("list_posts"))]]
             reply_markup = InlineKeyboardMarkup(keyboard)
             await query.edit_message_text("❌ Horario no encontrado.", reply_markup=reply_markup)
     except Exception as e:
         logger.error(f"Error saving days: {e}")
-        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data="list_posts")]]
+        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("list_posts"))]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text(f"❌ Error al guardar: {str(e)}", reply_markup=reply_markup)
 
@@ -699,33 +608,30 @@ async def save_days(query, context: ContextTypes.DEFAULT_TYPE, post_id):
 async def send_post_manually(query, context: ContextTypes.DEFAULT_TYPE, post_id):
     """Enviar post manualmente a todos los canales asignados"""
     try:
-        post = Post.find_by_id(post_id)
+        post, schedule, channel_ids = await run_db(Post.find_config, post_id)
         if not post:
-            keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data="list_posts")]]
+            keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("list_posts"))]]
             reply_markup = InlineKeyboardMarkup(keyboard)
             await query.edit_message_text("❌ Post no encontrado.", reply_markup=reply_markup)
             return
         
-        post_channels = PostChannel.find_by_post_id(post_id)
-        if not post_channels:
-            keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=f"post_{post_id}")]]
+        if not channel_ids:
+            keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("post", post_id))]]
             reply_markup = InlineKeyboardMarkup(keyboard)
             await query.edit_message_text("❌ No hay canales asignados a este post.", reply_markup=reply_markup)
             return
         
-        schedule = PostSchedule.find_by_post_id(post_id)
-        
         # Mensaje de confirmación
         keyboard = [
-            [InlineKeyboardButton("✅ Sí, Enviar", callback_data=f"confirm_send_{post_id}")],
-            [InlineKeyboardButton("❌ Cancelar", callback_data=f"post_{post_id}")]
+            [InlineKeyboardButton("✅ Sí, Enviar", callback_data=encode_callback("confirm_send", post_id))],
+            [InlineKeyboardButton("❌ Cancelar", callback_data=encode_callback("post", post_id))]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         await query.edit_message_text(
             f"📤 **Envío Manual**\n\n"
             f"**Post:** {post.name}\n"
-            f"**Canales:** {len(post_channels)}\n"
+            f"**Canales:** {len(channel_ids)}\n"
             f"**Tipo:** {post.content_type.title()}\n\n"
             f"¿Confirmas el envío manual?",
             reply_markup=reply_markup,
@@ -734,7 +640,7 @@ async def send_post_manually(query, context: ContextTypes.DEFAULT_TYPE, post_id)
         
     except Exception as e:
         logger.error(f"Error in send_post_manually: {e}")
-        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data="list_posts")]]
+        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("list_posts"))]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text(f"❌ Error: {str(e)}", reply_markup=reply_markup)
 
@@ -748,7 +654,7 @@ async def confirm_manual_send(query, context: ContextTypes.DEFAULT_TYPE, post_id
         await send_post_to_channels_with_notification(context.bot, post_id, is_manual=True)
         
         # Mostrar resultado básico
-        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=f"post_{post_id}")]]
+        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("post", post_id))]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         await query.edit_message_text(
@@ -761,16 +667,16 @@ async def confirm_manual_send(query, context: ContextTypes.DEFAULT_TYPE, post_id
         
     except Exception as e:
         logger.error(f"Error in manual send: {e}")
-        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data="list_posts")]]
+        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("list_posts"))]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text(f"❌ Error durante el envío: {str(e)}", reply_markup=reply_markup)
 
 async def preview_post(query, context: ContextTypes.DEFAULT_TYPE, post_id):
     """Mostrar vista previa del post"""
     try:
-        post = Post.find_by_id(post_id)
+        post = await run_db(Post.find_by_id, post_id)
         if not post:
-            keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data="list_posts")]]
+            keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("list_posts"))]]
             reply_markup = InlineKeyboardMarkup(keyboard)
             await query.edit_message_text("❌ Post no encontrado.", reply_markup=reply_markup)
             return
@@ -787,8 +693,8 @@ async def preview_post(query, context: ContextTypes.DEFAULT_TYPE, post_id):
             preview_text += f"**Archivo ID:** `{post.file_id}`"
         
         keyboard = [
-            [InlineKeyboardButton("📤 Enviar Vista Previa", callback_data=f"send_preview_{post_id}")],
-            [InlineKeyboardButton("🔙 Volver", callback_data=f"post_{post_id}")]
+            [InlineKeyboardButton("📤 Enviar Vista Previa", callback_data=encode_callback("send_preview", post_id))],
+            [InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("post", post_id))]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
@@ -800,14 +706,14 @@ async def preview_post(query, context: ContextTypes.DEFAULT_TYPE, post_id):
         
     except Exception as e:
         logger.error(f"Error in preview_post: {e}")
-        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data="list_posts")]]
+        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("list_posts"))]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text(f"❌ Error: {str(e)}", reply_markup=reply_markup)
 
 async def send_preview_to_admin(query, context: ContextTypes.DEFAULT_TYPE, post_id):
     """Enviar vista previa real del contenido"""
     try:
-        post = Post.find_by_id(post_id)
+        post = await run_db(Post.find_by_id, post_id)
         if not post:
             await query.answer("❌ Post no encontrado")
             return
@@ -894,23 +800,23 @@ async def send_content_to_channel(bot: Bot, channel_id: str, post: Post, schedul
 # --- GESTIÓN DE CANALES POR POST ---
 async def manage_post_channels_menu(query, context: ContextTypes.DEFAULT_TYPE, post_id):
     """Menú principal de gestión de canales para un post específico"""
-    post = Post.find_by_id(post_id)
+    post = await run_db(Post.find_by_id, post_id)
     if not post:
-        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data="list_posts")]]
+        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("list_posts"))]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text("❌ Post no encontrado.", reply_markup=reply_markup)
         return
     
     # Contar canales del post
-    channel_count = PostChannel.count_by_post_id(post_id)
+    channel_count = await run_db(PostChannel.count_by_post_id, post_id)
     
     keyboard = [
-        [InlineKeyboardButton("➕ Añadir Canal", callback_data=f"add_post_channel_{post_id}")],
-        [InlineKeyboardButton("📝 Añadir Canales en Masa", callback_data=f"add_post_channels_bulk_{post_id}")],
-        [InlineKeyboardButton("📋 Ver Canales", callback_data=f"list_post_channels_{post_id}")],
-        [InlineKeyboardButton("🎯 Asignar Canales", callback_data=f"assign_post_channels_{post_id}")],
-        [InlineKeyboardButton("➖ Eliminar Canal", callback_data=f"remove_post_channel_{post_id}")],
-        [InlineKeyboardButton("🔙 Volver", callback_data=f"post_{post_id}")]
+        [InlineKeyboardButton("➕ Añadir Canal", callback_data=encode_callback("add_post_channel", post_id))],
+        [InlineKeyboardButton("📝 Añadir Canales en Masa", callback_data=encode_callback("add_post_channels_bulk", post_id))],
+        [InlineKeyboardButton("📋 Ver Canales", callback_data=encode_callback("list_post_channels", post_id))],
+        [InlineKeyboardButton("🎯 Asignar Canales", callback_data=encode_callback("assign_post_channels", post_id))],
+        [InlineKeyboardButton("➖ Eliminar Canal", callback_data=encode_callback("remove_post_channel", post_id))],
+        [InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("post", post_id))]
     ]
     
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -930,7 +836,7 @@ async def prompt_add_post_channel(query, context: ContextTypes.DEFAULT_TYPE, pos
     context.user_data['state'] = 'waiting_post_channel'
     context.user_data['current_post_id'] = post_id
     
-    keyboard = [[InlineKeyboardButton("🔙 Cancelar", callback_data=f"manage_post_channels_{post_id}")]]
+    keyboard = [[InlineKeyboardButton("🔙 Cancelar", callback_data=encode_callback("manage_post_channels", post_id))]]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     await query.edit_message_text(
@@ -949,7 +855,7 @@ async def prompt_add_post_channels_bulk(query, context: ContextTypes.DEFAULT_TYP
     context.user_data['state'] = 'waiting_post_channels_bulk'
     context.user_data['current_post_id'] = post_id
     
-    keyboard = [[InlineKeyboardButton("🔙 Cancelar", callback_data=f"manage_post_channels_{post_id}")]]
+    keyboard = [[InlineKeyboardButton("🔙 Cancelar", callback_data=encode_callback("manage_post_channels", post_id))]]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     await query.edit_message_text(
@@ -970,55 +876,49 @@ async def prompt_add_post_channels_bulk(query, context: ContextTypes.DEFAULT_TYP
 
 async def show_post_channels_list(query, post_id):
     """Mostrar lista de canales asignados a un post"""
-    post_channels = PostChannel.find_by_post_id(post_id)
+    channels = await run_db(channel_manager.get_channels_for_post, post_id)
     
-    if not post_channels:
-        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=f"manage_post_channels_{post_id}")]]
+    if not channels:
+        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("manage_post_channels", post_id))]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text("📭 No hay canales asignados a este post.", reply_markup=reply_markup)
         return
     
-    # Obtener información de los canales
-    channels_info = []
-    for pc in post_channels:
-        channel = Channel.find_by_channel_id(pc.channel_id)
-        if channel:
-            name = channel.channel_name or channel.channel_username or channel.channel_id
-            channels_info.append(f"• `{name}`")
+    # Información de los canales (una sola consulta)
+    channels_info = [f"• `{channel_display_name(channel)}`" for channel in channels]
     
     message = f"📺 **Canales del Post:**\n\n"
     message += "\n".join(channels_info)
     message += f"\n\n**Total:** {len(channels_info)} canales"
     
-    keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=f"manage_post_channels_{post_id}")]]
+    keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("manage_post_channels", post_id))]]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     await query.edit_message_text(message, reply_markup=reply_markup, parse_mode='Markdown')
 
 async def show_remove_post_channel_menu(query, post_id):
     """Mostrar menú para eliminar canales del post"""
-    post_channels = PostChannel.find_by_post_id(post_id)
+    post_channels, channel_map = await run_db(channel_manager.get_post_channels, post_id)
     
     if not post_channels:
-        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=f"manage_post_channels_{post_id}")]]
+        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("manage_post_channels", post_id))]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text("📭 No hay canales para eliminar de este post.", reply_markup=reply_markup)
         return
     
     keyboard = []
-    for i, pc in enumerate(post_channels):
-        channel = Channel.find_by_channel_id(pc.channel_id)
+    for pc in post_channels:
+        channel = channel_map.get(pc.channel_id)
         if channel:
-            name = channel.channel_name or channel.channel_username or channel.channel_id
-            # Usar índice en lugar del ObjectId para evitar el error
+            name = channel_display_name(channel)
             keyboard.append([
                 InlineKeyboardButton(
                     f"🗑️ {name[:30]}...", 
-                    callback_data=f"remove_ch_{post_id}_{i}"
+                    callback_data=encode_callback("unassign_channel", post_id, pc.channel_id)
                 )
             ])
     
-    keyboard.append([InlineKeyboardButton("🔙 Volver", callback_data=f"manage_post_channels_{post_id}")])
+    keyboard.append([InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("manage_post_channels", post_id))])
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     await query.edit_message_text(
@@ -1028,57 +928,44 @@ async def show_remove_post_channel_menu(query, post_id):
     )
 
 async def remove_post_channel_by_index(query, post_id, channel_index):
-    """Eliminar un canal específico del post por índice"""
+    """Eliminar un canal del post por índice (botones anteriores al formato compacto)"""
+    post_channels = await run_db(PostChannel.find_by_post_id, post_id)
+    
+    if channel_index >= len(post_channels):
+        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("manage_post_channels", post_id))]]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        await query.edit_message_text("❌ Canal no encontrado.", reply_markup=reply_markup)
+        return
+    
+    await remove_post_channel(query, post_id, post_channels[channel_index].channel_id)
+
+async def remove_post_channel(query, post_id, channel_id):
+    """Eliminar un canal específico del post"""
     try:
-        post_channels = PostChannel.find_by_post_id(post_id)
-        
-        if channel_index >= len(post_channels):
-            keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=f"manage_post_channels_{post_id}")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await query.edit_message_text("❌ Canal no encontrado.", reply_markup=reply_markup)
+        # Quitar el canal del post; solo se borra del bot si ningún otro post lo usa
+        removed, channel_deleted = await run_db(channel_manager.unassign_channel, post_id, channel_id)
+        if not removed:
+            await query.answer("❌ Error al quitar el canal")
             return
         
-        # Obtener el canal a eliminar
-        pc_to_remove = post_channels[channel_index]
-        channel = Channel.find_by_channel_id(pc_to_remove.channel_id)
-        
-        from database import db
-        
-        # Eliminar la asignación del canal al post
-        db.post_channels.delete_one({
-            'post_id': str(post_id),
-            'channel_id': pc_to_remove.channel_id
-        })
-        
-        # Eliminar el canal de la tabla channels también
-        if channel:
-            db.channels.delete_one({'_id': channel._id})
-        
-        await query.answer("✅ Canal eliminado del post")
+        await query.answer("✅ Canal eliminado del post" if channel_deleted else "✅ Canal quitado del post")
         await manage_post_channels_menu(query, None, post_id)
         
     except Exception as e:
         logger.error(f"Error removing post channel: {e}")
-        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=f"manage_post_channels_{post_id}")]]
+        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("manage_post_channels", post_id))]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text(f"❌ Error: {str(e)}", reply_markup=reply_markup)
 
 # --- ASIGNACIÓN DE CANALES A POSTS ---
 async def configure_channels_menu(query, context: ContextTypes.DEFAULT_TYPE, post_id):
     """Menú para asignar/desasignar canales del post"""
-    # Obtener canales del post
-    post_channels = PostChannel.find_by_post_id(post_id)
-    post_channel_ids = [pc.channel_id for pc in post_channels]
-    
-    # Obtener todos los canales del post desde la tabla channels
-    all_post_channels = []
-    for channel_id in post_channel_ids:
-        channel = Channel.find_by_channel_id(channel_id)
-        if channel:
-            all_post_channels.append(channel)
+    # Canales del post (una sola consulta para todos)
+    all_post_channels = await run_db(channel_manager.get_channels_for_post, post_id)
+    post_channel_ids = [channel.channel_id for channel in all_post_channels]
     
     if not all_post_channels:
-        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=f"manage_post_channels_{post_id}")]]
+        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("manage_post_channels", post_id))]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text(
             "❌ No hay canales disponibles para este post.\nPrimero añade canales al post.",
@@ -1094,32 +981,24 @@ async def configure_channels_menu(query, context: ContextTypes.DEFAULT_TYPE, pos
 
 async def update_channels_menu(query, context: ContextTypes.DEFAULT_TYPE, post_id):
     """Actualizar el menú de asignación de canales"""
-    # Obtener canales del post
-    post_channels = PostChannel.find_by_post_id(post_id)
-    post_channel_ids = [pc.channel_id for pc in post_channels]
-    
-    # Obtener todos los canales del post
-    all_post_channels = []
-    for channel_id in post_channel_ids:
-        channel = Channel.find_by_channel_id(channel_id)
-        if channel:
-            all_post_channels.append(channel)
+    # Canales del post (una sola consulta para todos)
+    all_post_channels = await run_db(channel_manager.get_channels_for_post, post_id)
     
     selected_channels = context.user_data.get('channel_assignments', [])
     
     keyboard = []
     for channel in all_post_channels:
         status = "✅" if channel.channel_id in selected_channels else "❌"
-        name = channel.channel_name or channel.channel_username or channel.channel_id
+        name = channel_display_name(channel)
         keyboard.append([
             InlineKeyboardButton(
                 f"{status} {name}",
-                callback_data=f"toggle_channel_{post_id}_{channel.channel_id}"
+                callback_data=encode_callback("toggle_channel", post_id, channel.channel_id)
             )
         ])
     
-    keyboard.append([InlineKeyboardButton("💾 Guardar", callback_data=f"save_assignments_{post_id}")])
-    keyboard.append([InlineKeyboardButton("🔙 Cancelar", callback_data=f"manage_post_channels_{post_id}")])
+    keyboard.append([InlineKeyboardButton("💾 Guardar", callback_data=encode_callback("save_assignments", post_id))])
+    keyboard.append([InlineKeyboardButton("🔙 Cancelar", callback_data=encode_callback("manage_post_channels", post_id))])
     
     reply_markup = InlineKeyboardMarkup(keyboard)
     
@@ -1163,23 +1042,23 @@ async def save_channel_assignments(query, context: ContextTypes.DEFAULT_TYPE, po
         
     except Exception as e:
         logger.error(f"Error saving assignments: {e}")
-        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data="list_posts")]]
+        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("list_posts"))]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text(f"❌ Error: {str(e)}", reply_markup=reply_markup)
 
 # --- ELIMINAR POSTS ---
 async def confirm_delete_post(query, post_id):
-    post = Post.find_by_id(post_id)
+    post = await run_db(Post.find_by_id, post_id)
     
     if not post:
-        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data="list_posts")]]
+        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("list_posts"))]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text("❌ Post no encontrado.", reply_markup=reply_markup)
         return
     
     keyboard = [
-        [InlineKeyboardButton("🗑️ Sí, Eliminar", callback_data=f"confirm_delete_{post_id}")],
-        [InlineKeyboardButton("❌ Cancelar", callback_data=f"post_{post_id}")]
+        [InlineKeyboardButton("🗑️ Sí, Eliminar", callback_data=encode_callback("confirm_delete", post_id))],
+        [InlineKeyboardButton("❌ Cancelar", callback_data=encode_callback("post", post_id))]
     ]
     
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -1198,9 +1077,9 @@ async def confirm_delete_post(query, post_id):
 
 async def delete_post(query, post_id):
     try:
-        post = Post.find_by_id(post_id)
+        post = await run_db(Post.find_by_id, post_id)
         if post:
-            if post.delete():
+            if await run_db(post.delete):
                 # Eliminar trabajos del scheduler
                 from scheduler import remove_post_jobs
                 remove_post_jobs(post_id)
@@ -1208,26 +1087,27 @@ async def delete_post(query, post_id):
                 await query.answer("✅ Post eliminado")
                 await list_posts(query)
             else:
-                keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data="list_posts")]]
+                keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("list_posts"))]]
                 reply_markup = InlineKeyboardMarkup(keyboard)
                 await query.edit_message_text("❌ Error al eliminar el post.", reply_markup=reply_markup)
         else:
-            keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data="list_posts")]]
+            keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("list_posts"))]]
             reply_markup = InlineKeyboardMarkup(keyboard)
             await query.edit_message_text("❌ Post no encontrado.", reply_markup=reply_markup)
     except Exception as e:
         logger.error(f"Error deleting post: {e}")
-        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data="list_posts")]]
+        keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("list_posts"))]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text(f"❌ Error: {str(e)}", reply_markup=reply_markup)
 
 # --- ESTADÍSTICAS ---
 async def show_statistics(query):
-    total_posts = Post.count_active()
-    total_channels = Channel.count_all()
-    total_schedules = PostSchedule.count_enabled()
+    total_posts = await run_db(Post.count_active)
+    total_channels = await run_db(Channel.count_all)
+    total_schedules = await run_db(PostSchedule.count_enabled)
+    history = await run_db(daily_totals, 7)
     
-    keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data="back_main")]]
+    keyboard = [[InlineKeyboardButton("🔙 Volver", callback_data=encode_callback("back_main"))]]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     status = "🟢 Operativo" if total_posts > 0 else "🟡 Sin posts"
@@ -1240,6 +1120,7 @@ async def show_statistics(query):
         f"**Posts Activos:** {total_posts}/{MAX_POSTS}\n"
         f"**Canales:** {total_channels}\n"
         f"**Horarios:** {total_schedules}\n"
+        f"**Historial (7 días):** {history['deleted']} eliminados, {history['delete_failed']} con error\n"
         f"**Estado:** {status}",
         reply_markup=reply_markup,
         parse_mode='Markdown'
@@ -1345,7 +1226,7 @@ async def handle_post_name_input(update, context, text):
             file_id=temp_post['file_id']
         )
 
-        if not post.save():
+        if not await run_db(post.save):
             await update.message.reply_text("❌ Error al crear el post.")
             return
 
@@ -1358,7 +1239,7 @@ async def handle_post_name_input(update, context, text):
             pin_message=False,
             forward_original=True
         )
-        schedule.save()
+        await run_db(schedule.save)
 
         # Limpiar datos temporales
         context.user_data.pop('state', None)
@@ -1366,10 +1247,10 @@ async def handle_post_name_input(update, context, text):
 
         # Crear botones de acción rápida
         keyboard = [
-            [InlineKeyboardButton("⚙️ Configurar", callback_data=f"post_{str(post._id)}")],
-            [InlineKeyboardButton("📺 Gestionar Canales", callback_data=f"manage_post_channels_{str(post._id)}")],
-            [InlineKeyboardButton("📤 Enviar Ahora", callback_data=f"send_now_{str(post._id)}")],
-            [InlineKeyboardButton("🏠 Menú Principal", callback_data="back_main")]
+            [InlineKeyboardButton("⚙️ Configurar", callback_data=encode_callback("post", post._id))],
+            [InlineKeyboardButton("📺 Gestionar Canales", callback_data=encode_callback("manage_post_channels", post._id))],
+            [InlineKeyboardButton("📤 Enviar Ahora", callback_data=encode_callback("send_now", post._id))],
+            [InlineKeyboardButton("🏠 Menú Principal", callback_data=encode_callback("back_main"))]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
 
@@ -1395,13 +1276,13 @@ async def handle_time_input(update, context, text):
     post_id = context.user_data.get('post_id')
     
     try:
-        schedule = PostSchedule.find_by_post_id(post_id)
+        schedule = await run_db(PostSchedule.find_by_post_id, post_id)
         if schedule:
             schedule.send_time = text
-            schedule.save()
+            await run_db(schedule.save)
             
             from scheduler import reschedule_post_job
-            reschedule_post_job(context.bot, post_id)
+            await reschedule_post_job(context.bot, post_id)
             
             await update.message.reply_text(f"✅ Hora configurada: {text} (Horario de Cuba)")
             context.user_data.pop('state', None)
@@ -1425,10 +1306,10 @@ async def handle_delete_hours_input(update, context, text):
     post_id = context.user_data.get('post_id')
     
     try:
-        schedule = PostSchedule.find_by_post_id(post_id)
+        schedule = await run_db(PostSchedule.find_by_post_id, post_id)
         if schedule:
             schedule.delete_after_hours = hours
-            schedule.save()
+            await run_db(schedule.save)
             
             await update.message.reply_text(f"✅ Configurado: eliminar después de {hours} horas")
             context.user_data.pop('state', None)
@@ -1458,7 +1339,7 @@ async def handle_post_channel_input(update: Update, context: ContextTypes.DEFAUL
         return
 
     # Verificar límite de canales para este post
-    current_count = PostChannel.count_by_post_id(post_id)
+    current_count = await run_db(PostChannel.count_by_post_id, post_id)
     if current_count >= MAX_CHANNELS_PER_POST:
         await update.message.reply_text(f"❌ Máximo {MAX_CHANNELS_PER_POST} canales por post.")
         return
@@ -1468,7 +1349,7 @@ async def handle_post_channel_input(update: Update, context: ContextTypes.DEFAUL
 
     try:
         # Verificar si ya existe en este post
-        existing_post_channel = PostChannel.find_by_post_id(post_id)
+        existing_post_channel = await run_db(PostChannel.find_by_post_id, post_id)
         existing_channel_ids = [pc.channel_id for pc in existing_post_channel]
         
         if channel_info in existing_channel_ids or f"@{channel_info}" in existing_channel_ids:
@@ -1519,20 +1400,20 @@ async def handle_post_channel_input(update: Update, context: ContextTypes.DEFAUL
             return
 
         # Crear o encontrar canal
-        channel = Channel.find_by_channel_id(channel_id_final)
+        channel = await run_db(Channel.find_by_channel_id, channel_id_final)
         if not channel:
             channel = Channel(
                 channel_id=channel_id_final,
                 channel_name=channel_name,
                 channel_username=channel_username
             )
-            if not channel.save():
+            if not await run_db(channel.save):
                 await verification_msg.edit_text("❌ Error al guardar el canal")
                 return
 
         # Crear asignación post-canal
         post_channel = PostChannel(post_id=post_id, channel_id=channel_id_final)
-        if not post_channel.save():
+        if not await run_db(post_channel.save):
             await verification_msg.edit_text("❌ Error al asignar el canal al post")
             return
 
@@ -1577,7 +1458,7 @@ async def handle_post_channels_bulk_input(update: Update, context: ContextTypes.
         return
     
     # Verificar límite total
-    current_count = PostChannel.count_by_post_id(post_id)
+    current_count = await run_db(PostChannel.count_by_post_id, post_id)
     if current_count + len(lines) > MAX_CHANNELS_PER_POST:
         await update.message.reply_text(f"❌ Excederías el límite de {MAX_CHANNELS_PER_POST} canales por post")
         return
@@ -1589,7 +1470,7 @@ async def handle_post_channels_bulk_input(update: Update, context: ContextTypes.
     errors = []
     
     # Obtener canales ya asignados al post
-    existing_post_channels = PostChannel.find_by_post_id(post_id)
+    existing_post_channels = await run_db(PostChannel.find_by_post_id, post_id)
     existing_channel_ids = [pc.channel_id for pc in existing_post_channels]
     
     # Extraer información de cada línea
@@ -1635,20 +1516,20 @@ async def handle_post_channels_bulk_input(update: Update, context: ContextTypes.
                 continue
 
             # Crear o encontrar canal
-            channel = Channel.find_by_channel_id(channel_id_final)
+            channel = await run_db(Channel.find_by_channel_id, channel_id_final)
             if not channel:
                 channel = Channel(
                     channel_id=channel_id_final,
                     channel_name=channel_name,
                     channel_username=channel_username
                 )
-                if not channel.save():
+                if not await run_db(channel.save):
                     errors.append(f"Línea {line_num}: Error al guardar canal")
                     continue
 
             # Crear asignación post-canal
             post_channel = PostChannel(post_id=post_id, channel_id=channel_id_final)
-            if post_channel.save():
+            if await run_db(post_channel.save):
                 added_channels.append({
                     'line': line_num,
                     'name': channel_name or channel_username or channel_id_final,
@@ -1747,3 +1628,58 @@ def extract_channel_info(text):
                 return match.group(1)
     
     return None
+
+# --- CALLBACK ROUTES ---
+# Las acciones, sus códigos y los tipos de sus argumentos se declaran en
+# callback_router.ACTIONS; los botones se crean con encode_callback()
+callback_router = CallbackRouter()
+
+# Usuarios no administradores
+callback_router.add("show_benefits", show_benefits, public=True)
+callback_router.add("back_to_start", back_to_start_user, public=True)
+
+# Navegación principal (solo para admin)
+callback_router.add("back_main", start_admin_panel)
+callback_router.add("list_posts", list_posts)
+callback_router.add("create_post", create_post_prompt)
+callback_router.add("statistics", show_statistics)
+
+# Acciones de posts específicos
+callback_router.add("post", handle_post_action)
+callback_router.add("configure_schedule", configure_schedule_menu)
+callback_router.add("manage_post_channels", manage_post_channels_menu)
+callback_router.add("delete_post", confirm_delete_post)
+callback_router.add("confirm_delete", delete_post)
+
+# Configuración de horarios
+callback_router.add("set_time", prompt_set_time)
+callback_router.add("set_delete", prompt_set_delete_hours)
+callback_router.add("set_days", configure_days_menu)
+callback_router.add("toggle_day", toggle_day)
+callback_router.add("save_days", save_days)
+
+# Opciones de envío
+callback_router.add("toggle_pin", toggle_pin_message)
+callback_router.add("toggle_forward", toggle_forward_original)
+callback_router.add("cycle_catchup", cycle_catchup_policy)
+callback_router.add("send_now", send_post_manually)
+callback_router.add("confirm_send", confirm_manual_send)
+callback_router.add("preview", preview_post)
+callback_router.add("send_preview", send_preview_to_admin)
+
+# Gestión de canales por post
+callback_router.add("add_post_channel", prompt_add_post_channel)
+callback_router.add("add_post_channels_bulk", prompt_add_post_channels_bulk)
+callback_router.add("remove_post_channel", show_remove_post_channel_menu)
+callback_router.add("list_post_channels", show_post_channels_list)
+callback_router.add("assign_post_channels", configure_channels_menu)
+callback_router.add("remove_ch", remove_post_channel_by_index)
+callback_router.add("unassign_channel", remove_post_channel)
+
+# Asignación de canales a posts
+callback_router.add("toggle_channel", toggle_channel_assignment)
+callback_router.add("save_assignments", save_channel_assignments)
+
+# Botones de las notificaciones al administrador
+callback_router.add("resend_post", resend_post_from_notification)
+callback_router.add("delete_all_posts", delete_all_post_messages)
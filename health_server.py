@@ -1,48 +1,221 @@
-from flask import Flask, jsonify
-import threading
-import logging
 from datetime import datetime
-from config import TIMEZONE
+from config import (
+    TIMEZONE, HEALTH_PORT, HEALTH_MAX_LOOP_LAG_SECONDS,
+    HEALTH_MONGO_TIMEOUT_SECONDS, HEALTH_MAX_SEND_AGE_HOURS
+)
+from loop_watchdog import loop_watchdog
+import asyncio
+import json
+import logging
 import pytz
+import time
 
 logger = logging.getLogger(__name__)
 
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 503: 'Service Unavailable'}
+
 class HealthServer:
-    def __init__(self, port=8000):
-        self.app = Flask(__name__)
+    """Servidor HTTP mínimo que corre en el bucle de eventos del bot
+
+    Al compartir el bucle con el bot, si este se bloquea el servidor deja de
+    responder y el orquestador puede reiniciarlo.
+    """
+
+    def __init__(self, port=HEALTH_PORT):
         self.port = port
+        self.started_at = time.time()
+        self._server = None
         self.setup_routes()
-    
+
     def setup_routes(self):
-        @self.app.route('/')
-        def health_check():
-            return "Bot is running!"
-        
-        @self.app.route('/health')
-        def detailed_health():
-            cuba_time = datetime.now(pytz.timezone(TIMEZONE))
-            return jsonify({
-                'status': 'healthy',
-                'timestamp': cuba_time.isoformat(),
-                'timezone': TIMEZONE,
-                'message': 'Auto Post Bot is running'
-            })
-        
-        @self.app.route('/ping')
-        def ping():
-            return "pong"
+        self.routes = {
+            '/': self.index,
+            '/ping': self.ping,
+            '/live': self.liveness,
+            '/ready': self.readiness,
+            '/health': self.detailed_health,
+            '/rate-limiter': self.rate_limiter_stats,
+            '/stats': self.stats,
+            '/metrics': self.metrics,
+            '/loop-report': self.loop_report
+        }
+
+    # --- Rutas ---
+
+    async def index(self):
+        return 200, 'text/plain', "Bot is running!"
+
+    async def ping(self):
+        return 200, 'text/plain', "pong"
+
+    async def liveness(self):
+        """El proceso está vivo mientras el latido del bucle siga llegando"""
+        alive = loop_watchdog.is_beating()
+        return self._json(200 if alive else 503, {
+            'status': 'alive' if alive else 'dead',
+            'loop_lag_seconds': round(loop_watchdog.lag, 4)
+        })
+
+    async def readiness(self):
+        checks = await self.run_checks()
+        ready = all(check['ok'] for check in checks.values())
+        return self._json(200 if ready else 503, {
+            'status': 'ready' if ready else 'not_ready',
+            'checks': checks
+        })
+
+    async def detailed_health(self):
+        checks = await self.run_checks()
+        healthy = all(check['ok'] for check in checks.values())
+        cuba_time = datetime.now(pytz.timezone(TIMEZONE))
+        return self._json(200 if healthy else 503, {
+            'status': 'healthy' if healthy else 'unhealthy',
+            'timestamp': cuba_time.isoformat(),
+            'timezone': TIMEZONE,
+            'message': 'Auto Post Bot is running',
+            'checks': checks
+        })
+
+    async def rate_limiter_stats(self):
+        from rate_limiter import rate_limiter
+        return self._json(200, rate_limiter.get_stats())
+
+    async def stats(self):
+        from metrics import REGISTRY
+        return self._json(200, REGISTRY.snapshot())
+
+    async def metrics(self):
+        from metrics import REGISTRY
+        return 200, 'text/plain; version=0.0.4', REGISTRY.render_prometheus()
     
-    def start(self):
-        """Inicia el servidor en un hilo separado"""
-        def run_server():
-            try:
-                self.app.run(host='0.0.0.0', port=self.port, debug=False)
-            except Exception as e:
-                logger.error(f"Error en health server: {e}")
+    async def loop_report(self):
+        return self._json(200, loop_watchdog.get_report())
+
+    # --- Comprobaciones ---
+
+    async def run_checks(self):
+        return {
+            'event_loop': self.check_event_loop(),
+            'database': await self.check_database(),
+            'scheduler': self.check_scheduler(),
+            'last_send': self.check_last_send()
+        }
+
+    def check_event_loop(self):
+        return {
+            'ok': loop_watchdog.is_beating() and loop_watchdog.lag <= HEALTH_MAX_LOOP_LAG_SECONDS,
+            'lag_seconds': round(loop_watchdog.lag, 4)
+        }
+
+    async def check_database(self):
+        import database
+        storage = database.storage
+        # Conexión e índices se preparan en segundo plano al arrancar
+        if not storage.ready:
+            return {
+                'ok': False,
+                'backend': storage.name,
+                'connected': storage.connected,
+                'indexes_ready': storage.indexes_ready,
+                'error': storage.last_error or 'inicializando'
+            }
         
-        thread = threading.Thread(target=run_server, daemon=True)
-        thread.start()
-        logger.info(f"Health server iniciado en puerto {self.port}")
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(
+                database.run_db(database.db.command, 'ping'), timeout=HEALTH_MONGO_TIMEOUT_SECONDS
+            )
+            result = {
+                'ok': True,
+                'backend': storage.name,
+                'latency_ms': round((time.perf_counter() - started) * 1000, 1)
+            }
+            if storage.failed_indexes:
+                # Índices únicos sin crear por datos repetidos (ver el log)
+                result['failed_indexes'] = storage.failed_indexes
+            return result
+        except asyncio.TimeoutError:
+            return {'ok': False, 'error': f"sin respuesta en {HEALTH_MONGO_TIMEOUT_SECONDS}s"}
+        except Exception as e:
+            return {'ok': False, 'error': str(e)}
+
+    def check_scheduler(self):
+        import scheduler
+        running = scheduler.scheduler is not None and scheduler.scheduler.running
+        return {
+            'ok': running and scheduler.schedules_loaded,
+            'schedules_loaded': scheduler.schedules_loaded,
+            'jobs': len(scheduler.scheduler.get_jobs()) if running else 0
+        }
+
+    def check_last_send(self):
+        """Antigüedad del último envío correcto (desde el arranque si aún no hubo ninguno)"""
+        import scheduler
+        last_send = scheduler.last_successful_send_at
+        age = time.time() - (last_send or self.started_at)
+        return {
+            'ok': not HEALTH_MAX_SEND_AGE_HOURS or age <= HEALTH_MAX_SEND_AGE_HOURS * 3600,
+            'age_seconds': round(age),
+            'since_startup': last_send is None
+        }
+
+    # --- Servidor ---
+
+    def _json(self, status, data):
+        return status, 'application/json', json.dumps(data, ensure_ascii=False)
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Ignorar las cabeceras
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout=5)
+                if line in (b'\r\n', b'\n', b''):
+                    break
+
+            parts = request_line.decode('latin-1').split()
+            if len(parts) < 2:
+                status, content_type, body = 400, 'text/plain', "Bad Request"
+                method = 'GET'
+            else:
+                method, path = parts[0], parts[1].split('?', 1)[0]
+                handler = self.routes.get(path)
+                if method not in ('GET', 'HEAD'):
+                    status, content_type, body = 405, 'text/plain', "Method Not Allowed"
+                elif handler is None:
+                    status, content_type, body = 404, 'text/plain', "Not Found"
+                else:
+                    status, content_type, body = await handler()
+
+            payload = body.encode('utf-8')
+            headers = (
+                f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+                f"Content-Type: {content_type}; charset=utf-8\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                f"Connection: close\r\n\r\n"
+            )
+            writer.write(headers.encode('latin-1') + (b'' if method == 'HEAD' else payload))
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.error(f"Error en health server: {e}")
+        finally:
+            writer.close()
+
+    async def start(self):
+        """Inicia el servidor en el bucle de eventos actual"""
+        try:
+            self._server = await asyncio.start_server(self._handle_connection, '0.0.0.0', self.port)
+            logger.info(f"Health server iniciado en puerto {self.port}")
+        except Exception as e:
+            logger.error(f"Error en health server: {e}")
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
 
 # Instancia global
 health_server = HealthServer()
@@ -0,0 +1,172 @@
+from collections import deque
+from datetime import datetime
+from config import (
+    TIMEZONE, LOOP_WATCHDOG_THRESHOLD_SECONDS, LOOP_WATCHDOG_INTERVAL_SECONDS,
+    LOOP_WATCHDOG_REPORT_SIZE
+)
+from metrics import event_loop_lag_seconds, event_loop_stalls_total, event_loop_stall_seconds
+import asyncio
+import logging
+import os
+import pytz
+import sys
+import threading
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Módulos cuyas funciones se consideran responsables de un bloqueo (por prioridad)
+ENTRY_MODULES = ('handlers', 'scheduler', 'dispatch_coordinator')
+
+# Líneas de la pila guardadas por bloqueo
+STACK_LIMIT = 12
+
+class LoopWatchdog:
+    """Mide continuamente el retraso del bucle de eventos
+
+    Un latido en el bucle anota la hora cada interval segundos. Un hilo aparte
+    comprueba el latido y, si se retrasa más que threshold, captura la pila
+    del hilo del bucle para saber qué función lo está bloqueando. Al volver el
+    latido se registra el bloqueo con su duración y responsable.
+    """
+
+    def __init__(self, threshold=LOOP_WATCHDOG_THRESHOLD_SECONDS,
+                 interval=LOOP_WATCHDOG_INTERVAL_SECONDS, report_size=LOOP_WATCHDOG_REPORT_SIZE):
+        self.threshold = threshold
+        self.interval = interval
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.last_beat = None
+
+        self._stalls = deque(maxlen=report_size)
+        self._by_culprit = {}
+        self._capture = None
+        self._lock = threading.Lock()
+        self._loop_thread_id = None
+        self._heartbeat_task = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """Inicia el latido en el bucle actual y el hilo vigilante"""
+        if self._heartbeat_task:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self.last_beat = time.monotonic()
+        self._heartbeat_task = asyncio.get_running_loop().create_task(self._heartbeat())
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._thread.start()
+        logger.info(f"Vigilante del bucle iniciado (umbral {self.threshold}s)")
+
+    def stop(self):
+        self._stop.set()
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+
+    def is_beating(self):
+        """False si el latido se detuvo (bucle bloqueado o tarea caída)"""
+        return self.last_beat is not None and time.monotonic() - self.last_beat <= self.interval * 4 + 5
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self.last_beat = now
+            self.lag = max(0.0, now - expected)
+            self.max_lag = max(self.max_lag, self.lag)
+            event_loop_lag_seconds.set(self.lag)
+
+            if self.lag >= self.threshold:
+                self._record_stall(self.lag)
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            beat = self.last_beat
+            if beat is None or time.monotonic() - beat - self.interval < self.threshold:
+                continue
+            with self._lock:
+                # Una sola captura por bloqueo
+                if self._capture is not None and self._capture['beat'] == beat:
+                    continue
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is None:
+                    continue
+                self._capture = {'beat': beat, **self._attribute(traceback.extract_stack(frame))}
+
+    def _attribute(self, stack):
+        """Busca la función del bot responsable del bloqueo dentro de la pila"""
+        culprit = None
+        fallback = None
+        for entry in reversed(stack):
+            if not os.path.abspath(entry.filename).startswith(PROJECT_DIR + os.sep):
+                continue
+            module = os.path.splitext(os.path.basename(entry.filename))[0]
+            if module in ENTRY_MODULES:
+                culprit = f"{module}.{entry.name}"
+                break
+            if fallback is None and module != 'loop_watchdog':
+                fallback = f"{module}.{entry.name}"
+
+        innermost = stack[-1] if stack else None
+        return {
+            'culprit': culprit or fallback or 'unknown',
+            'site': f"{os.path.basename(innermost.filename)}:{innermost.lineno} {innermost.name}" if innermost else '',
+            'stack': traceback.format_list(stack[-STACK_LIMIT:])
+        }
+
+    def _record_stall(self, duration):
+        with self._lock:
+            capture = self._capture
+            self._capture = None
+
+        if capture is None:
+            capture = {'culprit': 'unknown', 'site': '', 'stack': []}
+
+        culprit = capture['culprit']
+        event = {
+            'time': datetime.now(pytz.timezone(TIMEZONE)).isoformat(),
+            'duration_seconds': round(duration, 4),
+            'culprit': culprit,
+            'site': capture['site'],
+            'stack': capture['stack']
+        }
+        self._stalls.append(event)
+
+        summary = self._by_culprit.setdefault(culprit, {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0})
+        summary['count'] += 1
+        summary['total_seconds'] += duration
+        summary['max_seconds'] = max(summary['max_seconds'], duration)
+
+        event_loop_stalls_total.inc(culprit=culprit)
+        event_loop_stall_seconds.observe(duration, culprit=culprit)
+        logger.warning(f"Bucle de eventos bloqueado {duration:.3f}s en {culprit} ({capture['site']})")
+
+    def get_report(self):
+        """Bloqueos recientes y acumulado por responsable (de mayor a menor tiempo)"""
+        by_culprit = sorted(
+            ({'culprit': culprit, **summary} for culprit, summary in self._by_culprit.items()),
+            key=lambda item: item['total_seconds'],
+            reverse=True
+        )
+        for item in by_culprit:
+            item['total_seconds'] = round(item['total_seconds'], 4)
+            item['max_seconds'] = round(item['max_seconds'], 4)
+
+        return {
+            'threshold_seconds': self.threshold,
+            'lag_seconds': round(self.lag, 4),
+            'max_lag_seconds': round(self.max_lag, 4),
+            'stalls': sum(item['count'] for item in by_culprit),
+            'by_culprit': by_culprit,
+            'recent': list(reversed(self._stalls))
+        }
+
+# Instancia global
+loop_watchdog = LoopWatchdog()
@@ -0,0 +1,268 @@
+from contextlib import contextmanager
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Metric:
+    metric_type = None
+
+    def __init__(self, name, description, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+class Counter(Metric):
+    metric_type = 'counter'
+
+    def __init__(self, name, description, labelnames=()):
+        super().__init__(name, description, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return {key: value for key, value in self._values.items()}
+
+class Gauge(Metric):
+    metric_type = 'gauge'
+
+    def __init__(self, name, description, labelnames=()):
+        super().__init__(name, description, labelnames)
+        self._values = {}
+        self._function = None
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function):
+        """El valor se calcula al leer la métrica (sin etiquetas)"""
+        self._function = function
+
+    def snapshot(self):
+        if self._function is not None:
+            try:
+                return {(): self._function()}
+            except Exception:
+                return {}
+        with self._lock:
+            return {key: value for key, value in self._values.items()}
+
+class Histogram(Metric):
+    metric_type = 'histogram'
+
+    def __init__(self, name, description, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry['counts'][i] += 1
+            entry['sum'] += value
+            entry['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                key: {'counts': list(entry['counts']), 'sum': entry['sum'], 'count': entry['count']}
+                for key, entry in self._values.items()
+            }
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def collect(self):
+        return list(self._metrics.values())
+
+    def snapshot(self):
+        """Resumen en JSON de todas las métricas"""
+        result = {}
+        for metric in self.collect():
+            values = {}
+            for key, value in metric.snapshot().items():
+                label = ','.join(f"{n}={v}" for n, v in zip(metric.labelnames, key)) or 'total'
+                if metric.metric_type == 'histogram':
+                    value = {
+                        'count': value['count'],
+                        'sum': round(value['sum'], 6),
+                        'avg': round(value['sum'] / value['count'], 6) if value['count'] else 0.0
+                    }
+                values[label] = value
+            result[metric.name] = values
+        return result
+
+    def render_prometheus(self):
+        """Todas las métricas en el formato de texto de Prometheus"""
+        lines = []
+        for metric in self.collect():
+            lines.append(f"# HELP {metric.name} {_escape_help(metric.description)}")
+            lines.append(f"# TYPE {metric.name} {metric.metric_type}")
+            for key, value in sorted(metric.snapshot().items()):
+                labels = list(zip(metric.labelnames, key))
+                if metric.metric_type == 'histogram':
+                    for bound, count in zip(metric.buckets, value['counts']):
+                        lines.append(
+                            f"{metric.name}_bucket{_format_labels(labels + [('le', _format_value(bound))])} {count}"
+                        )
+                    lines.append(f"{metric.name}_bucket{_format_labels(labels + [('le', '+Inf')])} {value['count']}")
+                    lines.append(f"{metric.name}_sum{_format_labels(labels)} {_format_value(value['sum'])}")
+                    lines.append(f"{metric.name}_count{_format_labels(labels)} {value['count']}")
+                else:
+                    lines.append(f"{metric.name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+def _escape_help(text):
+    return text.replace('\\', '\\\\').replace('\n', '\\n')
+
+def _escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape_label(value)}"' for name, value in labels) + '}'
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+# Registro global
+REGISTRY = Registry()
+
+db_write_seconds = Histogram(
+    'bot_db_write_seconds',
+    'Latencia de las escrituras de resultados de envío en MongoDB',
+    ['operation']
+)
+
+# Envíos y eliminaciones en canales: action = send, forward, copy, fallback, pin o delete
+channel_messages_total = Counter(
+    'bot_channel_messages_total',
+    'Mensajes enviados, reenviados, fijados o eliminados en canales por resultado',
+    ['action', 'outcome']
+)
+
+fanout_duration_seconds = Histogram(
+    'bot_fanout_duration_seconds',
+    'Duración del envío de un post (o una ventana de posts) a todos sus canales',
+    ['mode'],
+    buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+)
+
+telegram_request_seconds = Histogram(
+    'bot_telegram_request_seconds',
+    'Latencia de cada llamada a la API de Telegram (sin la espera del limitador)',
+    ['endpoint']
+)
+
+rate_limiter_wait_seconds = Histogram(
+    'bot_rate_limiter_wait_seconds',
+    'Tiempo de espera en el limitador antes de cada llamada a Telegram'
+)
+
+mongo_operation_seconds = Histogram(
+    'bot_mongo_operation_seconds',
+    'Latencia de los comandos de MongoDB por colección',
+    ['collection', 'command']
+)
+
+pending_deletions = Gauge(
+    'bot_pending_deletions',
+    'Eliminaciones de mensajes pendientes en la cola (la actualiza el trabajador de eliminaciones)'
+)
+
+scheduler_jobs = Gauge(
+    'bot_scheduler_jobs',
+    'Trabajos registrados en el scheduler'
+)
+
+event_loop_lag_seconds = Gauge(
+    'bot_event_loop_lag_seconds',
+    'Retraso del bucle de eventos en la última medición'
+)
+
+last_successful_send_timestamp = Gauge(
+    'bot_last_successful_send_timestamp_seconds',
+    'Hora (epoch) del último envío con al menos un canal entregado'
+)
+
+event_loop_stalls_total = Counter(
+    'bot_event_loop_stalls_total',
+    'Bloqueos del bucle de eventos por encima del umbral, por función responsable',
+    ['culprit']
+)
+
+event_loop_stall_seconds = Histogram(
+    'bot_event_loop_stall_seconds',
+    'Duración de los bloqueos del bucle de eventos por función responsable',
+    ['culprit'],
+    buckets=(0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+
+cache_requests_total = Counter(
+    'bot_cache_requests_total',
+    'Lecturas de la caché de posts, horarios y canales por resultado (hit/miss)',
+    ['cache', 'result']
+)
+
+cache_invalidations_total = Counter(
+    'bot_cache_invalidations_total',
+    'Vaciados de la caché: local (escritura propia) o remote (otra réplica)',
+    ['source']
+)
+
+compacted_records_total = Counter(
+    'bot_compacted_records_total',
+    'Registros del historial resumidos (rollup), marcados para caducar (expire) o borrados (purge)',
+    ['collection', 'action']
+)
+
+callback_seconds = Histogram(
+    'bot_callback_seconds',
+    'Latencia de cada pulsación de botón por ruta del enrutador (unknown = callback no reconocido)',
+    ['route']
+)
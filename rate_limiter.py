@@ -0,0 +1,166 @@
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+from collections import deque
+from datetime import timedelta
+from metrics import telegram_request_seconds, rate_limiter_wait_seconds
+from config import (
+    TELEGRAM_GLOBAL_MAX_RATE, TELEGRAM_GROUP_MAX_RATE,
+    TELEGRAM_GROUP_TIME_PERIOD, TELEGRAM_MAX_RETRIES
+)
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class SlidingWindowLimiter:
+    """Permite como máximo max_rate llamadas por cada time_period segundos (orden FIFO)"""
+
+    def __init__(self, max_rate, time_period):
+        self.max_rate = max_rate
+        self.time_period = time_period
+        self._calls = deque()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                while self._calls and now - self._calls[0] >= self.time_period:
+                    self._calls.popleft()
+
+                if len(self._calls) < self.max_rate:
+                    self._calls.append(now)
+                    return
+
+                await asyncio.sleep(self.time_period - (now - self._calls[0]))
+
+    def is_idle(self):
+        now = time.monotonic()
+        return not self._calls or now - self._calls[-1] >= self.time_period
+
+class TelegramRateLimiter(BaseRateLimiter):
+    """Limitador compartido por todas las llamadas del bot a la API de Telegram.
+
+    Aplica el límite global del token y el límite por canal/grupo. Un RetryAfter
+    (429) pausa todas las llamadas durante retry_after y la llamada vuelve a la
+    cola en lugar de fallar.
+    """
+
+    def __init__(self, overall_max_rate=TELEGRAM_GLOBAL_MAX_RATE, overall_time_period=1,
+                 group_max_rate=TELEGRAM_GROUP_MAX_RATE, group_time_period=TELEGRAM_GROUP_TIME_PERIOD,
+                 max_retries=TELEGRAM_MAX_RETRIES):
+        self._overall_max_rate = overall_max_rate
+        self._overall_time_period = overall_time_period
+        self._group_max_rate = group_max_rate
+        self._group_time_period = group_time_period
+        self._max_retries = max_retries
+
+        self._base_limiter = None
+        self._group_limiters = {}
+        self._retry_after_event = None
+
+        # Estadísticas
+        self._queue_depth = 0
+        self._requests = 0
+        self._retries = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._last_wait = 0.0
+
+    async def initialize(self):
+        self._base_limiter = SlidingWindowLimiter(self._overall_max_rate, self._overall_time_period)
+        self._retry_after_event = asyncio.Event()
+        self._retry_after_event.set()
+
+    async def shutdown(self):
+        self._group_limiters.clear()
+
+    def _get_group_limiter(self, group_id):
+        # Descartar limitadores sin uso para no acumular memoria
+        if len(self._group_limiters) > 512:
+            for key in [k for k, limiter in self._group_limiters.items() if limiter.is_idle()]:
+                del self._group_limiters[key]
+
+        if group_id not in self._group_limiters:
+            self._group_limiters[group_id] = SlidingWindowLimiter(
+                self._group_max_rate, self._group_time_period
+            )
+        return self._group_limiters[group_id]
+
+    async def _wait_for_slot(self, chat, group):
+        """Espera turno en la cola y registra el tiempo de espera"""
+        started = time.monotonic()
+        self._queue_depth += 1
+        try:
+            # Si se recibió un RetryAfter, esperar a que termine la pausa
+            await self._retry_after_event.wait()
+            if group and self._group_max_rate:
+                await self._get_group_limiter(group).acquire()
+            if chat:
+                await self._base_limiter.acquire()
+            await self._retry_after_event.wait()
+        finally:
+            self._queue_depth -= 1
+
+        waited = time.monotonic() - started
+        self._requests += 1
+        self._total_wait += waited
+        self._last_wait = waited
+        self._max_wait = max(self._max_wait, waited)
+        rate_limiter_wait_seconds.observe(waited)
+        return waited
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        max_retries = rate_limit_args or self._max_retries
+
+        chat_id = data.get('chat_id')
+        chat = chat_id is not None
+        group = False
+
+        # Los ids de canales/grupos son negativos o @username
+        try:
+            chat_id = int(chat_id)
+        except (ValueError, TypeError):
+            pass
+        if (isinstance(chat_id, int) and chat_id < 0) or isinstance(chat_id, str):
+            group = chat_id
+
+        for attempt in range(max_retries + 1):
+            await self._wait_for_slot(chat, group)
+            try:
+                with telegram_request_seconds.time(endpoint=endpoint):
+                    return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt == max_retries:
+                    logger.error(f"Límite de Telegram alcanzado en {endpoint} tras {max_retries} reintentos")
+                    raise
+
+                retry_after = e.retry_after
+                if isinstance(retry_after, timedelta):
+                    retry_after = retry_after.total_seconds()
+
+                self._retries += 1
+                logger.warning(f"RetryAfter en {endpoint}: reintentando en {retry_after}s")
+
+                # Pausar todas las llamadas mientras dure el bloqueo
+                self._retry_after_event.clear()
+                try:
+                    await asyncio.sleep(retry_after + 0.1)
+                finally:
+                    self._retry_after_event.set()
+
+    def get_stats(self):
+        """Profundidad de cola y tiempos de espera acumulados"""
+        return {
+            'queue_depth': self._queue_depth,
+            'requests': self._requests,
+            'retries': self._retries,
+            'avg_wait_seconds': self._total_wait / self._requests if self._requests else 0.0,
+            'max_wait_seconds': self._max_wait,
+            'last_wait_seconds': self._last_wait,
+            'paused': bool(self._retry_after_event and not self._retry_after_event.is_set())
+        }
+
+# Instancia global
+rate_limiter = TelegramRateLimiter()
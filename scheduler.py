@@ -1,15 +1,56 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup
-from database import Post, PostSchedule, PostChannel, ScheduledJob
+from telegram.error import BadRequest
+from pymongo import InsertOne, ReplaceOne, UpdateOne, ReturnDocument
+from database import (
+    Post, PostSchedule, ScheduledJob, bulk_write, write_behind, run_db,
+    migrate_posts_schema, storage, compact_history
+)
 from datetime import datetime, timedelta
-from config import TIMEZONE, ADMIN_ID
+from config import (
+    TIMEZONE, ADMIN_ID, SEND_CONCURRENCY, DELETION_POLL_SECONDS,
+    WRITE_BEHIND_ENABLED, WRITE_BEHIND_FLUSH_SECONDS, MISFIRE_GRACE_SECONDS, CATCHUP_MAX_DAYS,
+    ADMIN_DIGEST_ENABLED, COMPACTION_INTERVAL_MINUTES
+)
+from dispatch_coordinator import dispatch_coordinator
+from admin_digest import digest_manager
+from callback_router import encode_callback
+from metrics import (
+    channel_messages_total, fanout_duration_seconds, pending_deletions, scheduler_jobs,
+    last_successful_send_timestamp
+)
+import asyncio
 import logging
 import pytz
+import time
 
 logger = logging.getLogger(__name__)
 scheduler = None
 
+# Razones de fallo guardadas por lote de eliminación
+MAX_FAILED_REASONS = 20
+
+# Errores de reenvío/copia propios del mensaje original (iguales en todos los canales)
+SOURCE_ERROR_REASONS = (
+    "message can't be forwarded",
+    "message can't be copied",
+    "message to forward not found",
+    "message to copy not found",
+)
+
+# Hora (epoch) del último envío con algún canal entregado; la usa /ready
+last_successful_send_at = None
+
+# True cuando los posts activos ya están programados (lo usa /ready)
+schedules_loaded = False
+
+CATCHUP_POLICY_NAMES = {
+    'skip': 'Omitir',
+    'late': 'Enviar tarde',
+    'coalesce': 'Agrupar'
+}
+
 def start_scheduler(application):
     global scheduler
     if scheduler is None:
@@ -17,18 +58,87 @@ def start_scheduler(application):
         cuba_tz = pytz.timezone(TIMEZONE)
         scheduler = AsyncIOScheduler(timezone=cuba_tz)
         scheduler.start()
-        schedule_all_posts(application.bot)
+        
+        # Métricas calculadas al consultarlas (la cola de eliminaciones la
+        # actualiza el propio trabajador: /metrics no consulta la base de datos)
+        scheduler_jobs.set_function(lambda: len(scheduler.get_jobs()))
+        
+        # Cargar los posts sin bloquear el arranque (MongoDB puede tardar en responder)
+        scheduler.add_job(
+            load_schedules,
+            trigger='date',
+            args=[application.bot],
+            id="load_schedules",
+            replace_existing=True
+        )
+        
+        # Un único trabajo drena la cola de eliminaciones guardada en MongoDB
+        scheduler.add_job(
+            process_due_deletions,
+            trigger='interval',
+            seconds=DELETION_POLL_SECONDS,
+            args=[application.bot],
+            id="deletion_worker",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
+        )
+        
+        # Resumen diario y caducidad del historial (sent_messages, deletion_stats...)
+        scheduler.add_job(
+            compact_history_job,
+            trigger='interval',
+            minutes=COMPACTION_INTERVAL_MINUTES,
+            id="compact_history",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
+        )
+        
+        if WRITE_BEHIND_ENABLED:
+            scheduler.add_job(
+                flush_write_behind,
+                trigger='interval',
+                seconds=WRITE_BEHIND_FLUSH_SECONDS,
+                id="write_behind_flush",
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True
+            )
         logger.info(f"Scheduler iniciado con timezone: {TIMEZONE}")
 
-def schedule_all_posts(bot):
+async def load_schedules(bot):
+    """Programa los posts activos cuando MongoDB esté listo y recupera los envíos perdidos"""
+    global schedules_loaded
+    
+    # La conexión y los índices se preparan en segundo plano
+    while not storage.ready:
+        await asyncio.sleep(1)
+    
+    # Sin los posts no hay nada que programar: se reintenta hasta poder leerlos
+    # (mientras tanto /ready sigue informando schedules_loaded = false)
+    delay = 1
+    while True:
+        await run_db(migrate_posts_schema)
+        configs = await run_db(Post.find_active_configs)
+        if configs is not None:
+            break
+        logger.warning(f"No se pudieron leer los posts activos; reintento en {delay}s")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 60)
+    
     try:
-        posts = Post.find_active()
-        for post in posts:
-            schedule = PostSchedule.find_by_post_id(str(post._id))
+        for post, schedule, channel_ids in configs:
             if schedule:
                 schedule_post(bot, post, schedule)
+        schedules_loaded = True
+        logger.info(f"Programados {len(configs)} posts activos")
     except Exception as e:
         logger.error(f"Error scheduling all posts: {e}")
+        return
+    
+    # Recuperar los envíos perdidos mientras el bot estaba detenido
+    await reconcile_missed_posts(bot)
 
 def schedule_post(bot: Bot, post: Post, schedule: PostSchedule):
     remove_post_jobs(str(post._id))
@@ -39,132 +149,396 @@ def schedule_post(bot: Bot, post: Post, schedule: PostSchedule):
     # APScheduler usa 0-6 para Lun-Dom, nuestra DB usa 1-7
     aps_days = ','.join(str(d - 1) for d in days)
     
+    # Cuánto retraso se acepta si el bucle estuvo bloqueado a la hora del envío
+    if schedule.catchup_policy == 'skip':
+        misfire_grace_time = MISFIRE_GRACE_SECONDS
+    elif schedule.catchup_policy == 'coalesce':
+        misfire_grace_time = None
+    else:
+        misfire_grace_time = max(MISFIRE_GRACE_SECONDS, schedule.catchup_window_minutes * 60)
+    
     try:
+        # Los posts que coinciden en el tiempo se envían juntos
         scheduler.add_job(
-            send_post_to_channels_with_notification,
+            run_scheduled_post,
             trigger=CronTrigger(
                 day_of_week=aps_days,
                 hour=hour,
                 minute=minute,
                 timezone=TIMEZONE
             ),
-            args=[bot, str(post._id), False],  # False = no es manual
+            args=[bot, str(post._id), schedule],
             id=f"send_{str(post._id)}",
-            replace_existing=True
+            replace_existing=True,
+            misfire_grace_time=misfire_grace_time,
+            coalesce=True
         )
         logger.info(f"Programado post {str(post._id)} para {schedule.send_time} días {aps_days} (timezone: {TIMEZONE})")
     except Exception as e:
         logger.error(f"Error programando post {str(post._id)}: {e}")
 
-async def send_post_to_channels_with_notification(bot: Bot, post_id: str, is_manual: bool = False):
-    """Envía post a canales y notifica al administrador"""
+def scheduled_times_between(schedule: PostSchedule, start: datetime, end: datetime):
+    """Horas programadas del post en el intervalo (start, end], en hora de Cuba"""
     cuba_tz = pytz.timezone(TIMEZONE)
-    send_time = datetime.now(cuba_tz)
+    days = {int(d) for d in schedule.days_of_week.split(',')}
+    hour, minute = map(int, schedule.send_time.split(':'))
+    start = start.astimezone(cuba_tz)
+    end = end.astimezone(cuba_tz)
     
+    times = []
+    day = start.date()
+    while day <= end.date():
+        if day.isoweekday() in days:
+            due = cuba_tz.localize(datetime(day.year, day.month, day.day, hour, minute))
+            if start < due <= end:
+                times.append(due)
+        day += timedelta(days=1)
+    return times
+
+def last_scheduled_time(schedule: PostSchedule, now: datetime):
+    """Última hora programada del post anterior a now (o None)"""
+    times = scheduled_times_between(schedule, now - timedelta(days=CATCHUP_MAX_DAYS), now)
+    return times[-1] if times else None
+
+async def run_scheduled_post(bot: Bot, post_id: str, schedule: PostSchedule):
+    """Disparo del CronTrigger: registra el envío y lo pasa al coordinador"""
     try:
-        post = Post.find_by_id(post_id)
-        if not post:
-            logger.error(f"Post {post_id} no encontrado")
-            return
+        cuba_tz = pytz.timezone(TIMEZONE)
+        now = datetime.now(cuba_tz)
+        await run_db(Post.mark_fired, post_id, datetime.utcnow())
         
-        post_channels = PostChannel.find_by_post_id(post_id)
-        channels = [pc.channel_id for pc in post_channels]
+        # APScheduler ejecuta tarde los disparos dentro de misfire_grace_time
+        due = last_scheduled_time(schedule, now)
+        if due and (now - due).total_seconds() > MISFIRE_GRACE_SECONDS:
+            post = await run_db(Post.find_by_id, post_id)
+            if post:
+                await send_late_run_notice(bot, post, schedule, [due], now)
+    except Exception as e:
+        logger.error(f"Error registrando envío programado de post {post_id}: {e}")
+    
+    await dispatch_coordinator.submit(bot, post_id)
+
+async def reconcile_missed_posts(bot: Bot):
+    """Recupera al arrancar los envíos que se perdieron con el bot detenido
+    
+    Compara la última hora programada de cada post con su last_fired_at y
+    aplica la política de recuperación del horario.
+    """
+    try:
+        cuba_tz = pytz.timezone(TIMEZONE)
+        now = datetime.now(cuba_tz)
+        late_posts = []
         
-        if not channels:
-            logger.warning(f"No hay canales para post {post_id}")
-            return
+        for post, schedule, channel_ids in await run_db(Post.find_active_configs) or []:
+            if not schedule or not channel_ids:
+                continue
+            post_id = str(post._id)
+            
+            # Sin envíos previos no hay nada que recuperar: se empieza a contar ahora
+            if not post.last_fired_at:
+                await run_db(Post.mark_fired, post_id, datetime.utcnow())
+                continue
+            
+            last_fired = pytz.utc.localize(post.last_fired_at).astimezone(cuba_tz)
+            since = max(last_fired, now - timedelta(days=CATCHUP_MAX_DAYS))
+            missed = scheduled_times_between(schedule, since, now)
+            if not missed:
+                continue
+            
+            if schedule.catchup_policy == 'skip':
+                logger.info(f"Post {post_id}: {len(missed)} envíos perdidos omitidos (política skip)")
+                continue
+            
+            if schedule.catchup_policy == 'late':
+                if now - missed[-1] > timedelta(minutes=schedule.catchup_window_minutes):
+                    logger.info(f"Post {post_id}: envío perdido de {missed[-1]} fuera de la ventana de recuperación")
+                    continue
+                missed = missed[-1:]
+            
+            await run_db(Post.mark_fired, post_id, datetime.utcnow())
+            await send_late_run_notice(bot, post, schedule, missed, now)
+            late_posts.append(post_id)
         
-        schedule = PostSchedule.find_by_post_id(post_id)
-        if not schedule:
-            logger.error(f"Horario no encontrado para post {post_id}")
-            return
+        if late_posts:
+            logger.info(f"Recuperando {len(late_posts)} envíos perdidos")
+            await asyncio.gather(*(dispatch_coordinator.submit(bot, post_id) for post_id in late_posts))
+    
+    except Exception as e:
+        logger.error(f"Error recuperando envíos perdidos: {e}")
+
+async def send_late_run_notice(bot: Bot, post: Post, schedule: PostSchedule, missed: list, now: datetime):
+    """Avisa al administrador de que un envío sale con retraso"""
+    try:
+        due = missed[-1]
+        delay_minutes = int((now - due).total_seconds() // 60)
         
-        # Estadísticas de envío
-        sent_count = 0
-        error_count = 0
+        notice_text = (
+            f"⏰ **Envío Atrasado**\n\n"
+            f"📝 **Post:** {post.name}\n"
+            f"🕐 **Programado para:** {due.strftime('%H:%M')} del {due.strftime('%d/%m/%Y')}\n"
+            f"⌛ **Retraso:** {delay_minutes} min\n"
+            f"⚙️ **Política:** {CATCHUP_POLICY_NAMES.get(schedule.catchup_policy, schedule.catchup_policy)}\n"
+        )
+        if len(missed) > 1:
+            notice_text += f"🔁 **Envíos perdidos agrupados:** {len(missed)}\n"
+        
+        await bot.send_message(chat_id=ADMIN_ID, text=notice_text, parse_mode='Markdown')
+        logger.info(f"Envío atrasado de post {post._id}: {delay_minutes} min")
+    except Exception as e:
+        logger.error(f"Error enviando aviso de envío atrasado: {e}")
+
+class PostDispatch:
+    """Estado del envío de un post a sus canales"""
+    
+    def __init__(self, bot: Bot, post: Post, schedule: PostSchedule, channels: list,
+                 send_time: datetime, is_manual: bool = False):
+        self.bot = bot
+        self.post = post
+        self.post_id = str(post._id)
+        self.schedule = schedule
+        self.channels = channels
+        self.send_time = send_time
+        self.is_manual = is_manual
+        self.results = {}
+        # Resumen de la ventana de envío (None = notificación propia del post)
+        self.digest = None
+        
+        # La estrategia se aprende en el primer canal y se aplica al resto
+        self.strategy = initial_dispatch_strategy(post, schedule)
+        self.strategy_learned = False
+    
+    async def send_to(self, channel_id: str):
+        result = await send_post_to_channel(
+            self.bot, channel_id, self.post, self.post_id, self.schedule, self.send_time, self.strategy
+        )
+        self.results[channel_id] = result
+        
+        sent_info = result[0]
+        if self.digest:
+            self.digest.record_send(self.post_id, channel_id, None if sent_info else (result[1] or 'Error desconocido'))
+        if self.strategy is None and sent_info and sent_info['strategy_confirmed']:
+            self.strategy = sent_info['strategy']
+            self.strategy_learned = True
+            logger.info(f"Estrategia aprendida para post {self.post_id}: {self.strategy}")
+        return result
+    
+    async def finish(self):
+        """Guarda resultados, notifica al administrador y encola las eliminaciones"""
+        post_id = self.post_id
+        post = self.post
+        
+        # Estadísticas de envío (en el mismo orden que los canales)
         sent_messages = []
         failed_channels = []
-        
-        for channel_id in channels:
-            try:
-                message = None
-                
-                # Intentar reenviar mensaje original si está configurado
-                if schedule.forward_original and post.source_channel and post.source_message_id:
-                    try:
-                        message = await bot.forward_message(
-                            chat_id=channel_id,
-                            from_chat_id=post.source_channel,
-                            message_id=post.source_message_id
-                        )
-                        logger.info(f"Reenviado mensaje original a {channel_id}")
-                    except Exception:
-                        logger.info(f"No se pudo reenviar, enviando contenido guardado")
-                
-                # Si no se pudo reenviar, enviar contenido guardado
-                if not message:
-                    message = await send_content_by_type(bot, channel_id, post)
-                
-                if message:
-                    sent_count += 1
-                    sent_messages.append({
-                        'channel_id': channel_id,
-                        'message_id': message.message_id,
-                        'post_id': post_id
-                    })
-                    
-                    # Fijar mensaje si está configurado
-                    if schedule.pin_message:
-                        try:
-                            await bot.pin_chat_message(
-                                chat_id=channel_id,
-                                message_id=message.message_id,
-                                disable_notification=True
-                            )
-                        except Exception as pin_error:
-                            logger.warning(f"No se pudo fijar mensaje: {pin_error}")
-                    
-                    # Programar eliminación
-                    if schedule.delete_after_hours > 0:
-                        delete_time = send_time + timedelta(hours=schedule.delete_after_hours)
-                        scheduler.add_job(
-                            delete_message_with_notification,
-                            trigger='date',
-                            run_date=delete_time,
-                            args=[bot, channel_id, message.message_id, post_id, post.name, send_time],
-                            id=f"delete_{post_id}_{channel_id}_{message.message_id}",
-                            replace_existing=True
-                        )
-                else:
-                    error_count += 1
-                    failed_channels.append({
-                        'channel_id': channel_id,
-                        'error': 'No se pudo enviar el mensaje'
-                    })
-                
-                logger.info(f"Enviado post {post_id} a canal {channel_id}")
-                
-            except Exception as e:
-                error_count += 1
+        for channel_id in self.channels:
+            sent_info, error = self.results.get(channel_id, (None, 'No se pudo enviar el mensaje'))
+            if sent_info:
+                sent_messages.append(sent_info)
+            else:
                 failed_channels.append({
                     'channel_id': channel_id,
-                    'error': str(e)
+                    'error': error
                 })
-                logger.error(f"Error enviando post {post_id} a {channel_id}: {e}")
         
-        # Enviar notificación al administrador
-        await send_post_notification(
-            bot, post, send_time, len(channels), sent_count, 
-            error_count, failed_channels, is_manual
-        )
+        # Si la estrategia aprendida dejó de funcionar (p. ej. se borró el original), cambiarla
+        used_strategies = {info['strategy'] for info in sent_messages if info['strategy_confirmed']}
+        if self.strategy and used_strategies and self.strategy not in used_strategies:
+            new_strategy = 'copy' if 'copy' in used_strategies else 'send'
+            logger.info(f"Estrategia de post {post_id} cambiada de {self.strategy} a {new_strategy}")
+            self.strategy = new_strategy
+            self.strategy_learned = True
+        
+        if self.strategy_learned:
+            await run_db(post.set_dispatch_strategy, self.strategy)
+        
+        sent_count = len(sent_messages)
+        error_count = len(failed_channels)
+        
+        if sent_count:
+            global last_successful_send_at
+            last_successful_send_at = time.time()
+            last_successful_send_timestamp.set(last_successful_send_at)
+        
+        # Enviar notificación al administrador (en modo resumen la envía la ventana)
+        if self.digest is None:
+            await send_post_notification(
+                self.bot, post, self.send_time, len(self.channels), sent_count, 
+                error_count, failed_channels, self.is_manual
+            )
         
         # Guardar información de mensajes enviados para eliminación posterior
         if sent_messages:
-            save_sent_messages_info(post_id, sent_messages, send_time)
+            await run_db(
+                save_sent_messages_info, post_id, sent_messages, self.send_time,
+                self.schedule.delete_after_hours > 0
+            )
+            
+            # Encolar eliminaciones en la base de datos (sobreviven a reinicios)
+            if self.schedule.delete_after_hours > 0:
+                await run_db(bulk_write, 'deletion_stats', [
+                    create_deletion_batch(post_id, post.name, self.send_time, len(sent_messages))
+                ])
+                await run_db(
+                    enqueue_message_deletions, post_id, sent_messages,
+                    self.send_time, self.schedule.delete_after_hours
+                )
+
+async def load_post_dispatch(bot: Bot, post_id: str, is_manual: bool = False, send_time: datetime = None):
+    """Prepara el envío de un post; devuelve None si no se puede enviar"""
+    if send_time is None:
+        send_time = datetime.now(pytz.timezone(TIMEZONE))
+    
+    # Post, horario y canales en una sola consulta
+    post, schedule, channels = await run_db(Post.find_config, post_id)
+    if not post:
+        logger.error(f"Post {post_id} no encontrado")
+        return None
+    
+    if not channels:
+        logger.warning(f"No hay canales para post {post_id}")
+        return None
+    
+    if not schedule:
+        logger.error(f"Horario no encontrado para post {post_id}")
+        return None
+    
+    return PostDispatch(bot, post, schedule, channels, send_time, is_manual)
+
+async def send_post_to_channels_with_notification(bot: Bot, post_id: str, is_manual: bool = False):
+    """Envía post a canales y notifica al administrador"""
+    try:
+        started = time.perf_counter()
+        dispatch = await load_post_dispatch(bot, post_id, is_manual)
+        if not dispatch:
+            return
+        
+        digest = None
+        if ADMIN_DIGEST_ENABLED:
+            digest = await digest_manager.open(bot, dispatch.send_time, is_manual, [dispatch])
+        
+        # Un solo envío para aprender la estrategia; si no se aprende (fallo
+        # pasajero) el resto sale igualmente en paralelo y cada canal prueba
+        # reenviar, copiar y enviar por su cuenta
+        pending_channels = list(dispatch.channels)
+        if dispatch.strategy is None and pending_channels:
+            await dispatch.send_to(pending_channels.pop(0))
+        
+        # Limitar cuántos canales se atienden a la vez
+        semaphore = asyncio.Semaphore(max(1, SEND_CONCURRENCY))
+        
+        async def send_limited(channel_id):
+            async with semaphore:
+                return await dispatch.send_to(channel_id)
+        
+        await asyncio.gather(*(send_limited(channel_id) for channel_id in pending_channels))
+        fanout_duration_seconds.observe(
+            time.perf_counter() - started, mode='manual' if is_manual else 'scheduled'
+        )
+        await dispatch.finish()
+        if digest:
+            await digest.close()
     
     except Exception as e:
         logger.error(f"Error in send_post_to_channels_with_notification: {e}")
 
+def initial_dispatch_strategy(post: Post, schedule: PostSchedule):
+    """Estrategia de envío conocida para este post, o None si hay que aprenderla"""
+    if not (schedule.forward_original and post.source_channel and post.source_message_id):
+        return 'send'
+    return post.learned_strategy()
+
+def is_source_error(error: Exception):
+    """El mensaje original no se puede reenviar/copiar a ningún canal (no es un fallo pasajero)"""
+    return isinstance(error, BadRequest) and any(
+        reason in str(error).lower() for reason in SOURCE_ERROR_REASONS
+    )
+
+async def deliver_post(bot: Bot, channel_id: str, post: Post, strategy: str = None):
+    """Entrega el post según la estrategia. Devuelve (mensaje, estrategia usada, confirmada)
+    
+    Sin estrategia se prueba en orden: reenviar, copiar y enviar el contenido guardado.
+    Con estrategia, si falla se envía el contenido guardado. La estrategia usada
+    solo se da por confirmada (y se puede aprender) si los intentos anteriores
+    fallaron por el mensaje original; un timeout, un 429 o las restricciones de
+    un canal no cambian la estrategia del post.
+    """
+    confirmed = True
+    if strategy is None:
+        attempts = ['forward', 'copy', 'send']
+    elif strategy == 'send':
+        attempts = ['send']
+    else:
+        attempts = [strategy, 'send']
+    
+    for attempt in attempts:
+        if attempt == 'send':
+            message = await send_content_by_type(bot, channel_id, post)
+        else:
+            try:
+                if attempt == 'forward':
+                    message = await bot.forward_message(
+                        chat_id=channel_id,
+                        from_chat_id=post.source_channel,
+                        message_id=post.source_message_id
+                    )
+                    logger.info(f"Reenviado mensaje original a {channel_id}")
+                else:
+                    message = await bot.copy_message(
+                        chat_id=channel_id,
+                        from_chat_id=post.source_channel,
+                        message_id=post.source_message_id
+                    )
+                    logger.info(f"Copiado mensaje original a {channel_id}")
+            except Exception as e:
+                logger.info(f"No se pudo {'reenviar' if attempt == 'forward' else 'copiar'} a {channel_id}: {e}")
+                message = None
+                if not is_source_error(e):
+                    confirmed = False
+        
+        channel_messages_total.inc(action=attempt, outcome='success' if message else 'error')
+        if attempt != attempts[0]:
+            channel_messages_total.inc(action='fallback', outcome='success' if message else 'error')
+        
+        if message:
+            return message, attempt, confirmed
+    
+    return None, None, False
+
+async def send_post_to_channel(bot: Bot, channel_id: str, post: Post, post_id: str,
+                               schedule: PostSchedule, send_time: datetime, strategy: str = 'send'):
+    """Envía el post a un canal. Devuelve (info_mensaje, None) o (None, error)"""
+    try:
+        message, used_strategy, confirmed = await deliver_post(bot, channel_id, post, strategy)
+        
+        if not message:
+            return None, 'No se pudo enviar el mensaje'
+        
+        # Fijar mensaje si está configurado
+        if schedule.pin_message:
+            try:
+                await bot.pin_chat_message(
+                    chat_id=channel_id,
+                    message_id=message.message_id,
+                    disable_notification=True
+                )
+                channel_messages_total.inc(action='pin', outcome='success')
+            except Exception as pin_error:
+                channel_messages_total.inc(action='pin', outcome='error')
+                logger.warning(f"No se pudo fijar mensaje: {pin_error}")
+        
+        logger.info(f"Enviado post {post_id} a canal {channel_id}")
+        return {
+            'channel_id': channel_id,
+            'message_id': message.message_id,
+            'post_id': post_id,
+            'strategy': used_strategy,
+            'strategy_confirmed': confirmed
+        }, None
+        
+    except Exception as e:
+        logger.error(f"Error enviando post {post_id} a {channel_id}: {e}")
+        return None, str(e)
+
 async def send_content_by_type(bot: Bot, channel_id: str, post: Post):
     """Envía contenido según el tipo"""
     try:
@@ -244,8 +618,8 @@ async def send_post_notification(bot: Bot, post: Post, send_time: datetime,
         
         # Crear botones de acción
         keyboard = [
-            [InlineKeyboardButton("🔄 Reenviar", callback_data=f"resend_post_{post._id}")],
-            [InlineKeyboardButton("🗑️ Eliminar de Todos", callback_data=f"delete_all_posts_{post._id}")]
+            [InlineKeyboardButton("🔄 Reenviar", callback_data=encode_callback("resend_post", post._id))],
+            [InlineKeyboardButton("🗑️ Eliminar de Todos", callback_data=encode_callback("delete_all_posts", post._id))]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
@@ -258,7 +632,7 @@ async def send_post_notification(bot: Bot, post: Post, send_time: datetime,
         )
         
         # Guardar el ID del mensaje de notificación para eliminarlo después
-        save_notification_message_id(str(post._id), notification_msg.message_id, send_time)
+        await run_db(save_notification_message_id, str(post._id), notification_msg.message_id, send_time)
         
         logger.info(f"Notificación de envío enviada para post {post._id}")
         
@@ -282,30 +656,132 @@ async def delete_message_with_notification(bot: Bot, channel_id: str, message_id
         error_msg = str(e)
         logger.error(f"Error eliminando mensaje {message_id}: {e}")
     
+    channel_messages_total.inc(action='delete', outcome='success' if success else 'error')
+    
     # Actualizar estadísticas globales de eliminación
-    await update_deletion_stats(bot, post_id, post_name, send_time, delete_time, success, error_msg)
+    await update_deletion_stats(bot, post_id, post_name, send_time, delete_time, success, error_msg,
+                                channel_id=channel_id, message_id=message_id)
+
+def enqueue_message_deletions(post_id: str, sent_messages: list, send_time: datetime, delete_after_hours: int):
+    """Guarda en la cola persistente la eliminación de cada mensaje enviado
+    
+    Se escribe siempre en el momento (nunca en el buffer diferido): perder
+    estos trabajos dejaría los mensajes publicados para siempre.
+    """
+    # El vencimiento cuenta desde la hora de envío, no desde que se escribe
+    sent_at = send_time.astimezone(pytz.utc).replace(tzinfo=None) if send_time.tzinfo else send_time
+    due_time = sent_at + timedelta(hours=delete_after_hours)
+    jobs = [
+        ScheduledJob(
+            post_id=post_id,
+            job_type='delete',
+            scheduled_time=due_time,
+            channel_id=msg_info['channel_id'],
+            message_id=msg_info['message_id'],
+            send_time=send_time
+        )
+        for msg_info in sent_messages
+    ]
+    if ScheduledJob.save_many(jobs):
+        logger.info(f"Encoladas {len(jobs)} eliminaciones para post {post_id} ({due_time} UTC)")
+
+def write_fanout_results(collection_name: str, operations: list):
+    """Escribe los resultados de un envío en bloque, o los deja en el buffer diferido
+    
+    Solo para registros que toleran perderse en un reinicio (sent_messages);
+    la cola de eliminaciones, los lotes de deletion_stats y las notificaciones
+    se escriben con bulk_write directamente.
+    """
+    if WRITE_BEHIND_ENABLED:
+        write_behind.add(collection_name, operations)
+    else:
+        bulk_write(collection_name, operations)
 
-def save_sent_messages_info(post_id: str, sent_messages: list, send_time: datetime):
-    """Guarda información de mensajes enviados para tracking de eliminación"""
+async def compact_history_job():
+    """Compacta el historial sin bloquear el bucle de eventos"""
+    result = await run_db(compact_history)
+    if result and any(result.values()):
+        logger.info(f"Historial compactado: {result}")
+
+def flush_write_behind():
+    """Vacía el buffer de escrituras diferidas"""
     try:
-        from database import db
+        write_behind.flush()
+    except Exception as e:
+        logger.error(f"Error vaciando escrituras diferidas: {e}")
+
+async def process_due_deletions(bot: Bot):
+    """Drena la cola de eliminaciones vencidas en orden de vencimiento"""
+    try:
+        due_jobs = await run_db(ScheduledJob.find_due, 'delete', datetime.utcnow())
+        if not due_jobs:
+            pending_deletions.set(await run_db(ScheduledJob.count_pending, 'delete'))
+            return
         
-        # Limpiar registros anteriores del mismo post para este envío
-        db.sent_messages.delete_many({
-            'post_id': post_id,
-            'send_time': send_time
-        })
+        # Agrupar por envío (post + hora de envío): vencen juntos
+        batches = {}
+        for job in due_jobs:
+            batches.setdefault((job.post_id, job.send_time), []).append(job)
         
-        # Guardar nuevos registros
-        for msg_info in sent_messages:
-            db.sent_messages.insert_one({
-                'post_id': post_id,
-                'channel_id': msg_info['channel_id'],
-                'message_id': msg_info['message_id'],
-                'send_time': send_time,
-                'sent_at': datetime.utcnow(),
-                'deleted': False
-            })
+        cuba_tz = pytz.timezone(TIMEZONE)
+        semaphore = asyncio.Semaphore(max(1, SEND_CONCURRENCY))
+        
+        for (post_id, send_time), jobs in batches.items():
+            post = await run_db(Post.find_by_id, post_id)
+            post_name = post.name if post else f"Post {post_id}"
+            
+            # MongoDB devuelve fechas UTC sin zona horaria
+            if send_time and send_time.tzinfo is None:
+                send_time = pytz.utc.localize(send_time).astimezone(cuba_tz)
+            
+            async def delete_limited(job):
+                async with semaphore:
+                    await delete_message_with_notification(
+                        bot, job.channel_id, job.message_id, post_id, post_name, send_time
+                    )
+            
+            await asyncio.gather(*(delete_limited(job) for job in jobs))
+            await run_db(ScheduledJob.mark_completed, [job._id for job in jobs])
+            logger.info(f"Procesadas {len(jobs)} eliminaciones del post {post_id}")
+        
+        pending_deletions.set(await run_db(ScheduledJob.count_pending, 'delete'))
+    
+    except Exception as e:
+        logger.error(f"Error procesando cola de eliminaciones: {e}")
+
+def save_sent_messages_info(post_id: str, sent_messages: list, send_time: datetime,
+                            delete_scheduled: bool = True):
+    """Guarda información de mensajes enviados para tracking de eliminación
+    
+    delete_scheduled=False marca los envíos sin eliminación automática: el
+    historial los da por finalizados al cumplir RETENTION_DAYS.
+    """
+    try:
+        sent_at = datetime.utcnow()
+        
+        # Un upsert por canal en un único bulk_write desordenado: repetir el
+        # guardado del mismo envío reemplaza los registros en lugar de duplicarlos
+        operations = [
+            ReplaceOne(
+                {
+                    'post_id': post_id,
+                    'send_time': send_time,
+                    'channel_id': msg_info['channel_id']
+                },
+                {
+                    'post_id': post_id,
+                    'channel_id': msg_info['channel_id'],
+                    'message_id': msg_info['message_id'],
+                    'send_time': send_time,
+                    'sent_at': sent_at,
+                    'deleted': False,
+                    'delete_scheduled': delete_scheduled
+                },
+                upsert=True
+            )
+            for msg_info in sent_messages
+        ]
+        write_fanout_results('sent_messages', operations)
             
         logger.info(f"Guardada información de {len(sent_messages)} mensajes para post {post_id}")
         
@@ -315,90 +791,103 @@ def save_sent_messages_info(post_id: str, sent_messages: list, send_time: dateti
 def save_notification_message_id(post_id: str, notification_message_id: int, send_time: datetime):
     """Guarda el ID del mensaje de notificación para eliminarlo después"""
     try:
-        from database import db
-        
-        db.notification_messages.insert_one({
+        bulk_write('notification_messages', [InsertOne({
             'post_id': post_id,
             'message_id': notification_message_id,
             'send_time': send_time,
             'deleted': False
-        })
+        })])
         
         logger.info(f"Guardado ID de notificación {notification_message_id} para post {post_id}")
         
     except Exception as e:
         logger.error(f"Error guardando ID de notificación: {e}")
 
+def create_deletion_batch(post_id: str, post_name: str, send_time: datetime, expected_count: int):
+    """Crea el agregado del lote de envío con el número de eliminaciones esperadas"""
+    return UpdateOne(
+        {'post_id': post_id, 'send_time': send_time},
+        {'$setOnInsert': {
+            'post_id': post_id,
+            'post_name': post_name,
+            'send_time': send_time,
+            'total_channels': expected_count,
+            'deleted_count': 0,
+            'failed_count': 0,
+            'failed_reasons': [],
+            'notified': False,
+            'created_at': datetime.utcnow()
+        }},
+        upsert=True
+    )
+
 async def update_deletion_stats(bot: Bot, post_id: str, post_name: str, send_time: datetime, 
-                               delete_time: datetime, success: bool, error_msg: str = None):
+                               delete_time: datetime, success: bool, error_msg: str = None,
+                               channel_id: str = None, message_id: int = None):
     """Actualiza estadísticas de eliminación y envía notificación final"""
     try:
         from database import db
         
-        # Buscar o crear registro de estadísticas de eliminación
-        stats = db.deletion_stats.find_one({
-            'post_id': post_id, 
-            'send_time': send_time
-        })
+        batch_filter = {'post_id': post_id, 'send_time': send_time}
+        
+        # Incremento atómico sobre el agregado del lote
+        update = {
+            '$inc': {'deleted_count': 1} if success else {'failed_count': 1},
+            '$set': {'delete_time': delete_time}
+        }
+        if not success and error_msg:
+            update['$push'] = {'failed_reasons': {'$each': [error_msg], '$slice': -MAX_FAILED_REASONS}}
         
-        if not stats:
-            stats = {
+        result = await run_db(db.deletion_stats.update_one, batch_filter, update)
+        
+        if result.matched_count == 0:
+            # Lote creado antes de existir el agregado: crearlo una vez a partir de sent_messages
+            expected_count = await run_db(db.sent_messages.count_documents, batch_filter)
+            await run_db(
+                db.deletion_stats.bulk_write,
+                [create_deletion_batch(post_id, post_name, send_time, expected_count)]
+            )
+            await run_db(db.deletion_stats.update_one, batch_filter, update)
+        
+        # Actualizar el registro de este mensaje
+        if channel_id is not None and message_id is not None:
+            message_filter = {
                 'post_id': post_id,
-                'post_name': post_name,
                 'send_time': send_time,
-                'delete_time': delete_time,
-                'total_channels': 0,
-                'deleted_count': 0,
-                'failed_count': 0,
-                'failed_reasons': [],
-                'notified': False
+                'channel_id': channel_id,
+                'message_id': message_id
             }
+            if success:
+                await run_db(
+                    db.sent_messages.update_one,
+                    message_filter,
+                    {'$set': {'deleted': True, 'deleted_at': datetime.utcnow()}}
+                )
+            else:
+                await run_db(
+                    db.sent_messages.update_one,
+                    message_filter,
+                    {'$set': {'deletion_error': error_msg or 'Error desconocido'}}
+                )
         
-        # Actualizar contadores
-        stats['total_channels'] = stats.get('total_channels', 0) + 1
-        
-        if success:
-            stats['deleted_count'] = stats.get('deleted_count', 0) + 1
-            # Actualizar registro de mensaje como eliminado
-            db.sent_messages.update_one(
-                {
-                    'post_id': post_id, 
-                    'send_time': send_time,
-                    'deleted': False
-                },
-                {'$set': {'deleted': True, 'deleted_at': datetime.utcnow()}},
-            )
-        else:
-            stats['failed_count'] = stats.get('failed_count', 0) + 1
-            if error_msg:
-                if 'failed_reasons' not in stats:
-                    stats['failed_reasons'] = []
-                stats['failed_reasons'].append(error_msg)
-        
-        # Guardar estadísticas actualizadas
-        db.deletion_stats.replace_one(
-            {'post_id': post_id, 'send_time': send_time},
-            stats,
-            upsert=True
+        # Finalizar el lote una sola vez: cuando eliminados + fallidos alcanzan lo esperado
+        stats = await run_db(
+            db.deletion_stats.find_one_and_update,
+            {
+                **batch_filter,
+                'notified': False,
+                '$expr': {'$gte': [{'$add': ['$deleted_count', '$failed_count']}, '$total_channels']}
+            },
+            {'$set': {'notified': True}},
+            return_document=ReturnDocument.AFTER
         )
         
-        # Verificar si todos los mensajes han sido procesados
-        pending_messages = db.sent_messages.count_documents({
-            'post_id': post_id,
-            'send_time': send_time,
-            'deleted': False
-        })
-        
-        # Si no hay mensajes pendientes y no se ha notificado, enviar notificación final
-        if pending_messages == 0 and not stats.get('notified', False):
-            # Marcar como notificado
-            db.deletion_stats.update_one(
-                {'post_id': post_id, 'send_time': send_time},
-                {'$set': {'notified': True}}
-            )
-            
-            # Enviar notificación final
-            await send_deletion_notification(bot, post_id, stats)
+        if stats:
+            # En modo resumen se edita el mensaje de la ventana en lugar de enviar otro
+            if not await digest_manager.note_deletion(bot, send_time, final=True):
+                await send_deletion_notification(bot, post_id, stats)
+        else:
+            await digest_manager.note_deletion(bot, send_time)
             
     except Exception as e:
         logger.error(f"Error actualizando estadísticas de eliminación: {e}")
@@ -409,8 +898,15 @@ async def send_deletion_notification(bot: Bot, post_id: str, stats: dict):
         from database import db
         
         cuba_tz = pytz.timezone(TIMEZONE)
-        send_time_formatted = stats['send_time'].strftime('%H:%M:%S - %d/%m/%Y')
-        delete_time_formatted = stats['delete_time'].strftime('%H:%M:%S - %d/%m/%Y')
+        
+        # MongoDB devuelve fechas UTC sin zona horaria
+        def to_cuba(value):
+            if value.tzinfo is None:
+                value = pytz.utc.localize(value)
+            return value.astimezone(cuba_tz)
+        
+        send_time_formatted = to_cuba(stats['send_time']).strftime('%H:%M:%S - %d/%m/%Y')
+        delete_time_formatted = to_cuba(stats['delete_time']).strftime('%H:%M:%S - %d/%m/%Y')
         
         notification_text = (
             f"🗑️ **Eliminación Automática Completada**\n\n"
@@ -439,7 +935,7 @@ async def send_deletion_notification(bot: Bot, post_id: str, stats: dict):
         )
         
         # Eliminar el mensaje de notificación original
-        notification_msg = db.notification_messages.find_one({
+        notification_msg = await run_db(db.notification_messages.find_one, {
             'post_id': post_id,
             'send_time': stats['send_time'],
             'deleted': False
@@ -453,7 +949,8 @@ async def send_deletion_notification(bot: Bot, post_id: str, stats: dict):
                 )
                 
                 # Marcar como eliminado
-                db.notification_messages.update_one(
+                await run_db(
+                    db.notification_messages.update_one,
                     {'_id': notification_msg['_id']},
                     {'$set': {'deleted': True}}
                 )
@@ -474,10 +971,10 @@ async def delete_all_post_messages_now(bot: Bot, post_id: str):
         from database import db
         
         # Buscar mensajes pendientes de eliminación
-        pending_messages = list(db.sent_messages.find({
+        pending_messages = await run_db(lambda: list(db.sent_messages.find({
             'post_id': post_id,
             'deleted': False
-        }))
+        })))
         
         if not pending_messages:
             logger.info(f"No hay mensajes pendientes para eliminar del post {post_id}")
@@ -488,7 +985,7 @@ async def delete_all_post_messages_now(bot: Bot, post_id: str):
         failed_reasons = []
         
         # Obtener información del post
-        post = Post.find_by_id(post_id)
+        post = await run_db(Post.find_by_id, post_id)
         post_name = post.name if post else f"Post {post_id}"
         
         # Obtener el tiempo de envío más reciente
@@ -504,24 +1001,24 @@ async def delete_all_post_messages_now(bot: Bot, post_id: str):
                 )
                 
                 # Marcar como eliminado
-                db.sent_messages.update_one(
+                await run_db(
+                    db.sent_messages.update_one,
                     {'_id': msg_info['_id']},
                     {'$set': {'deleted': True, 'deleted_at': datetime.utcnow()}}
                 )
                 
                 deleted_count += 1
+                channel_messages_total.inc(action='delete', outcome='success')
                 logger.info(f"Eliminado mensaje {msg_info['message_id']} de {msg_info['channel_id']}")
                 
             except Exception as e:
                 failed_count += 1
+                channel_messages_total.inc(action='delete', outcome='error')
                 failed_reasons.append(str(e))
                 logger.error(f"Error eliminando mensaje {msg_info['message_id']}: {e}")
         
-        # Cancelar trabajos de eliminación programada
-        for msg_info in pending_messages:
-            job_id = f"delete_{post_id}_{msg_info['channel_id']}_{msg_info['message_id']}"
-            if scheduler.get_job(job_id):
-                scheduler.remove_job(job_id)
+        # Cancelar eliminaciones pendientes en la cola y cerrar sus lotes
+        await run_db(ScheduledJob.cancel_pending, post_id, 'delete')
         
         # Enviar notificación de eliminación manual
         await send_manual_deletion_notification(
@@ -572,7 +1069,7 @@ async def send_manual_deletion_notification(bot: Bot, post_id: str, post_name: s
         )
         
         # Eliminar mensaje de notificación original si existe
-        notification_msg = db.notification_messages.find_one({
+        notification_msg = await run_db(db.notification_messages.find_one, {
             'post_id': post_id,
             'send_time': send_time,
             'deleted': False
@@ -586,7 +1083,8 @@ async def send_manual_deletion_notification(bot: Bot, post_id: str, post_name: s
                 )
                 
                 # Marcar como eliminado
-                db.notification_messages.update_one(
+                await run_db(
+                    db.notification_messages.update_one,
                     {'_id': notification_msg['_id']},
                     {'$set': {'deleted': True}}
                 )
@@ -622,10 +1120,9 @@ async def delete_message(bot: Bot, channel_id: str, message_id: int):
     except Exception as e:
         logger.error(f"Error eliminando mensaje {message_id}: {e}")
 
-def reschedule_post_job(bot: Bot, post_id: str):
+async def reschedule_post_job(bot: Bot, post_id: str):
     try:
-        post = Post.find_by_id(post_id)
-        schedule = PostSchedule.find_by_post_id(post_id)
+        post, schedule, channel_ids = await run_db(Post.find_config, post_id)
         
         if post and schedule:
             schedule_post(bot, post, schedule)
@@ -640,6 +1137,7 @@ def remove_post_jobs(post_id: str):
         logger.info(f"Eliminado trabajo {send_job_id}")
 
 def stop_scheduler():
+    flush_write_behind()
     if scheduler:
         scheduler.shutdown()
         logger.info("Scheduler detenido")
@@ -0,0 +1,624 @@
+"""
+Almacenamiento de documentos compatible con la API de pymongo que usa el bot
+
+Los modelos de database.py y el scheduler trabajan con colecciones al estilo
+de pymongo (find, update_one, bulk_write...). Este módulo implementa ese
+subconjunto sobre dos almacenes locales:
+
+- SQLiteDatabase: una tabla por colección con el documento en JSON. Las
+  igualdades sobre _id y sobre campos simples se resuelven en SQL (con
+  índices de expresión creados por create_index); el resto del filtro se
+  evalúa en Python sobre las filas candidatas.
+- MemoryDatabase: lo mismo en memoria, para los benchmarks.
+"""
+
+import calendar
+import contextlib
+import copy
+import json
+import re
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+import pytz
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+# --- Consultas y actualizaciones ---
+
+def _normalize(value):
+    """Igual que pymongo y BSON: fechas en UTC sin zona y con precisión de milisegundos
+
+    Se aplica a los documentos y a los filtros, así una fecha con
+    microsegundos encuentra el documento que se guardó con ella.
+    """
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(pytz.utc).replace(tzinfo=None)
+        return value.replace(microsecond=value.microsecond // 1000 * 1000)
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+def _get_field(doc, path):
+    value = doc
+    for part in path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return None, False
+        value = value[part]
+    return value, True
+
+def _compare(a, b):
+    try:
+        return (a > b) - (a < b)
+    except TypeError:
+        return None
+
+def _eval_expr(doc, expr):
+    if isinstance(expr, str) and expr.startswith('$'):
+        return _get_field(doc, expr[1:])[0]
+    if isinstance(expr, dict):
+        (op, args), = expr.items()
+        values = [_eval_expr(doc, arg) for arg in args]
+        if op == '$add':
+            return sum(v or 0 for v in values)
+        if op in ('$gte', '$gt', '$lte', '$lt', '$eq', '$ne'):
+            return _match_operator(values[0], True, op, values[1])
+        raise NotImplementedError(f"Operador $expr no soportado: {op}")
+    return expr
+
+def _match_operator(value, exists, op, arg):
+    if op == '$eq':
+        return value == arg
+    if op == '$ne':
+        return value != arg
+    if op == '$in':
+        if isinstance(value, list):
+            return any(v in arg for v in value)
+        return value in arg
+    if op == '$nin':
+        return value not in arg
+    if op == '$exists':
+        return exists == bool(arg)
+    if op == '$not':
+        return not _match_value(value, exists, arg)
+    if op in ('$gt', '$gte', '$lt', '$lte'):
+        if value is None or arg is None:
+            return False
+        result = _compare(value, arg)
+        if result is None:
+            return False
+        return {'$gt': result > 0, '$gte': result >= 0, '$lt': result < 0, '$lte': result <= 0}[op]
+    raise NotImplementedError(f"Operador no soportado: {op}")
+
+def _match_value(value, exists, condition):
+    if isinstance(condition, dict) and condition and all(k.startswith('$') for k in condition):
+        return all(_match_operator(value, exists, op, arg) for op, arg in condition.items())
+    if isinstance(value, list) and not isinstance(condition, list):
+        return condition in value
+    return value == condition
+
+def match(doc, query):
+    for key, condition in query.items():
+        if key == '$expr':
+            if not _eval_expr(doc, condition):
+                return False
+        elif key == '$and':
+            if not all(match(doc, q) for q in condition):
+                return False
+        elif key == '$or':
+            if not any(match(doc, q) for q in condition):
+                return False
+        else:
+            value, exists = _get_field(doc, key)
+            if not _match_value(value, exists, condition):
+                return False
+    return True
+
+def _set_field(doc, path, value):
+    parts = path.split('.')
+    for part in parts[:-1]:
+        doc = doc.setdefault(part, {})
+    doc[parts[-1]] = value
+
+def apply_update(doc, update, inserting=False):
+    if not any(key.startswith('$') for key in update):
+        keep_id = doc.get('_id')
+        doc.clear()
+        doc.update(copy.deepcopy(update))
+        if keep_id is not None:
+            doc['_id'] = keep_id
+        return
+
+    for op, fields in update.items():
+        for path, arg in fields.items():
+            current, exists = _get_field(doc, path)
+            if op == '$set':
+                _set_field(doc, path, copy.deepcopy(arg))
+            elif op == '$setOnInsert':
+                if inserting:
+                    _set_field(doc, path, copy.deepcopy(arg))
+            elif op == '$unset':
+                parent, _ = _get_field(doc, path.rsplit('.', 1)[0]) if '.' in path else (doc, True)
+                if isinstance(parent, dict):
+                    parent.pop(path.rsplit('.', 1)[-1], None)
+            elif op == '$inc':
+                _set_field(doc, path, (current or 0) + arg)
+            elif op in ('$max', '$min'):
+                value = _normalize(arg)
+                if not exists or current is None or (value > current if op == '$max' else value < current):
+                    _set_field(doc, path, copy.deepcopy(value))
+            elif op in ('$push', '$addToSet'):
+                values = list(current) if exists and current else []
+                items = arg['$each'] if isinstance(arg, dict) and '$each' in arg else [arg]
+                for item in items:
+                    if op == '$push' or item not in values:
+                        values.append(copy.deepcopy(item))
+                if isinstance(arg, dict) and '$slice' in arg:
+                    limit = arg['$slice']
+                    values = values[limit:] if limit < 0 else values[:limit]
+                _set_field(doc, path, values)
+            elif op == '$pull':
+                if exists and isinstance(current, list):
+                    _set_field(doc, path, [v for v in current if not _pull_matches(v, arg)])
+            else:
+                raise NotImplementedError(f"Operador de actualización no soportado: {op}")
+
+def _pull_matches(value, condition):
+    # Una condición de documento ({'post_id': ...}) filtra los subdocumentos
+    if isinstance(condition, dict) and condition and not any(k.startswith('$') for k in condition):
+        return isinstance(value, dict) and match(value, condition)
+    return _match_value(value, True, condition)
+
+def _upsert_base(query):
+    base = {}
+    for key, condition in query.items():
+        if key.startswith('$'):
+            continue
+        if isinstance(condition, dict) and any(k.startswith('$') for k in condition):
+            continue
+        _set_field(base, key, copy.deepcopy(condition))
+    return base
+
+def _project(doc, projection, copy_doc=True):
+    if copy_doc:
+        doc = copy.deepcopy(doc)
+    if not projection:
+        return doc
+    included = {k for k, v in projection.items() if v}
+    if included:
+        result = {k: doc[k] for k in included if k in doc}
+        if projection.get('_id', 1) and '_id' in doc:
+            result['_id'] = doc['_id']
+        return result
+    for key in projection:
+        doc.pop(key, None)
+    return doc
+
+class Cursor:
+    def __init__(self, docs, projection=None, copy_docs=True):
+        self._docs = docs
+        self._projection = projection
+        self._copy_docs = copy_docs
+
+    def sort(self, key, direction=1):
+        self._docs.sort(key=lambda d: (_get_field(d, key)[0] is None, _get_field(d, key)[0]),
+                        reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        if count:
+            self._docs = self._docs[:count]
+        return self
+
+    def __iter__(self):
+        for doc in self._docs:
+            yield _project(doc, self._projection, self._copy_docs)
+
+# --- Colecciones ---
+
+class DocumentCollection:
+    """API de colección de pymongo sobre cuatro primitivas de almacenamiento
+
+    Las subclases implementan _candidates (documentos que pueden cumplir el
+    filtro), _insert, _write (reemplazo por _id), _remove y _transaction.
+    El argumento session se acepta como en pymongo: las transacciones las
+    abre la base de datos con transaction().
+    """
+
+    # True si _candidates devuelve los documentos guardados (no copias)
+    copy_on_read = False
+
+    def __init__(self, name):
+        self.name = name
+
+    def _matching(self, query):
+        query = _normalize(query or {})
+        return [doc for doc in self._candidates(query) if match(doc, query)]
+
+    def insert_one(self, document, session=None):
+        document.setdefault('_id', ObjectId())
+        with self._transaction():
+            self._insert(_normalize(copy.deepcopy(document)))
+        return InsertOneResult(document['_id'], True)
+
+    def insert_many(self, documents, ordered=True, session=None):
+        with self._transaction():
+            ids = [self.insert_one(document).inserted_id for document in documents]
+        return InsertManyResult(ids, True)
+
+    def find(self, query=None, projection=None, session=None):
+        return Cursor(self._matching(query), projection, self.copy_on_read)
+
+    def find_one(self, query=None, projection=None, session=None):
+        docs = self._matching(query)
+        return _project(docs[0], projection, self.copy_on_read) if docs else None
+
+    def count_documents(self, query, session=None):
+        return len(self._matching(query))
+
+    def _update(self, query, update, upsert, many):
+        update = _normalize(update)
+        with self._transaction():
+            docs = self._matching(query)
+            if not many:
+                docs = docs[:1]
+            for doc in docs:
+                apply_update(doc, update)
+                self._write(doc)
+            upserted_id = None
+            if not docs and upsert:
+                doc = _upsert_base(_normalize(query))
+                apply_update(doc, update, inserting=True)
+                doc.setdefault('_id', ObjectId())
+                self._insert(doc)
+                upserted_id = doc['_id']
+        raw = {'n': len(docs) or (1 if upserted_id else 0), 'nModified': len(docs)}
+        if upserted_id:
+            raw['upserted'] = upserted_id
+        return UpdateResult(raw, True)
+
+    def update_one(self, query, update, upsert=False, session=None):
+        return self._update(query, update, upsert, many=False)
+
+    def update_many(self, query, update, upsert=False, session=None):
+        return self._update(query, update, upsert, many=True)
+
+    def replace_one(self, query, replacement, upsert=False, session=None):
+        return self._update(query, replacement, upsert, many=False)
+
+    def find_one_and_update(self, query, update, upsert=False, return_document=ReturnDocument.BEFORE, **kwargs):
+        with self._transaction():
+            docs = self._matching(query)
+            before = copy.deepcopy(docs[0]) if docs else None
+            result = self._update(query, update, upsert, many=False)
+            if return_document == ReturnDocument.AFTER:
+                target_id = docs[0]['_id'] if docs else result.upserted_id
+                return self.find_one({'_id': target_id}) if target_id else None
+        return before
+
+    def delete_one(self, query, session=None):
+        with self._transaction():
+            docs = self._matching(query)[:1]
+            self._remove([doc['_id'] for doc in docs])
+        return DeleteResult({'n': len(docs)}, True)
+
+    def delete_many(self, query, session=None):
+        with self._transaction():
+            docs = self._matching(query)
+            self._remove([doc['_id'] for doc in docs])
+        return DeleteResult({'n': len(docs)}, True)
+
+    def bulk_write(self, requests, ordered=True, session=None):
+        counts = {'nInserted': 0, 'nMatched': 0, 'nModified': 0, 'nRemoved': 0, 'nUpserted': 0, 'upserted': []}
+        with self._transaction():
+            for request in requests:
+                op = type(request).__name__
+                doc = request._doc
+                if op == 'InsertOne':
+                    self.insert_one(doc)
+                    counts['nInserted'] += 1
+                elif op in ('UpdateOne', 'UpdateMany', 'ReplaceOne'):
+                    result = self._update(request._filter, doc, request._upsert, many=(op == 'UpdateMany'))
+                    counts['nMatched'] += result.matched_count
+                    counts['nModified'] += result.modified_count
+                    if result.upserted_id:
+                        counts['nUpserted'] += 1
+                elif op in ('DeleteOne', 'DeleteMany'):
+                    result = (self.delete_one if op == 'DeleteOne' else self.delete_many)(request._filter)
+                    counts['nRemoved'] += result.deleted_count
+        return BulkWriteResult(counts, True)
+
+class MemoryCollection(DocumentCollection):
+    copy_on_read = True
+
+    def __init__(self, name):
+        super().__init__(name)
+        self._docs = {}
+
+    def create_index(self, *args, **kwargs):
+        return 'index'
+
+    def _candidates(self, query):
+        return list(self._docs.values())
+
+    def _insert(self, doc):
+        key = _id_key(doc['_id'])
+        if key in self._docs:
+            raise DuplicateKeyError(f"_id duplicado en {self.name}: {doc['_id']}")
+        self._docs[key] = doc
+
+    def _write(self, doc):
+        self._docs[_id_key(doc['_id'])] = doc
+
+    def _remove(self, ids):
+        for _id in ids:
+            self._docs.pop(_id_key(_id), None)
+
+    def _transaction(self):
+        return contextlib.nullcontext()
+
+class MemoryDatabase:
+    def __init__(self):
+        self._collections = {}
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = MemoryCollection(name)
+        return self._collections[name]
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+    @contextlib.contextmanager
+    def transaction(self):
+        yield None
+
+    def command(self, name, *args, **kwargs):
+        return {'ok': 1.0}
+
+    def close(self):
+        self._collections.clear()
+
+# --- SQLite ---
+
+_EPOCH = datetime(1970, 1, 1)
+_SIMPLE_FIELD = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+_SCALARS = (str, int, float)
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(pytz.utc).replace(tzinfo=None)
+        # Precisión de milisegundos, como BSON
+        return {'$date': calendar.timegm(value.timetuple()) * 1000 + value.microsecond // 1000}
+    if isinstance(value, ObjectId):
+        return {'$oid': str(value)}
+    if isinstance(value, tuple):
+        return list(value)
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+def _decode_object(obj):
+    if len(obj) == 1:
+        if '$date' in obj:
+            return _EPOCH + timedelta(milliseconds=obj['$date'])
+        if '$oid' in obj:
+            return ObjectId(obj['$oid'])
+    return obj
+
+def _encode(doc):
+    return json.dumps(doc, default=_encode_value, ensure_ascii=False, separators=(',', ':'))
+
+def _decode(text):
+    return json.loads(text, object_hook=_decode_object)
+
+def _id_key(value):
+    """Clave de la fila: el _id serializado (conserva el tipo: ObjectId, texto...)"""
+    return json.dumps(value, default=_encode_value, sort_keys=True, separators=(',', ':'))
+
+def _sql_field(field):
+    """Expresión SQL de un campo: las fechas se comparan por sus milisegundos"""
+    return f"coalesce(json_extract(doc, '$.{field}.\"$date\"'), json_extract(doc, '$.{field}'))"
+
+def _sql_value(value):
+    """Valor comparable en SQL, o None si el filtro se deja a Python"""
+    if isinstance(value, datetime):
+        return _encode_value(value)['$date']
+    if isinstance(value, _SCALARS):
+        return value
+    return None
+
+def _is_operator_dict(condition):
+    return isinstance(condition, dict) and condition and all(k.startswith('$') for k in condition)
+
+_RANGE_OPERATORS = {'$gt': '>', '$gte': '>=', '$lt': '<', '$lte': '<='}
+
+def _field_clause(field, op, arg):
+    """(sql, parámetros) para un operador sobre un campo simple, o None"""
+    expr = _sql_field(field)
+    if op in ('$eq', '$in'):
+        values = [_sql_value(value) for value in (arg if op == '$in' else [arg])]
+        if not values:
+            return "0", []
+        if any(value is None for value in values):
+            return None
+        return f"{expr} IN ({', '.join('?' * len(values))})", values
+    if op in _RANGE_OPERATORS:
+        value = _sql_value(arg)
+        if value is None or isinstance(arg, bool):
+            return None
+        return f"{expr} {_RANGE_OPERATORS[op]} ?", [value]
+    if op == '$exists' and not arg:
+        return f"{expr} IS NULL", []
+    return None
+
+def _index_fields(keys):
+    if isinstance(keys, str):
+        return [keys]
+    return [key if isinstance(key, str) else key[0] for key in keys]
+
+class SQLiteCollection(DocumentCollection):
+    def __init__(self, database, name):
+        super().__init__(name)
+        self._database = database
+        self._table = '"' + name.replace('"', '""') + '"'
+        with database.lock:
+            database.connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {self._table} (id TEXT PRIMARY KEY, doc TEXT NOT NULL)"
+            )
+            # Campos que contienen listas: la igualdad se evalúa en Python
+            rows = database.connection.execute(
+                f"SELECT DISTINCT j.key FROM {self._table}, json_each({self._table}.doc) AS j "
+                f"WHERE j.type = 'array'"
+            ).fetchall()
+        self._array_fields = {row[0] for row in rows}
+
+    def _execute(self, sql, params=()):
+        try:
+            return self._database.connection.execute(sql, params)
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKeyError(f"{self.name}: {e}")
+
+    def create_index(self, keys, unique=False, **kwargs):
+        fields = _index_fields(keys)
+        if not all(_SIMPLE_FIELD.match(field) for field in fields):
+            return None
+        name = f"{'uniq' if unique else 'idx'}_{self.name}_{'_'.join(fields)}"
+        columns = ', '.join(_sql_field(field) for field in fields)
+        with self._database.lock:
+            self._execute(
+                f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS \"{name}\" ON {self._table} ({columns})"
+            )
+        return name
+
+    def _where(self, query):
+        """Parte del filtro que SQLite resuelve (siempre un superconjunto del resultado)"""
+        clauses, params = [], []
+        for key, condition in query.items():
+            if key == '$or':
+                branches = [self._where(branch) for branch in condition]
+                if branches and all(sql for sql, _ in branches):
+                    clauses.append('(' + ' OR '.join(f"({sql})" for sql, _ in branches) + ')')
+                    for _, branch_params in branches:
+                        params.extend(branch_params)
+            elif key == '_id':
+                if isinstance(condition, dict):
+                    if set(condition) != {'$in'}:
+                        continue
+                    values = list(condition['$in'])
+                else:
+                    values = [condition]
+                if not values:
+                    clauses.append("0")
+                    continue
+                clauses.append(f"id IN ({', '.join('?' * len(values))})")
+                params.extend(_id_key(value) for value in values)
+            elif _SIMPLE_FIELD.match(key) and key not in self._array_fields:
+                operators = condition if _is_operator_dict(condition) else {'$eq': condition}
+                for op, arg in operators.items():
+                    clause = _field_clause(key, op, arg)
+                    if clause:
+                        clauses.append(clause[0])
+                        params.extend(clause[1])
+        return ' AND '.join(clauses), params
+
+    def _select(self, query):
+        where, params = self._where(query)
+        return f"SELECT doc FROM {self._table}" + (f" WHERE {where}" if where else ''), params
+
+    def explain(self, query):
+        """Plan de SQLite para el filtro: lista de pasos de EXPLAIN QUERY PLAN"""
+        sql, params = self._select(_normalize(query or {}))
+        with self._database.lock:
+            rows = self._execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        return [row[-1] for row in rows]
+
+    def _candidates(self, query):
+        sql, params = self._select(query)
+        with self._database.lock:
+            rows = self._execute(sql, params).fetchall()
+        return [_decode(row[0]) for row in rows]
+
+    def _track_arrays(self, doc):
+        for key, value in doc.items():
+            if isinstance(value, list):
+                self._array_fields.add(key)
+
+    def _insert(self, doc):
+        self._track_arrays(doc)
+        self._execute(f"INSERT INTO {self._table} (id, doc) VALUES (?, ?)", (_id_key(doc['_id']), _encode(doc)))
+
+    def _write(self, doc):
+        self._track_arrays(doc)
+        self._execute(f"UPDATE {self._table} SET doc = ? WHERE id = ?", (_encode(doc), _id_key(doc['_id'])))
+
+    def _remove(self, ids):
+        if ids:
+            self._execute(
+                f"DELETE FROM {self._table} WHERE id IN ({', '.join('?' * len(ids))})",
+                [_id_key(_id) for _id in ids]
+            )
+
+    def _transaction(self):
+        return self._database.transaction()
+
+class SQLiteDatabase:
+    """Base de datos de documentos en un fichero SQLite (o ':memory:')"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("PRAGMA busy_timeout=5000")
+        self._collections = {}
+        self._depth = 0
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Una transacción por operación de escritura; las anidadas se unen a la exterior"""
+        with self.lock:
+            if self._depth == 0:
+                self.connection.execute("BEGIN IMMEDIATE")
+            self._depth += 1
+            try:
+                yield
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.connection.execute("ROLLBACK")
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                self.connection.execute("COMMIT")
+
+    def __getitem__(self, name):
+        collection = self._collections.get(name)
+        if collection is None:
+            with self.lock:
+                collection = self._collections.get(name)
+                if collection is None:
+                    collection = self._collections[name] = SQLiteCollection(self, name)
+        return collection
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+    def command(self, name, *args, **kwargs):
+        with self.lock:
+            self.connection.execute("SELECT 1").fetchone()
+        return {'ok': 1.0}
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,41 @@
+"""
+Configuración común de las pruebas
+
+Las pruebas usan los mismos dobles que los benchmarks (benchmarks/fakes.py):
+un Bot de Telegram falso y la base de datos de los modelos sustituida por
+una en memoria o por SQLite, sin conectar nunca a MongoDB.
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import fakes  # noqa: E402  (debe importarse antes que database)
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def db(request, monkeypatch):
+    """Base de datos de los modelos: en memoria y SQLite (con los índices reales)"""
+    import database
+    import dispatch_coordinator
+    import scheduler
+
+    if request.param == 'memory':
+        store = fakes.use_in_memory_database()
+    else:
+        store = fakes.use_sqlite_database(':memory:')
+    monkeypatch.setattr(database, 'db', store)
+    monkeypatch.setattr(database.read_cache, 'enabled', False)
+    # Una notificación por post; las pruebas del resumen por ventana lo activan
+    monkeypatch.setattr(scheduler, 'ADMIN_DIGEST_ENABLED', False)
+    monkeypatch.setattr(dispatch_coordinator, 'ADMIN_DIGEST_ENABLED', False)
+    database.migrate_posts_schema()
+    return store
+
+@pytest.fixture
+def bot():
+    return fakes.FakeBot(latency=0, seed=1)
@@ -0,0 +1,102 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+import pytz
+
+import admin_digest
+import database
+import dispatch_coordinator
+import fakes
+import scheduler
+from admin_digest import DigestManager, DispatchDigest, digest_key
+
+class DigestBot(fakes.FakeBot):
+    """Bot falso que guarda el último texto de cada mensaje al administrador"""
+
+    def __init__(self):
+        super().__init__(latency=0, seed=1)
+        self.texts = {}
+
+    async def send_message(self, chat_id, text=None, **kwargs):
+        message = await super().send_message(chat_id, text, **kwargs)
+        self.texts[message.message_id] = text
+        return message
+
+    async def edit_message_text(self, text=None, chat_id=None, message_id=None, **kwargs):
+        self.texts[message_id] = text
+        return await super().edit_message_text(text, chat_id, message_id, **kwargs)
+
+@pytest.fixture
+def digests(db, monkeypatch):
+    """Modo resumen activo con un DigestManager nuevo; devuelve las notificaciones por post"""
+    monkeypatch.setattr(scheduler, 'ADMIN_DIGEST_ENABLED', True)
+    monkeypatch.setattr(dispatch_coordinator, 'ADMIN_DIGEST_ENABLED', True)
+    monkeypatch.setattr(admin_digest, 'ADMIN_DIGEST_EDIT_SECONDS', 0)
+    manager = DigestManager()
+    monkeypatch.setattr(admin_digest, 'digest_manager', manager)
+    monkeypatch.setattr(scheduler, 'digest_manager', manager)
+
+    sent = []
+
+    async def record(bot, post_id, stats):
+        sent.append(post_id)
+
+    monkeypatch.setattr(scheduler, 'send_deletion_notification', record)
+    return sent
+
+def test_window_sends_one_digest_and_edits_it_with_deletions(db, digests, monkeypatch):
+    post_ids = fakes.seed_posts(2, 3, seed=1)
+    database.migrate_posts_schema()
+    bot = DigestBot()
+    coordinator = dispatch_coordinator.DispatchCoordinator(window_seconds=0.01, concurrency=4)
+
+    async def send():
+        await asyncio.gather(*(coordinator.submit(bot, post_id) for post_id in post_ids))
+    asyncio.run(send())
+
+    # Un único mensaje al administrador para los dos posts
+    assert bot.calls.get('sendMessage') == 1
+    doc = db.notification_digests.find_one({})
+    assert doc['post_ids'] == post_ids
+    assert [entry['sent'] for entry in doc['posts']] == [3, 3]
+
+    # Tras un reinicio el resumen se recupera de la base de datos
+    manager = DigestManager()
+    monkeypatch.setattr(scheduler, 'digest_manager', manager)
+    db.scheduled_jobs.update_many(
+        {'is_completed': False},
+        {'$set': {'scheduled_time': datetime.utcnow() - timedelta(seconds=1)}}
+    )
+    asyncio.run(scheduler.process_due_deletions(bot))
+
+    assert digests == []
+    assert bot.calls.get('sendMessage') == 1
+    assert "Eliminación completada" in bot.texts[doc['message_id']]
+    assert "🗑️ 3/3" in bot.texts[doc['message_id']]
+
+def test_deletions_without_digest_notify_per_post(db, digests):
+    send_time = datetime(2026, 1, 15, 9, 0)
+    db.deletion_stats.bulk_write([scheduler.create_deletion_batch('p1', 'Post 1', send_time, 1)])
+
+    asyncio.run(scheduler.update_deletion_stats(
+        DigestBot(), 'p1', 'Post 1', send_time, datetime.utcnow(), True
+    ))
+    assert digests == ['p1']
+
+def test_digest_key_matches_stored_precision():
+    send_time = pytz.timezone('America/Havana').localize(datetime(2026, 1, 15, 9, 0, 0, 123456))
+    assert digest_key(send_time) == datetime(2026, 1, 15, 14, 0, 0, 123000)
+
+def test_render_lists_failures_and_buttons_per_post():
+    digest = DispatchDigest(None, datetime(2026, 1, 15, 14, 0), sending=False)
+    digest.add_post('p1', 'Post 1', 2)
+    digest.add_post('p2', 'Post 2', 1)
+    digest.posts['p1'].update(sent=1, failed=1, failed_channels=[{'channel_id': '-1', 'error': 'Chat not found'}])
+    digest.posts['p2'].update(sent=1)
+
+    text, markup = digest.render()
+    assert "✅ Envío completado" in text
+    assert "**Post 1**: ✅ 1/2 · ❌ 1" in text
+    assert "Canal `-1`: Chat not found" in text
+    assert len(markup.inline_keyboard) == 2
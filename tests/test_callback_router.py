@@ -0,0 +1,173 @@
+import asyncio
+
+import pytest
+
+import callback_router
+from callback_router import (
+    ACTIONS, CHAT_ID, INT, MAX_CALLBACK_DATA, OBJECT_ID, CallbackRouter, CallbackTokens,
+    decode_callback, encode_callback
+)
+from config import ADMIN_ID
+
+POST_ID = '65f1a2b3c4d5e6f708192a3b'
+
+SAMPLE_ARGS = {
+    OBJECT_ID: POST_ID,
+    INT: 6,
+    CHAT_ID: '-1001234567890',
+}
+
+class FakeQuery:
+    def __init__(self, data):
+        self.data = data
+        self.answers = []
+
+    async def answer(self, text=None, show_alert=False):
+        self.answers.append((text, show_alert))
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+
+class FakeUpdate:
+    def __init__(self, data, user_id=ADMIN_ID):
+        self.callback_query = FakeQuery(data)
+        self.effective_user = FakeUser(user_id)
+
+def test_router_resolves_only_registered_actions():
+    async def show_post(query, post_id):
+        return post_id
+
+    router = CallbackRouter()
+    router.add('post', show_post)
+    with pytest.raises(ValueError):
+        router.add('post', show_post)
+    with pytest.raises(ValueError):
+        router.add('no_declarada', show_post)
+
+    route, args = router.resolve(encode_callback('post', POST_ID))
+    assert route.handler is show_post
+    assert args == {'post_id': POST_ID}
+    assert router.resolve(encode_callback('delete_post', POST_ID)) == (None, None)
+
+@pytest.mark.parametrize('data, action, args', [
+    ('back_main', 'back_main', {}),
+    ('post_' + POST_ID, 'post', {'post_id': POST_ID}),
+    ('toggle_day_' + POST_ID + '_3', 'toggle_day', {'post_id': POST_ID, 'day_num': 3}),
+    # El prefijo más largo gana: add_post_channels_bulk no cae en add_post_channel
+    ('add_post_channels_bulk_' + POST_ID, 'add_post_channels_bulk', {'post_id': POST_ID}),
+    ('add_post_channel_' + POST_ID, 'add_post_channel', {'post_id': POST_ID}),
+    # El último argumento se queda con el resto, aunque tenga "_"
+    ('toggle_channel_' + POST_ID + '_@mi_canal', 'toggle_channel',
+     {'post_id': POST_ID, 'channel_id': '@mi_canal'}),
+])
+def test_legacy_buttons_resolve_to_their_route(data, action, args):
+    router = CallbackRouter()
+    router.add(action, lambda query, **kwargs: None)
+
+    route, decoded_args = router.resolve(data)
+    assert route.action == action
+    assert decoded_args == args
+
+def test_every_declared_action_has_a_handler():
+    import handlers
+    assert set(handlers.callback_router._routes) == set(ACTIONS)
+
+def test_dispatch_passes_typed_arguments():
+    calls = []
+
+    async def toggle_day(query, post_id, day_num):
+        calls.append((post_id, day_num))
+
+    router = CallbackRouter()
+    router.add('toggle_day', toggle_day)
+    update = FakeUpdate('toggle_day_' + POST_ID + '_3')
+    asyncio.run(router.dispatch(update, None))
+
+    assert calls == [(POST_ID, 3)]
+    assert update.callback_query.answers == [(None, False)]
+
+def test_dispatch_answers_unknown_data_and_non_admins_once():
+    calls = []
+
+    async def handler(query, post_id):
+        calls.append(post_id)
+
+    router = CallbackRouter()
+    router.add('post', handler)
+
+    malformed = FakeUpdate('toggle_day_' + POST_ID + '_lunes')
+    asyncio.run(router.dispatch(malformed, None))
+    assert len(malformed.callback_query.answers) == 1
+
+    stranger = FakeUpdate(encode_callback('post', POST_ID), user_id=ADMIN_ID + 1)
+    asyncio.run(router.dispatch(stranger, None))
+    assert stranger.callback_query.answers == [("❌ No tienes permisos de administrador.", True)]
+    assert calls == []
+
+@pytest.mark.parametrize('action', sorted(ACTIONS))
+def test_round_trip_every_action(action):
+    spec = ACTIONS[action]
+    args = [SAMPLE_ARGS[kind] for _, kind in spec.params]
+
+    data = encode_callback(action, *args)
+
+    assert len(data.encode()) <= MAX_CALLBACK_DATA
+    assert data.startswith(callback_router.COMPACT_PREFIX)
+    assert not data.startswith(callback_router.TOKEN_PREFIX)
+    decoded, decoded_args = decode_callback(data)
+    assert decoded is spec
+    assert decoded_args == {name: value for (name, _), value in zip(spec.params, args)}
+
+def test_negative_and_large_integers_round_trip():
+    for value in (0, 63, 64, -1, -1009999999999999):
+        spec, args = decode_callback(encode_callback('unassign_channel', POST_ID, str(value)))
+        assert spec.name == 'unassign_channel'
+        assert args == {'post_id': POST_ID, 'channel_id': str(value)}
+
+def test_wrong_argument_count_is_rejected():
+    with pytest.raises(TypeError):
+        encode_callback('toggle_day', POST_ID)
+
+@pytest.mark.parametrize('data, action, args', [
+    ('remove_ch_' + POST_ID + '_2', 'remove_ch', {'post_id': POST_ID, 'channel_index': 2}),
+    ('unassign_channel_' + POST_ID + '_-1001234567890', 'unassign_channel',
+     {'post_id': POST_ID, 'channel_id': '-1001234567890'}),
+])
+def test_legacy_underscore_format(data, action, args):
+    spec, decoded_args = decode_callback(data)
+    assert spec is ACTIONS[action]
+    assert decoded_args == args
+
+@pytest.mark.parametrize('data', [
+    '',
+    'unknown_action',
+    'post_not-an-object-id',
+    'toggle_day_' + POST_ID + '_lunes',
+    '~',
+    '~?AAAA',
+    '~g' + 'A' * 5,
+    '~#token-inexistente',
+])
+def test_invalid_data_is_not_routed(data):
+    assert decode_callback(data) == (None, None)
+
+def test_token_fallback_for_arguments_that_cannot_be_packed():
+    data = encode_callback('toggle_channel', POST_ID, '@canal_sin_id_numerico')
+
+    assert data.startswith(callback_router.TOKEN_PREFIX)
+    assert len(data.encode()) <= MAX_CALLBACK_DATA
+    spec, args = decode_callback(data)
+    assert spec is ACTIONS['toggle_channel']
+    assert args == {'post_id': POST_ID, 'channel_id': '@canal_sin_id_numerico'}
+
+def test_tokens_expire_and_are_bounded():
+    tokens = CallbackTokens(ttl=-1, max_entries=2)
+    expired = tokens.issue(ACTIONS['post'], {'post_id': POST_ID})
+    assert tokens.get(expired[len(callback_router.TOKEN_PREFIX):]) is None
+
+    tokens = CallbackTokens(ttl=60, max_entries=2)
+    issued = [tokens.issue(ACTIONS['post'], {'post_id': POST_ID}) for _ in range(3)]
+    assert len(tokens) == 2
+    assert tokens.get(issued[0][len(callback_router.TOKEN_PREFIX):]) is None
+    assert tokens.get(issued[-1][len(callback_router.TOKEN_PREFIX):]) == (ACTIONS['post'], {'post_id': POST_ID})
@@ -0,0 +1,95 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+import database
+import fakes
+import scheduler
+
+POST_DEPENDENTS = ('post_channels', 'post_schedules', 'scheduled_jobs', 'sent_messages', 'deletion_stats')
+
+@pytest.fixture
+def notifications(monkeypatch):
+    sent = []
+
+    async def record(bot, post_id, stats):
+        sent.append(stats)
+
+    monkeypatch.setattr(scheduler, 'send_deletion_notification', record)
+    return sent
+
+def seed(posts, channels_per_post):
+    post_ids = fakes.seed_posts(posts, channels_per_post, seed=1)
+    # Horario y canales embebidos en el post, como tras arrancar el bot
+    database.migrate_posts_schema()
+    return post_ids
+
+def assigned(post_id):
+    return [pc.channel_id for pc in database.PostChannel.find_by_post_id(post_id)]
+
+def send(bot, post_ids):
+    async def run():
+        for post_id in post_ids:
+            await scheduler.send_post_to_channels_with_notification(bot, post_id, True)
+    asyncio.run(run())
+
+def run_due_deletions(db, bot):
+    db.scheduled_jobs.update_many(
+        {'is_completed': False},
+        {'$set': {'scheduled_time': datetime.utcnow() - timedelta(seconds=1)}}
+    )
+    asyncio.run(scheduler.process_due_deletions(bot))
+
+def test_delete_post_removes_only_its_records(db, bot):
+    post_id, other_id = seed(2, 2)
+    send(bot, [post_id, other_id])
+
+    assert database.delete_post_cascade(post_id)
+
+    for name in POST_DEPENDENTS:
+        assert db[name].count_documents({'post_id': post_id}) == 0, name
+        assert db[name].count_documents({'post_id': other_id}) > 0, name
+    assert database.Post.find_by_id(post_id) is None
+    assert database.Post.find_by_id(other_id) is not None
+    assert len(database.Channel.find_all()) == 2
+
+def test_delete_channel_keeps_pending_deletions(db, bot, notifications):
+    post_id = seed(1, 3)[0]
+    send(bot, [post_id])
+    channel_id = database.Channel.find_all()[0].channel_id
+
+    assert database.delete_channel_cascade(channel_id)
+
+    assert database.Channel.find_by_channel_id(channel_id) is None
+    assert db.post_channels.count_documents({'channel_id': channel_id}) == 0
+    assert channel_id not in assigned(post_id)
+    assert db.scheduled_jobs.count_documents({'post_id': post_id, 'is_completed': False}) == 3
+
+    # El mensaje del canal eliminado se borra a su hora y el lote se cierra
+    run_due_deletions(db, bot)
+    assert len(notifications) == 1
+    assert (notifications[0]['total_channels'], notifications[0]['deleted_count']) == (3, 3)
+
+def test_unassign_keeps_channels_used_by_other_posts(db, bot):
+    post_id, other_id = seed(2, 2)
+    channel_id = database.Channel.find_all()[0].channel_id
+
+    assert database.unassign_channel(post_id, channel_id) == (True, False)
+
+    assert database.Channel.find_by_channel_id(channel_id) is not None
+    assert channel_id not in assigned(post_id)
+    assert channel_id in assigned(other_id)
+
+def test_unassign_last_use_deletes_channel_but_not_its_pending_deletions(db, bot, notifications):
+    post_id = seed(1, 2)[0]
+    send(bot, [post_id])
+    channel_id = database.Channel.find_all()[0].channel_id
+
+    assert database.unassign_channel(post_id, channel_id) == (True, True)
+
+    assert database.Channel.find_by_channel_id(channel_id) is None
+    assert db.scheduled_jobs.count_documents({'channel_id': channel_id, 'is_completed': False}) == 1
+    run_due_deletions(db, bot)
+    assert len(notifications) == 1
+    assert notifications[0]['deleted_count'] == 2
@@ -0,0 +1,99 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+import pytz
+
+import database
+import fakes
+import scheduler
+from config import TIMEZONE
+from database import Post, PostSchedule
+
+class RecordingCoordinator:
+    def __init__(self):
+        self.submitted = []
+
+    async def submit(self, bot, post_id):
+        self.submitted.append(post_id)
+
+@pytest.fixture
+def catchup(db, monkeypatch):
+    """Coordinador y avisos de envío tardío sustituidos por registros"""
+    coordinator = RecordingCoordinator()
+    notices = []
+
+    async def record_notice(bot, post, schedule, missed, now):
+        notices.append((str(post._id), missed))
+
+    monkeypatch.setattr(scheduler, 'dispatch_coordinator', coordinator)
+    monkeypatch.setattr(scheduler, 'send_late_run_notice', record_notice)
+    return coordinator.submitted, notices
+
+def seed_missed_post(policy, minutes_ago=30, window_minutes=60, fired_hours_ago=50):
+    """Post cuya hora programada pasó hace minutes_ago, con el bot detenido desde entonces"""
+    post_id = fakes.seed_posts(1, 2, seed=1)[0]
+    database.migrate_posts_schema()
+
+    due = datetime.now(pytz.timezone(TIMEZONE)) - timedelta(minutes=minutes_ago)
+    schedule = PostSchedule.find_by_post_id(post_id)
+    schedule.send_time = due.strftime('%H:%M')
+    schedule.catchup_policy = policy
+    schedule.catchup_window_minutes = window_minutes
+    schedule.save()
+    if fired_hours_ago is not None:
+        Post.mark_fired(post_id, datetime.utcnow() - timedelta(hours=fired_hours_ago))
+    return post_id
+
+def reconcile(bot):
+    asyncio.run(scheduler.reconcile_missed_posts(bot))
+
+def test_skip_policy_sends_nothing(bot, catchup):
+    submitted, notices = catchup
+    seed_missed_post('skip')
+    reconcile(bot)
+    assert submitted == [] and notices == []
+
+def test_late_policy_sends_last_missed_run_inside_window(bot, catchup):
+    submitted, notices = catchup
+    post_id = seed_missed_post('late')
+    reconcile(bot)
+
+    assert submitted == [post_id]
+    assert len(notices) == 1 and len(notices[0][1]) == 1
+    # El envío recuperado cuenta como disparado: no se repite en el siguiente arranque
+    reconcile(bot)
+    assert submitted == [post_id]
+
+def test_late_policy_drops_runs_outside_window(bot, catchup):
+    submitted, notices = catchup
+    seed_missed_post('late', minutes_ago=30, window_minutes=10)
+    reconcile(bot)
+    assert submitted == [] and notices == []
+
+def test_coalesce_policy_sends_once_for_all_missed_runs(bot, catchup):
+    submitted, notices = catchup
+    post_id = seed_missed_post('coalesce')
+    reconcile(bot)
+
+    assert submitted == [post_id]
+    # Hace 30 minutos, 1 día y 2 días (dentro de las 50 horas detenido)
+    assert len(notices[0][1]) == 3
+
+def test_first_start_only_records_fired_time(bot, catchup):
+    submitted, notices = catchup
+    post_id = seed_missed_post('coalesce', fired_hours_ago=None)
+    reconcile(bot)
+
+    assert submitted == [] and notices == []
+    assert Post.find_by_id(post_id).last_fired_at is not None
+
+def test_scheduled_times_between_respects_days_and_bounds():
+    cuba_tz = pytz.timezone(TIMEZONE)
+    schedule = PostSchedule('p1', send_time='09:00', days_of_week='1,3')
+    # Lunes 12 de enero de 2026 a las 09:00 (excluido) hasta el lunes siguiente a las 09:00
+    start = cuba_tz.localize(datetime(2026, 1, 12, 9, 0))
+    end = cuba_tz.localize(datetime(2026, 1, 19, 9, 0))
+
+    times = scheduler.scheduled_times_between(schedule, start, end)
+    assert [t.strftime('%a %d %H:%M') for t in times] == ['Wed 14 09:00', 'Mon 19 09:00']
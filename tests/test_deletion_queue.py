@@ -0,0 +1,58 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+import database
+import fakes
+import scheduler
+
+@pytest.fixture
+def notifications(monkeypatch):
+    """Notificaciones finales de eliminación automática enviadas"""
+    sent = []
+
+    async def record(bot, post_id, stats):
+        sent.append(stats)
+
+    monkeypatch.setattr(scheduler, 'send_deletion_notification', record)
+    return sent
+
+def test_delete_now_cancels_jobs_and_closes_the_batch(db, bot, notifications):
+    post_id = fakes.seed_posts(1, 3, seed=1)[0]
+    database.migrate_posts_schema()
+
+    async def run():
+        await scheduler.send_post_to_channels_with_notification(bot, post_id, True)
+        await scheduler.delete_all_post_messages_now(bot, post_id)
+        # Los trabajos cancelados ya no se procesan aunque venzan
+        db.scheduled_jobs.update_many({}, {'$set': {'scheduled_time': datetime.utcnow() - timedelta(seconds=1)}})
+        await scheduler.process_due_deletions(bot)
+    asyncio.run(run())
+
+    assert db.scheduled_jobs.count_documents({'post_id': post_id, 'is_completed': False}) == 0
+    assert db.scheduled_jobs.count_documents({'post_id': post_id, 'cancelled': True}) == 3
+    batch = db.deletion_stats.find_one({'post_id': post_id})
+    assert batch['notified'] is True
+    assert batch['cancelled'] is True
+    assert notifications == []
+    assert db.sent_messages.count_documents({'post_id': post_id, 'deleted': True}) == 3
+
+    # La retención del historial lo da por finalizado
+    database.mark_expiring()
+    assert db.deletion_stats.find_one({'post_id': post_id}).get('expire_at') is not None
+
+def test_cancel_pending_leaves_other_posts_open(db, bot):
+    post_id, other_id = fakes.seed_posts(2, 2, seed=1)
+    database.migrate_posts_schema()
+
+    async def run():
+        for pid in (post_id, other_id):
+            await scheduler.send_post_to_channels_with_notification(bot, pid, True)
+    asyncio.run(run())
+
+    assert database.ScheduledJob.cancel_pending(post_id, 'delete')
+
+    assert db.scheduled_jobs.count_documents({'post_id': other_id, 'is_completed': False}) == 2
+    assert db.deletion_stats.find_one({'post_id': other_id})['notified'] is False
+    assert database.ScheduledJob.count_pending('delete') == 2
@@ -0,0 +1,81 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+import fakes
+import scheduler
+
+def make_due(db):
+    db.scheduled_jobs.update_many(
+        {'is_completed': False},
+        {'$set': {'scheduled_time': datetime.utcnow() - timedelta(seconds=1)}}
+    )
+
+@pytest.fixture
+def notifications(monkeypatch):
+    """Notificaciones finales de eliminación enviadas (post_id, lote)"""
+    sent = []
+
+    async def record(bot, post_id, stats):
+        sent.append((post_id, stats))
+
+    monkeypatch.setattr(scheduler, 'send_deletion_notification', record)
+    return sent
+
+def test_batch_finalizes_once_after_all_deletions(db, bot, notifications):
+    post_id = fakes.seed_posts(1, 3, seed=1)[0]
+
+    async def run():
+        await scheduler.send_post_to_channels_with_notification(bot, post_id, True)
+        make_due(db)
+        await scheduler.process_due_deletions(bot)
+        await scheduler.process_due_deletions(bot)
+    asyncio.run(run())
+
+    assert len(notifications) == 1
+    stats = notifications[0][1]
+    assert (stats['total_channels'], stats['deleted_count'], stats['failed_count']) == (3, 3, 0)
+    assert db.sent_messages.count_documents({'post_id': post_id, 'deleted': True}) == 3
+    assert db.scheduled_jobs.count_documents({'is_completed': False}) == 0
+
+def test_concurrent_updates_notify_exactly_once(db, bot, notifications):
+    send_time = datetime(2026, 1, 15, 9, 0)
+    db.deletion_stats.bulk_write([scheduler.create_deletion_batch('p1', 'Post 1', send_time, 4)])
+    delete_time = datetime.utcnow()
+
+    async def run():
+        await asyncio.gather(
+            scheduler.update_deletion_stats(bot, 'p1', 'Post 1', send_time, delete_time, True),
+            scheduler.update_deletion_stats(bot, 'p1', 'Post 1', send_time, delete_time, True),
+            scheduler.update_deletion_stats(bot, 'p1', 'Post 1', send_time, delete_time, False, 'Chat not found'),
+            scheduler.update_deletion_stats(bot, 'p1', 'Post 1', send_time, delete_time, True),
+        )
+        # Una actualización repetida tras finalizar no vuelve a notificar
+        await scheduler.update_deletion_stats(bot, 'p1', 'Post 1', send_time, delete_time, True)
+    asyncio.run(run())
+
+    assert len(notifications) == 1
+    stats = notifications[0][1]
+    assert (stats['deleted_count'], stats['failed_count']) == (3, 1)
+    assert stats['failed_reasons'] == ['Chat not found']
+    assert stats['notified'] is True
+
+def test_batch_created_on_demand_from_sent_messages(db, bot, notifications):
+    send_time = datetime(2026, 1, 15, 9, 0)
+    db.sent_messages.insert_many([
+        {'post_id': 'p1', 'send_time': send_time, 'channel_id': channel_id, 'message_id': 1, 'deleted': False}
+        for channel_id in ('-1', '-2')
+    ])
+
+    async def run():
+        for channel_id in ('-1', '-2'):
+            await scheduler.update_deletion_stats(
+                bot, 'p1', 'Post 1', send_time, datetime.utcnow(), True,
+                channel_id=channel_id, message_id=1
+            )
+    asyncio.run(run())
+
+    assert len(notifications) == 1
+    assert notifications[0][1]['total_channels'] == 2
+    assert db.sent_messages.count_documents({'post_id': 'p1', 'deleted': True}) == 2
@@ -0,0 +1,70 @@
+import asyncio
+
+import database
+import fakes
+from database import Post
+from dispatch_coordinator import DispatchCoordinator
+
+class RecordingBot(fakes.FakeBot):
+    """Bot falso que anota qué post (canal de origen) llega a cada canal"""
+
+    def __init__(self):
+        super().__init__(latency=0.005, jitter=0.5, seed=1)
+        self.forwards = []
+
+    async def forward_message(self, chat_id, from_chat_id, message_id, **kwargs):
+        self.forwards.append((chat_id, from_chat_id))
+        return await super().forward_message(chat_id, from_chat_id, message_id, **kwargs)
+
+def seed(posts, channels):
+    post_ids = fakes.seed_posts(posts, channels, shared_channels=True, seed=1)
+    database.migrate_posts_schema()
+    return post_ids
+
+def test_concurrent_submits_share_one_window(db):
+    post_ids = seed(3, 4)
+    bot = RecordingBot()
+    coordinator = DispatchCoordinator(window_seconds=0.05, concurrency=4)
+
+    async def run():
+        await asyncio.gather(*(coordinator.submit(bot, post_id) for post_id in post_ids + post_ids[:1]))
+    asyncio.run(run())
+
+    stats = coordinator.get_stats()
+    # El post repetido se envía una sola vez
+    assert (stats['windows'], stats['last_window_size'], stats['open_window']) == (1, 3, 0)
+    assert len(bot.forwards) == 12
+    assert db.sent_messages.count_documents({}) == 12
+    assert not coordinator._tasks
+
+def test_channel_order_follows_submit_order(db):
+    post_ids = seed(3, 4)
+    bot = RecordingBot()
+    coordinator = DispatchCoordinator(window_seconds=0.05, concurrency=8)
+
+    async def run():
+        tasks = []
+        for post_id in post_ids:
+            tasks.append(asyncio.create_task(coordinator.submit(bot, post_id)))
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+    asyncio.run(run())
+
+    sources = [Post.find_by_id(post_id).source_channel for post_id in post_ids]
+    for channel_id in {chat_id for chat_id, _ in bot.forwards}:
+        received = [source for chat_id, source in bot.forwards if chat_id == channel_id]
+        assert received == sources
+
+def test_submit_after_close_opens_a_new_window(db):
+    post_ids = seed(2, 2)
+    bot = RecordingBot()
+    coordinator = DispatchCoordinator(window_seconds=0.02, concurrency=4)
+
+    async def run():
+        await coordinator.submit(bot, post_ids[0])
+        await coordinator.submit(bot, post_ids[1])
+    asyncio.run(run())
+
+    stats = coordinator.get_stats()
+    assert (stats['windows'], stats['last_window_size'], stats['max_window_size']) == (2, 1, 1)
+    assert not coordinator._tasks
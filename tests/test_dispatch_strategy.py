@@ -0,0 +1,71 @@
+import asyncio
+
+from telegram.error import BadRequest, TimedOut
+
+import database
+import fakes
+import scheduler
+from database import Post
+
+class ScriptedBot(fakes.FakeBot):
+    """Bot falso cuyo reenvío falla con el error indicado y que mide la concurrencia"""
+
+    def __init__(self, forward_error=None, latency=0.01):
+        super().__init__(latency=latency, jitter=0, seed=1)
+        self.forward_error = forward_error
+        self.attempts = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def _request(self, endpoint, chat_id, fail_always=False):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            self.attempts.append((endpoint, chat_id))
+            if endpoint == 'forwardMessage' and self.forward_error:
+                await asyncio.sleep(self.latency)
+                raise self.forward_error
+            return await super()._request(endpoint, chat_id, fail_always)
+        finally:
+            self.in_flight -= 1
+
+def channel_endpoints(bot, channel_id):
+    return [endpoint for endpoint, chat_id in bot.attempts if chat_id == channel_id]
+
+def seed_post(channels):
+    post_id = fakes.seed_posts(1, channels, seed=1)[0]
+    database.migrate_posts_schema()
+    return post_id
+
+def test_source_error_learns_and_persists_copy(db):
+    post_id = seed_post(4)
+    bot = ScriptedBot(BadRequest("Message can't be forwarded"))
+
+    asyncio.run(scheduler.send_post_to_channels_with_notification(bot, post_id))
+
+    channels = Post.find_config(post_id)[2]
+    # El primer canal aprende; el resto copia directamente
+    assert channel_endpoints(bot, channels[0]) == ['forwardMessage', 'copyMessage']
+    for channel_id in channels[1:]:
+        assert channel_endpoints(bot, channel_id) == ['copyMessage']
+    assert Post.find_by_id(post_id).learned_strategy() == 'copy'
+    assert db.sent_messages.count_documents({'post_id': post_id}) == 4
+
+def test_transient_error_sends_remaining_channels_concurrently(db):
+    post_id = seed_post(4)
+    bot = ScriptedBot(TimedOut())
+
+    asyncio.run(scheduler.send_post_to_channels_with_notification(bot, post_id))
+
+    channels = Post.find_config(post_id)[2]
+    # Sin estrategia aprendida cada canal recorre reenviar, copiar y enviar
+    for channel_id in channels:
+        assert channel_endpoints(bot, channel_id) == ['forwardMessage', 'copyMessage']
+    assert bot.max_in_flight >= 2
+    assert Post.find_by_id(post_id).learned_strategy() is None
+    assert db.sent_messages.count_documents({'post_id': post_id}) == 4
+
+def test_is_source_error():
+    assert scheduler.is_source_error(BadRequest("Message to forward not found"))
+    assert not scheduler.is_source_error(BadRequest("Chat not found"))
+    assert not scheduler.is_source_error(TimedOut())
@@ -0,0 +1,56 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytz
+
+import database
+import fakes
+import scheduler
+
+def test_deletion_is_due_from_send_time(db):
+    send_time = datetime(2026, 1, 15, 9, 0)
+    scheduler.enqueue_message_deletions(
+        'p1', [{'channel_id': '-1', 'message_id': 7}], send_time, delete_after_hours=24
+    )
+
+    job = db.scheduled_jobs.find_one({'post_id': 'p1'})
+    assert job['scheduled_time'] == send_time + timedelta(hours=24)
+    assert job['is_completed'] is False
+
+def test_deletion_due_time_is_stored_in_utc(db):
+    send_time = pytz.timezone('America/Havana').localize(datetime(2026, 1, 15, 9, 0))
+    scheduler.enqueue_message_deletions(
+        'p1', [{'channel_id': '-1', 'message_id': 7}], send_time, delete_after_hours=2
+    )
+
+    job = db.scheduled_jobs.find_one({'post_id': 'p1'})
+    assert job['scheduled_time'] == datetime(2026, 1, 15, 16, 0)
+
+def test_saving_the_same_send_twice_replaces_the_records(db):
+    # Microsegundos: el filtro del upsert debe encontrar lo que ya se guardó
+    send_time = datetime(2026, 1, 15, 9, 0, 0, 123456)
+    messages = [{'channel_id': channel_id, 'message_id': 1} for channel_id in ('-1', '-2')]
+    scheduler.save_sent_messages_info('p1', messages, send_time)
+
+    messages[0]['message_id'] = 2
+    scheduler.save_sent_messages_info('p1', messages, send_time)
+
+    assert db.sent_messages.count_documents({'post_id': 'p1'}) == 2
+    assert db.sent_messages.find_one({'channel_id': '-1'})['message_id'] == 2
+
+def test_deletion_queue_skips_the_write_behind_buffer(db, bot, monkeypatch):
+    monkeypatch.setattr(scheduler, 'WRITE_BEHIND_ENABLED', True)
+    post_id = fakes.seed_posts(1, 3, seed=1)[0]
+    database.migrate_posts_schema()
+
+    try:
+        asyncio.run(scheduler.send_post_to_channels_with_notification(bot, post_id, True))
+
+        # La cola y el lote ya están escritos; sent_messages espera al buffer
+        assert db.scheduled_jobs.count_documents({'post_id': post_id, 'is_completed': False}) == 3
+        assert db.deletion_stats.count_documents({'post_id': post_id}) == 1
+        assert db.sent_messages.count_documents({'post_id': post_id}) == 0
+        scheduler.flush_write_behind()
+        assert db.sent_messages.count_documents({'post_id': post_id}) == 3
+    finally:
+        database.write_behind.flush()
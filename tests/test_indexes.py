@@ -0,0 +1,23 @@
+import database
+
+def test_unique_index_never_deletes_duplicates(tmp_path):
+    storage = database.SQLite(str(tmp_path / 'bot.db'))
+    storage.connect()
+    for value in (1, 2):
+        storage.db.deletion_stats.insert_one({'post_id': 'p1', 'send_time': 'a', 'value': value})
+
+    assert storage.ensure_ready()
+
+    assert storage.failed_indexes == ['deletion_stats(post_id, send_time)']
+    assert storage.db.deletion_stats.count_documents({}) == 2
+    storage.close()
+
+def test_all_indexes_are_created_on_a_clean_database(tmp_path):
+    storage = database.SQLite(str(tmp_path / 'bot.db'))
+    storage.connect()
+
+    # Repetirlo (cada arranque) no falla ni crea índices duplicados
+    assert storage.ensure_ready()
+    assert storage.ensure_ready()
+    assert storage.failed_indexes == []
+    storage.close()
@@ -0,0 +1,118 @@
+import asyncio
+import time
+
+import pytest
+from telegram.error import RetryAfter
+
+from rate_limiter import SlidingWindowLimiter, TelegramRateLimiter
+
+def run_with_limiter(coroutine_factory, **options):
+    async def run():
+        limiter = TelegramRateLimiter(**options)
+        await limiter.initialize()
+        try:
+            return await coroutine_factory(limiter), limiter.get_stats()
+        finally:
+            await limiter.shutdown()
+    return asyncio.run(run())
+
+def test_sliding_window_limits_calls_per_period():
+    async def run():
+        limiter = SlidingWindowLimiter(max_rate=2, time_period=0.2)
+        started = time.monotonic()
+        for _ in range(3):
+            await limiter.acquire()
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) >= 0.19
+
+def test_group_limit_applies_per_chat():
+    async def request():
+        return 'ok'
+
+    async def calls(limiter):
+        started = time.monotonic()
+        await asyncio.gather(*(
+            limiter.process_request(request, (), {}, 'sendMessage', {'chat_id': chat_id}, None)
+            for chat_id in ('-1001', '-1002', '-1003')
+        ))
+        different_chats = time.monotonic() - started
+
+        started = time.monotonic()
+        await asyncio.gather(*(
+            limiter.process_request(request, (), {}, 'sendMessage', {'chat_id': '-1001'}, None)
+            for _ in range(2)
+        ))
+        return different_chats, time.monotonic() - started
+
+    (different_chats, same_chat), stats = run_with_limiter(
+        calls, overall_max_rate=100, group_max_rate=1, group_time_period=0.2
+    )
+    assert different_chats < 0.1
+    # -1001 ya tuvo su llamada en esta ventana: las dos siguientes esperan
+    assert same_chat >= 0.19
+    assert stats['requests'] == 5
+
+def test_retry_after_pauses_and_retries():
+    attempts = []
+
+    async def request():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise RetryAfter(0)
+        return 'ok'
+
+    async def call(limiter):
+        return await limiter.process_request(request, (), {}, 'sendMessage', {'chat_id': '-1001'}, None)
+
+    result, stats = run_with_limiter(call, max_retries=2)
+    assert result == 'ok'
+    assert len(attempts) == 2
+    assert attempts[1] - attempts[0] >= 0.1
+    assert stats['retries'] == 1
+    assert stats['paused'] is False
+
+def test_retry_after_is_raised_after_max_retries():
+    attempts = []
+
+    async def request():
+        attempts.append(1)
+        raise RetryAfter(0)
+
+    async def call(limiter):
+        return await limiter.process_request(request, (), {}, 'sendMessage', {'chat_id': 1}, None)
+
+    with pytest.raises(RetryAfter):
+        run_with_limiter(call, max_retries=1)
+    assert len(attempts) == 2
+
+def test_retry_after_pauses_other_requests():
+    calls = {}
+
+    async def throttled():
+        calls.setdefault('throttled', []).append(time.monotonic())
+        if len(calls['throttled']) == 1:
+            raise RetryAfter(0)
+        return 'ok'
+
+    async def other():
+        calls['other'] = time.monotonic()
+        return 'ok'
+
+    async def run(limiter):
+        first = asyncio.create_task(
+            limiter.process_request(throttled, (), {}, 'sendMessage', {'chat_id': 1}, None)
+        )
+        await asyncio.sleep(0.02)
+        # Llega durante la pausa del 429 (otro chat): espera a que termine
+        second = asyncio.create_task(
+            limiter.process_request(other, (), {}, 'sendMessage', {'chat_id': 2}, None)
+        )
+        await asyncio.sleep(0.02)
+        paused = limiter.get_stats()['paused']
+        await asyncio.gather(first, second)
+        return paused
+
+    paused, _ = run_with_limiter(run, max_retries=1)
+    assert paused is True
+    assert calls['other'] - calls['throttled'][0] >= 0.1
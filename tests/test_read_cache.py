@@ -0,0 +1,59 @@
+import pytest
+
+import database
+import fakes
+from database import Post, ReadCache
+
+@pytest.fixture
+def cache(db, monkeypatch):
+    """Caché activa que comprueba la versión en cada lectura"""
+    read_cache = ReadCache(ttl=60, check_interval=0, enabled=True)
+    monkeypatch.setattr(database, 'read_cache', read_cache)
+    return read_cache
+
+def seed_post():
+    post_id = fakes.seed_posts(1, 1, seed=1)[0]
+    database.migrate_posts_schema()
+    return post_id
+
+def rename_behind_cache(db, post_id, name):
+    """Escritura directa de otra réplica (sin pasar por los modelos)"""
+    db.posts.update_one({'_id': database._post_object_id(post_id)}, {'$set': {'name': name}})
+
+def test_reads_are_served_from_cache_until_a_write(db, cache):
+    post_id = seed_post()
+    assert Post.find_by_id(post_id).name == 'Post 1'
+
+    rename_behind_cache(db, post_id, 'Renombrado')
+    assert Post.find_by_id(post_id).name == 'Post 1'
+
+    # Una escritura de los modelos vacía la caché
+    post = Post.find_by_id(post_id)
+    post.set_dispatch_strategy('copy')
+    assert Post.find_by_id(post_id).name == 'Renombrado'
+
+def test_cached_values_are_copies(db, cache):
+    post_id = seed_post()
+    Post.find_by_id(post_id).name = 'Modificado en memoria'
+    assert Post.find_by_id(post_id).name == 'Post 1'
+
+def test_write_from_another_replica_clears_the_cache(db, cache):
+    post_id = seed_post()
+    assert Post.find_by_id(post_id).name == 'Post 1'
+
+    rename_behind_cache(db, post_id, 'Renombrado')
+    # Otra réplica incrementa la versión al escribir
+    ReadCache(enabled=True).invalidate()
+    assert Post.find_by_id(post_id).name == 'Renombrado'
+
+def test_entries_expire_after_ttl(db, cache):
+    cache.ttl = 0
+    post_id = seed_post()
+    assert Post.find_by_id(post_id).name == 'Post 1'
+
+    rename_behind_cache(db, post_id, 'Renombrado')
+    assert Post.find_by_id(post_id).name == 'Renombrado'
+
+def test_empty_results_are_not_cached(db, cache):
+    assert Post.find_by_id('0123456789abcdef01234567') is None
+    assert cache.get_stats()['entries'] == 0
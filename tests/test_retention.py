@@ -0,0 +1,68 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import database
+import fakes
+import scheduler
+
+def test_messages_without_scheduled_deletion_expire_after_retention(db, bot):
+    post_id = fakes.seed_posts(1, 2, delete_after_hours=0, seed=1)[0]
+    database.migrate_posts_schema()
+    asyncio.run(scheduler.send_post_to_channels_with_notification(bot, post_id, True))
+    assert db.scheduled_jobs.count_documents({}) == 0
+
+    # Recientes: aún no están finalizados
+    assert database.rollup_sent_messages() == 0
+
+    db.sent_messages.update_many(
+        {}, {'$set': {'sent_at': datetime.utcnow() - timedelta(days=database.RETENTION_DAYS + 1)}}
+    )
+    assert database.rollup_sent_messages() == 2
+    assert database.daily_totals(database.RETENTION_DAYS + 2) == {'sent': 2, 'deleted': 0, 'delete_failed': 0}
+
+    later = datetime.utcnow() + timedelta(days=database.RETENTION_DAYS + 1)
+    assert database.purge_expired(later) == 2
+    assert db.sent_messages.count_documents({}) == 0
+
+def test_deleted_messages_roll_up_immediately(db, bot):
+    post_id = fakes.seed_posts(1, 2, seed=1)[0]
+    database.migrate_posts_schema()
+
+    async def run():
+        await scheduler.send_post_to_channels_with_notification(bot, post_id, True)
+        await scheduler.delete_all_post_messages_now(bot, post_id)
+    asyncio.run(run())
+
+    assert database.rollup_sent_messages() == 2
+    assert database.daily_totals(1) == {'sent': 2, 'deleted': 2, 'delete_failed': 0}
+    assert database.rollup_sent_messages() == 0
+
+def test_notifications_without_scheduled_deletion_expire_by_age(db, bot):
+    post_id = fakes.seed_posts(1, 2, delete_after_hours=0, seed=1)[0]
+    database.migrate_posts_schema()
+    asyncio.run(scheduler.send_post_to_channels_with_notification(bot, post_id, True))
+    assert db.notification_messages.count_documents({'post_id': post_id}) == 1
+
+    # Nunca se marcan como eliminadas: solo caducan por antigüedad
+    database.mark_expiring()
+    assert db.notification_messages.count_documents({'expire_at': {'$exists': True}}) == 0
+
+    db.notification_messages.update_many(
+        {}, {'$set': {'send_time': datetime.utcnow() - timedelta(days=database.RETENTION_DAYS + 1)}}
+    )
+    database.mark_expiring()
+    later = datetime.utcnow() + timedelta(days=database.RETENTION_DAYS + 1)
+    assert database.purge_expired(later) == 1
+    assert db.notification_messages.count_documents({}) == 0
+
+def test_window_digests_expire_by_age(db):
+    now = datetime.utcnow()
+    old = now - timedelta(days=database.RETENTION_DAYS + 1)
+    db.notification_digests.insert_many([
+        {'send_time': old, 'message_id': 1, 'post_ids': ['p1'], 'posts': []},
+        {'send_time': now, 'message_id': 2, 'post_ids': ['p1'], 'posts': []}
+    ])
+
+    assert database.mark_expiring(now) == 1
+    assert database.purge_expired(now + timedelta(days=database.RETENTION_DAYS + 1)) == 1
+    assert [doc['message_id'] for doc in db.notification_digests.find({})] == [2]
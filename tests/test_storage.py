@@ -0,0 +1,175 @@
+from datetime import datetime, timedelta
+
+import pytest
+import pytz
+from pymongo import ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from storage import MemoryDatabase, SQLiteDatabase, match
+
+NOW = datetime(2026, 1, 15, 12, 0)
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request):
+    database = MemoryDatabase() if request.param == 'memory' else SQLiteDatabase(':memory:')
+    yield database
+    database.close()
+
+@pytest.fixture
+def messages(store):
+    collection = store.sent_messages
+    collection.create_index([('post_id', 1), ('deleted', 1)])
+    collection.create_index([('rolled_up', 1), ('deleted', 1)])
+    collection.insert_many([
+        {'post_id': 'a', 'channel_id': '-1', 'deleted': False, 'sent_at': NOW},
+        {'post_id': 'a', 'channel_id': '-2', 'deleted': True, 'sent_at': NOW - timedelta(days=2)},
+        {'post_id': 'b', 'channel_id': '-1', 'deleted': False, 'deletion_error': 'x',
+         'sent_at': NOW - timedelta(days=40)},
+        {'post_id': 'c', 'channel_id': '-3', 'deleted': True, 'rolled_up': True,
+         'sent_at': NOW - timedelta(days=1)},
+    ])
+    return collection
+
+def channels(collection, query):
+    return sorted(doc['channel_id'] + doc['post_id'] for doc in collection.find(query))
+
+@pytest.mark.parametrize('query, expected', [
+    ({'post_id': 'a'}, ['-1a', '-2a']),
+    ({'post_id': {'$in': ['b', 'c']}}, ['-1b', '-3c']),
+    ({'post_id': {'$nin': ['a']}}, ['-1b', '-3c']),
+    ({'deleted': True, 'post_id': {'$ne': 'c'}}, ['-2a']),
+    ({'deletion_error': {'$exists': True}}, ['-1b']),
+    ({'rolled_up': {'$exists': False}, '$or': [{'deleted': True}, {'deletion_error': {'$exists': True}}]},
+     ['-1b', '-2a']),
+    ({'sent_at': {'$lt': NOW - timedelta(days=30)}}, ['-1b']),
+    ({'sent_at': {'$gte': NOW - timedelta(days=2), '$lt': NOW}}, ['-2a', '-3c']),
+    ({'$and': [{'post_id': 'a'}, {'deleted': False}]}, ['-1a']),
+])
+def test_find_filters(messages, query, expected):
+    assert channels(messages, query) == expected
+    assert messages.count_documents(query) == len(expected)
+
+def test_sort_limit_and_projection(messages):
+    docs = list(messages.find({}, {'channel_id': 1}).sort('sent_at', -1).limit(2))
+    assert [doc['channel_id'] for doc in docs] == ['-1', '-3']
+    assert set(docs[0]) == {'_id', 'channel_id'}
+
+def test_update_operators(store):
+    stats = store.deletion_stats
+    stats.insert_one({'post_id': 'a', 'deleted_count': 0, 'failed_reasons': [], 'post_ids': ['a', 'b']})
+
+    stats.update_one({'post_id': 'a'}, {
+        '$inc': {'deleted_count': 2},
+        '$set': {'notified': False},
+        '$push': {'failed_reasons': {'$each': ['e1', 'e2', 'e3'], '$slice': -2}},
+        '$pull': {'post_ids': 'b'}
+    })
+
+    doc = stats.find_one({'post_id': 'a'})
+    assert doc['deleted_count'] == 2
+    assert doc['notified'] is False
+    assert doc['failed_reasons'] == ['e2', 'e3']
+    assert doc['post_ids'] == ['a']
+
+def test_upsert_with_set_on_insert(store):
+    operation = UpdateOne(
+        {'post_id': 'a', 'send_time': NOW},
+        {'$setOnInsert': {'total_channels': 3, 'deleted_count': 0}},
+        upsert=True
+    )
+    store.deletion_stats.bulk_write([operation])
+    store.deletion_stats.update_one({'post_id': 'a', 'send_time': NOW}, {'$inc': {'deleted_count': 1}})
+    store.deletion_stats.bulk_write([operation])
+
+    docs = list(store.deletion_stats.find({}))
+    assert len(docs) == 1
+    assert docs[0]['total_channels'] == 3
+    assert docs[0]['deleted_count'] == 1
+
+def test_find_one_and_update_with_expr(store):
+    finalize = {
+        'notified': False,
+        '$expr': {'$gte': [{'$add': ['$deleted_count', '$failed_count']}, '$total_channels']}
+    }
+    store.deletion_stats.insert_one(
+        {'post_id': 'a', 'total_channels': 2, 'deleted_count': 1, 'failed_count': 0, 'notified': False}
+    )
+    assert store.deletion_stats.find_one_and_update(finalize, {'$set': {'notified': True}}) is None
+
+    store.deletion_stats.update_one({'post_id': 'a'}, {'$inc': {'failed_count': 1}})
+    first = store.deletion_stats.find_one_and_update(
+        finalize, {'$set': {'notified': True}}, return_document=ReturnDocument.AFTER
+    )
+    second = store.deletion_stats.find_one_and_update(finalize, {'$set': {'notified': True}})
+    assert first['notified'] is True
+    assert second is None
+
+def test_datetimes_match_with_millisecond_precision(store):
+    # BSON guarda milisegundos: la misma fecha con microsegundos debe encontrarse
+    send_time = pytz.timezone('America/Havana').localize(datetime(2026, 1, 15, 9, 0, 0, 123456))
+    store.sent_messages.create_index([('post_id', 1), ('send_time', 1), ('channel_id', 1)], unique=True)
+    store.sent_messages.insert_one({'post_id': 'a', 'send_time': send_time, 'channel_id': '-1'})
+
+    assert store.sent_messages.find_one({'send_time': send_time})['send_time'] == datetime(2026, 1, 15, 14, 0, 0, 123000)
+    assert store.sent_messages.count_documents({'post_id': 'a', 'send_time': send_time}) == 1
+    assert store.sent_messages.count_documents({'send_time': {'$gte': send_time}}) == 1
+
+def test_upserts_keyed_on_datetime_update_their_own_row(store):
+    send_time = datetime(2026, 1, 15, 9, 0, 0, 123456)
+    store.sent_messages.create_index([('post_id', 1), ('send_time', 1), ('channel_id', 1)], unique=True)
+    store.deletion_stats.create_index([('post_id', 1), ('send_time', 1)], unique=True)
+    key = {'post_id': 'a', 'send_time': send_time, 'channel_id': '-1'}
+
+    for message_id in (1, 2):
+        store.sent_messages.bulk_write(
+            [ReplaceOne(key, {**key, 'message_id': message_id}, upsert=True)], ordered=False
+        )
+        store.deletion_stats.bulk_write([UpdateOne(
+            {'post_id': 'a', 'send_time': send_time},
+            {'$setOnInsert': {'total_channels': 1}},
+            upsert=True
+        )])
+
+    assert [doc['message_id'] for doc in store.sent_messages.find({})] == [2]
+    assert store.deletion_stats.count_documents({}) == 1
+
+def test_sqlite_unique_index_and_transaction_rollback():
+    store = SQLiteDatabase(':memory:')
+    store.channels.create_index([('channel_id', 1)], unique=True)
+    store.channels.insert_one({'channel_id': '-1'})
+
+    with pytest.raises(DuplicateKeyError):
+        with store.transaction():
+            store.channels.insert_one({'channel_id': '-2'})
+            store.channels.insert_one({'channel_id': '-1'})
+
+    assert store.channels.count_documents({}) == 1
+    store.close()
+
+def test_sqlite_explain_uses_indexes():
+    store = SQLiteDatabase(':memory:')
+    collection = store.sent_messages
+    collection.create_index([('post_id', 1), ('deleted', 1)])
+    collection.create_index([('rolled_up', 1), ('deleted', 1)])
+    collection.create_index([('expire_at', 1)])
+    collection.insert_one({'post_id': 'a', 'deleted': False})
+
+    for query in (
+        {'post_id': 'a', 'deleted': False},
+        {'post_id': {'$in': ['a', 'b']}},
+        {'rolled_up': {'$exists': False}, '$or': [{'deleted': True}, {'deletion_error': {'$exists': True}}]},
+        {'expire_at': {'$lte': NOW}},
+    ):
+        plan = collection.explain(query)
+        assert not any(step.startswith('SCAN') for step in plan), (query, plan)
+
+    assert any(step.startswith('SCAN') for step in collection.explain({'channel_id': '-1'}))
+    store.close()
+
+def test_match_on_arrays_and_nested_fields():
+    doc = {'channel_ids': ['-1', '-2'], 'schedule': {'delete_after_hours': 0}}
+    assert match(doc, {'channel_ids': '-2'})
+    assert match(doc, {'channel_ids': {'$in': ['-3', '-1']}})
+    assert not match(doc, {'channel_ids': '-3'})
+    assert match(doc, {'schedule.delete_after_hours': 0})
+    assert match(doc, {'schedule.pin': {'$exists': False}})